@@ -1,8 +1,6 @@
 from TradeStationClient import CreateTSClient as ct
 import pandas as pd
-from datetime import datetime, timedelta
 import json
-import time
 
 # CREDENTIALS
 AUTH0_SCOPE = 'openid offline_access profile MarketData ReadAccount Trade Crypto Matrix OptionSpreads'
@@ -26,16 +24,11 @@ connection.fetch_refresh_token()
 token, time_to_expiry = connection.fetch_access_token()
 
 
+# The client refreshes the access token in the background before it expires, so no expiry check is needed here.
 while(True):
-    # Validate and get new access token if expired.
-    if (datetime.now() >= time_to_expiry):
-        print('Token expired. Generating new token!.')
-        token, time_to_expiry = connection.fetch_access_token()
-
     # Get current positions for the specified account.
     data = json.loads(connection.fetch_positions(ACCOUNT,True))['Positions']
     print(data)
 
-    # NOTE: TradeStation API can provide 250 requests in 5 mins, that accounts to one request every 1.2 seconds.
-    # We use 1.5 seconds delay before next request to make sure we do not exceed the limit.
-    time.sleep(1.5)
+    # NOTE: TradeStation API can provide 250 requests in 5 mins. The client paces requests itself with its built-in
+    # rate limiter, so no sleep is needed here. Bursts go through right away and later calls wait for the budget.
@@ -0,0 +1,272 @@
+import asyncio
+import time
+
+import aiohttp
+
+from TradeStationClient import CreateTSClient
+
+"""
+    === ASYNCIO VERSION OF CreateTSClient ===
+
+    AsyncTSClient exposes exactly the same endpoint methods as CreateTSClient but every call returns an awaitable.
+    Requests go through one aiohttp connection pool, so hundreds of requests can be in flight on a single event loop.
+
+    async with AsyncTSClient(CLIENT_ID, CLIENT_SECRET) as client:
+        quotes, balances = await client.batch(client.fetch_quotes(['MSFT', 'AAPL']),
+                                              client.fetch_balances(ACCOUNT))
+
+    Token handling (fetch_refresh_token, fetch_access_token, get_saved_access_token) is shared with CreateTSClient."""
+
+
+class AsyncTSClient(CreateTSClient):
+
+    _transient_errors = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+    def __init__(self, key: str = None, secret: str = None, redirect_uri='http://localhost:3000/', pool_connections=2,
+                 pool_maxsize=100, keep_alive=True, timeout=20, api_url='https://api.tradestation.com',
+                 sim_api_url='https://sim-api.tradestation.com', rate_limiter=None, typed=False,
+                 response_cache=None, refresh_margin=120, background_refresh=True, token_store=None,
+                 token_url='https://signin.tradestation.com/oauth/token', instrumentation=None,
+                 keepalive_timeout=30, retry_policy=None, circuit_breaker=None, refresh_token=None, access_token=None,
+                 token_file='access_token.txt'):
+        """
+        :param pool_maxsize: Maximum number of open connections per host in the aiohttp pool.
+        :param keepalive_timeout: Seconds an idle pooled connection is kept open.
+
+        Other parameters are the same as for CreateTSClient.
+        """
+        super().__init__(key, secret, redirect_uri, pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                         keep_alive=keep_alive, timeout=timeout, api_url=api_url, sim_api_url=sim_api_url,
+                         rate_limiter=rate_limiter, typed=typed, response_cache=response_cache,
+                         refresh_margin=refresh_margin, background_refresh=background_refresh,
+                         token_store=token_store, token_url=token_url, instrumentation=instrumentation,
+                         retry_policy=retry_policy, circuit_breaker=circuit_breaker, refresh_token=refresh_token,
+                         access_token=access_token, token_file=token_file)
+        self.keep_alive = keep_alive
+        self.keepalive_timeout = keepalive_timeout
+        # aiohttp sessions must be created inside the running event loop, so this is done on first use.
+        self.aio_session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Close the aiohttp connection pool and the session used for token requests.
+        """
+        if self.aio_session is not None:
+            await self.aio_session.close()
+            self.aio_session = None
+        self.close()
+
+    def _get_aio_session(self):
+        if self.aio_session is None or self.aio_session.closed:
+            if self.keep_alive:
+                connector = aiohttp.TCPConnector(limit_per_host=self.pool_maxsize, limit=0,
+                                                 keepalive_timeout=self.keepalive_timeout)
+            else:
+                connector = aiohttp.TCPConnector(limit_per_host=self.pool_maxsize, limit=0, force_close=True)
+            trace_configs = [self._trace_config()] if self.instrumentation.enabled else None
+            self.aio_session = aiohttp.ClientSession(connector=connector, trace_configs=trace_configs)
+        return self.aio_session
+
+    @staticmethod
+    def _trace_config():
+        """
+        Time DNS resolution and connection setup of instrumented requests into their trace_request_ctx dictionary.
+        """
+        def phase(name, sign):
+            async def record(session, context, params):
+                timings = context.trace_request_ctx
+                if timings is not None:
+                    timings[name] = timings.get(name, 0.0) + sign * time.perf_counter()
+            return record
+
+        trace = aiohttp.TraceConfig()
+        trace.on_dns_resolvehost_start.append(phase('dns', -1))
+        trace.on_dns_resolvehost_end.append(phase('dns', 1))
+        trace.on_connection_create_start.append(phase('connect', -1))
+        trace.on_connection_create_end.append(phase('connect', 1))
+        return trace
+
+    @staticmethod
+    def _client_timeout(timeout):
+        if isinstance(timeout, tuple):
+            return aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        return aiohttp.ClientTimeout(total=timeout)
+
+    async def _send(self, method, url, **kwargs):
+        """
+        Send a request through the aiohttp pool with the current access token. A request answered with 401 is sent
+        once more after refreshing the token. Refreshes run in the default executor so the event loop keeps running.
+        Retries and circuit breaking work as in CreateTSClient._send.
+        :return: (status code, response text).
+        """
+        headers = kwargs.pop('headers', None) or {}
+        policy = self.retry_policy
+        breaker = self.circuit_breaker
+        if policy:
+            kwargs = policy.prepare(method, url, kwargs)
+        retryable = policy and policy.retryable(method, url, kwargs)
+        timeout = self._client_timeout(kwargs.pop('timeout', self.timeout))
+        tokens = self.tokens
+        loop = asyncio.get_running_loop()
+        instrumentation = self.instrumentation
+        retries = 0
+        refreshed = False
+
+        while True:
+            if breaker:
+                breaker.before(url)
+            token = tokens.current()
+            if tokens.expired:
+                token = await loop.run_in_executor(None, tokens.token)
+            headers['Authorization'] = f"Bearer {token}"
+            if instrumentation.enabled:
+                instrumentation.on_request(method, url)
+                started = time.perf_counter()
+                kwargs['trace_request_ctx'] = timings = {}
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async(url)
+            if instrumentation.enabled:
+                sent_at = time.perf_counter()
+            try:
+                async with self._get_aio_session().request(method, url, headers=headers, timeout=timeout,
+                                                           **kwargs) as response:
+                    status = response.status
+                    if self.rate_limiter:
+                        self.rate_limiter.update(url, status, response.headers)
+                    if breaker:
+                        breaker.record(url, status)
+                    if status == 401 and not refreshed:
+                        delay = 0.0
+                    elif retryable and status in policy.statuses:
+                        delay = policy.delay(retries, response.headers)
+                    else:
+                        delay = None
+                    if delay is None or instrumentation.enabled:
+                        if not instrumentation.enabled:
+                            return status, await response.text()
+                        # Connection setup includes the DNS lookup, and both happened before the headers arrived.
+                        if 'dns' in timings and 'connect' in timings:
+                            timings['connect'] -= timings['dns']
+                        timings['server'] = time.perf_counter() - sent_at - sum(timings.values())
+                        body = await response.read()
+                        self._observe(method, url, status, kwargs, len(body), started, sent_at, timings)
+                        if delay is None:
+                            return status, body.decode(response.get_encoding())
+            except Exception as e:
+                instrumentation.on_error(method, url, e)
+                if not isinstance(e, self._transient_errors):
+                    raise
+                if breaker:
+                    breaker.record(url, None)
+                delay = policy.delay(retries) if retryable else None
+                if delay is None:
+                    raise
+                instrumentation.on_retry(method, url, type(e).__name__)
+                await asyncio.sleep(delay)
+                retries += 1
+                continue
+            instrumentation.on_retry(method, url, status)
+            if status == 401 and not refreshed:
+                refreshed = True
+                await loop.run_in_executor(None, tokens.refresh, token)
+                continue
+            await asyncio.sleep(delay)
+            retries += 1
+
+    async def _request(self, method, url, model=None, cache=None, **kwargs):
+        """
+        Send a request and shape the response for the caller.
+        :return: Response body as text, or models for typed clients.
+        """
+        if cache is not None and self.response_cache:
+            text = await self.response_cache.get_or_load_async(self._cache_key(method, url, kwargs), cache,
+                                                               lambda: self._send(method, url, **kwargs))
+        else:
+            text = (await self._send(method, url, **kwargs))[1]
+
+        if self.instrumentation.enabled:
+            started = time.perf_counter()
+            result = self._result(text, model)
+            self.instrumentation.on_decode(method, url, time.perf_counter() - started)
+            return result
+        return self._result(text, model)
+
+    async def batch(self, *calls, limit=None, return_exceptions=True):
+        """
+        Await many endpoint calls concurrently.
+
+        results = await client.batch(*(client.fetch_quotes(chunk) for chunk in chunks), limit=20)
+
+        :param calls: Awaitables returned by the endpoint methods.
+        :param limit: Maximum number of calls in flight at once. Defaults to no limit beyond the pool size.
+        :param return_exceptions: Return exceptions in place of results instead of raising the first one.
+        :return: Results in the same order as the calls.
+        """
+        if limit is not None:
+            semaphore = asyncio.Semaphore(limit)
+
+            async def limited(call):
+                async with semaphore:
+                    return await call
+
+            calls = [limited(call) for call in calls]
+
+        return await asyncio.gather(*calls, return_exceptions=return_exceptions)
+
+    async def fetch_option_chain(self, underlying, expirations=None, quotes=True):
+        """
+        Same as CreateTSClient.fetch_option_chain, awaiting the expirations, strikes and quotes on the event loop.
+        """
+        from TradeStationOptionChain import OptionChain
+
+        return await OptionChain.fetch_async(self, underlying, expirations=expirations, quotes=quotes)
+
+    async def quote_book(self, symbols, stream=False, **kwargs):
+        """
+        Same as CreateTSClient.quote_book, filled with one awaited fetch_quotes call. Quote streams are followed from
+        background threads over the blocking session, so the book updates without an event loop.
+        """
+        from TradeStationQuoteBook import QuoteBook
+
+        book = QuoteBook(symbols, capacity=max(len(symbols), 1024))
+        await book.poll_async(self)
+        if stream:
+            for i in range(0, len(symbols), 100):
+                book.follow(self.stream_quotes(symbols[i:i + 100], **kwargs))
+        return book
+
+    async def _fan_out(self, calls, finish, raw=False):
+        """
+        Send several requests concurrently on the event loop and hand all the results to finish.
+        """
+        send = self._send if raw else self._request
+        results = await asyncio.gather(*(send(method, url, **kwargs) for method, url, kwargs in calls),
+                                       return_exceptions=True)
+        return finish(results)
+
+    async def _fan_out_phases(self, phases, finish, raw=False):
+        """
+        Send several lists of requests, each concurrently, one list after the other.
+        """
+        send = self._send if raw else self._request
+        results = []
+        for calls in phases:
+            results += await asyncio.gather(*(send(method, url, **kwargs) for method, url, kwargs in calls),
+                                            return_exceptions=True)
+        return finish(results)
+
+    async def _fan_out_rounds(self, calls, receive, finish, raw=False):
+        """
+        Send rounds of requests concurrently until receive plans no more.
+        """
+        send = self._send if raw else self._request
+        while calls:
+            calls = receive(calls, await asyncio.gather(*(send(method, url, **kwargs) for method, url, kwargs in calls),
+                                                        return_exceptions=True))
+        return finish()
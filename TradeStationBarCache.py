@@ -0,0 +1,209 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from TradeStationBars import COLUMNS, concat_columns, to_datetime
+
+"""
+    === LOCAL HISTORICAL BAR STORE ===
+
+    Keeps the bars downloaded with fetch_bar_history on disk, one directory per (symbol, interval, unit, session
+    template) holding one .npy file per column. Reads are memory-mapped, so loading years of minute bars costs no
+    parsing and no copying: the arrays returned are views into the page cache.
+
+        cache = BarCache(client, 'bar_cache', max_bytes=20 * 2**30)
+        bars = cache.get('MSFT', '2014-01-01', interval=1, unit='Minute')
+
+    The range a directory covers is recorded with it. A request inside that range is served locally; otherwise only
+    the missing head and/or tail is downloaded and merged in. The last cached bar is always fetched again on a tail
+    top-up since it may have been incomplete when it was stored.
+
+    Each update is written under a new generation number and then published by replacing meta.json, so readers never
+    see half-written files. The least recently used entries are evicted when the cache grows past max_bytes or
+    max_entries.
+
+    Works with CreateTSClient (not AsyncTSClient, whose fetch_bar_history is a coroutine)."""
+
+META_FILE = 'meta.json'
+
+
+def session_name(sessiontemplate):
+    """
+    :return: Session template as kept in the cache, with None (the API's default) as Default.
+    """
+    return sessiontemplate or 'Default'
+
+
+def _epoch_ms(value):
+    return int((to_datetime(value) - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+def _iso(epoch_ms):
+    return datetime.utcfromtimestamp(epoch_ms / 1000).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class BarCache:
+
+    def __init__(self, client, directory='bar_cache', max_bytes=None, max_entries=None):
+        """
+        :param client: CreateTSClient used to download missing bars.
+        :param directory: Folder the cache lives in. Created if missing.
+        :param max_bytes: Evict least recently used entries once the cache is larger than this. No limit if None.
+        :param max_entries: Most (symbol, interval, unit, session template) entries kept. No limit if None.
+        """
+        self.client = client
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_dir(self, symbol, interval, unit, sessiontemplate=None):
+        # Symbols such as $SPX.X or @ES contain characters that are awkward in file names.
+        safe = re.sub(r'[^A-Za-z0-9._-]', lambda m: '%{:02X}'.format(ord(m.group())), symbol)
+        return os.path.join(self.directory, '{}__{}{}__{}'.format(safe, interval, unit, session_name(sessiontemplate)))
+
+    @staticmethod
+    def _read_meta(entry):
+        try:
+            with open(os.path.join(entry, META_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read(self, symbol, interval=1, unit='Minute', sessiontemplate=None):
+        """
+        Memory-map the cached bars of a symbol without touching the network.
+        :return: (columns, meta) or (None, None) if nothing is cached. meta holds the covered range as epoch
+        milliseconds (covered_from, covered_to) and the session template.
+        """
+        entry = self._entry_dir(symbol, interval, unit, sessiontemplate)
+        meta = self._read_meta(entry)
+        if meta is None:
+            return None, None
+        columns = {name: np.load(os.path.join(entry, '{}.{}.npy'.format(meta['generation'], name)), mmap_mode='r')
+                   for name in COLUMNS}
+        os.utime(os.path.join(entry, META_FILE))
+        return columns, meta
+
+    def _write(self, entry, columns, covered_from, covered_to, old_meta, sessiontemplate=None):
+        os.makedirs(entry, exist_ok=True)
+        generation = (old_meta['generation'] + 1) if old_meta else 0
+        for name in COLUMNS:
+            np.save(os.path.join(entry, '{}.{}.npy'.format(generation, name)), np.ascontiguousarray(columns[name]))
+
+        meta = {"generation": generation, "covered_from": covered_from, "covered_to": covered_to,
+                "bars": int(len(columns['timestamp'])), "sessiontemplate": session_name(sessiontemplate)}
+        tmp = os.path.join(entry, META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(entry, META_FILE))
+
+        if old_meta:
+            for name in COLUMNS:
+                try:
+                    os.remove(os.path.join(entry, '{}.{}.npy'.format(old_meta['generation'], name)))
+                except OSError:
+                    # Still mapped by a reader on Windows; removed with the entry later.
+                    pass
+
+    def get(self, symbol, firstdate, lastdate=None, interval=1, unit='Minute', sessiontemplate=None):
+        """
+        Bars for a date range, served from the cache and topped up from the API where the cache falls short.
+        :param firstdate: Start of the range, as datetime or string (YYYY-mm-dd or YYYY-mm-ddTHH:MM:SSZ).
+        :param lastdate: End of the range. Defaults to now.
+        :param sessiontemplate: Session template the bars are requested with. Bars of each template are cached
+        separately, None being the same as Default.
+        :return: Dictionary of column arrays (see TradeStationBars.COLUMNS) for the range, as read-only views of the
+        memory-mapped files.
+        """
+        start = _epoch_ms(firstdate)
+        end = _epoch_ms(lastdate) if lastdate is not None else int(time.time() * 1000)
+
+        def download(first, last):
+            return self.client.fetch_bar_history(symbol, _iso(first), _iso(last), interval=interval, unit=unit,
+                                                 sessiontemplate=sessiontemplate)
+
+        with self._lock:
+            entry = self._entry_dir(symbol, interval, unit, sessiontemplate)
+            columns, meta = self.read(symbol, interval, unit, sessiontemplate)
+
+            parts = []
+            if meta is None:
+                parts.append(download(start, end))
+                covered_from, covered_to = start, end
+            else:
+                covered_from, covered_to = meta['covered_from'], meta['covered_to']
+                if start < covered_from:
+                    parts.append(download(start, covered_from))
+                    covered_from = start
+                if end > covered_to:
+                    last_bar = int(columns['timestamp'][-1]) if len(columns['timestamp']) else covered_to
+                    parts.append(download(min(last_bar, covered_to), end))
+                    covered_to = end
+
+            if parts:
+                merged = concat_columns(parts + ([columns] if columns is not None else []))
+                self._write(entry, merged, covered_from, min(covered_to, int(time.time() * 1000)), meta,
+                            sessiontemplate)
+                columns, meta = self.read(symbol, interval, unit, sessiontemplate)
+                self._evict(keep=entry)
+
+        timestamps = columns['timestamp']
+        lo = np.searchsorted(timestamps, start, side='left')
+        hi = np.searchsorted(timestamps, end, side='right')
+        return {name: values[lo:hi] for name, values in columns.items()}
+
+    def entries(self):
+        """
+        :return: List of (entry directory, size in bytes, last used time), least recently used first.
+        """
+        result = []
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            meta_path = os.path.join(entry, META_FILE)
+            if not os.path.isfile(meta_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+            result.append((entry, size, os.path.getmtime(meta_path)))
+        return sorted(result, key=lambda item: item[2])
+
+    def size(self):
+        """
+        :return: Total bytes used by the cache.
+        """
+        return sum(size for _, size, _ in self.entries())
+
+    def _evict(self, keep=None):
+        if self.max_bytes is None and self.max_entries is None:
+            return
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for entry, size, _ in entries:
+            over_bytes = self.max_bytes is not None and total > self.max_bytes
+            over_count = self.max_entries is not None and count > self.max_entries
+            if not (over_bytes or over_count):
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            count -= 1
+
+    def clear(self, symbol=None, interval=1, unit='Minute', sessiontemplate=None):
+        """
+        Remove one entry, or the whole cache if no symbol is given.
+        """
+        with self._lock:
+            if symbol is not None:
+                shutil.rmtree(self._entry_dir(symbol, interval, unit, sessiontemplate), ignore_errors=True)
+                return
+            for entry, _, _ in self.entries():
+                shutil.rmtree(entry, ignore_errors=True)
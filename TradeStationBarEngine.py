@@ -0,0 +1,564 @@
+import math
+import threading
+
+import numpy as np
+
+import TradeStationModels as models
+from TradeStationBars import _epoch_ms
+from TradeStationStreams import DataEvent
+
+"""
+    === INCREMENTAL BAR RESAMPLING AND INDICATORS ===
+
+    BarEngine turns the minute bars of thousands of symbols into higher timeframes (5, 15, 60 minutes, ...) and keeps
+    rolling indicators of every timeframe up to date as each bar arrives, without recomputing over the history:
+
+        EMA             exponential moving averages of the close, one per span
+        ATR             Wilder's average true range
+        rolling high / low   highest high and lowest low of the last `window` bars
+        VWAP            volume weighted average of the typical price since the session started
+
+    Every update costs the same however long the history is. State lives in preallocated arrays indexed by a symbol
+    id, like TradeStationQuoteBook: the last `depth` bars of each timeframe in ring buffers, the indicators in
+    columns, so screens over the whole universe are vectorized:
+
+        engine = client.bar_engine(UNIVERSE, firstdate='2024-01-01', stream=True)      # backfill, then stream
+        ...
+        hourly = engine.snapshot(60)
+        breakouts = hourly['close'] > hourly['rolling_high_previous']
+
+    Bars are fed from fetch_bars, fetch_bar_history (backfill, vectorized) or bar streams (follow). TradeStation
+    stamps bars with the time they end, and a higher timeframe bar ending at T holds the minute bars ending after
+    T - period up to T. A bar stream sends the bar in progress again whenever it changes: an update with the
+    timestamp of the current bar revises it, and its indicators, instead of starting a new one. Bars older than the
+    current one are ignored.
+
+    Indicator columns hold the value including the current (unfinished) bar; the *_previous values exclude it."""
+
+FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+
+class Frame:
+    """
+    Bars of one timeframe and their indicators, for every symbol of a BarEngine.
+    """
+
+    def __init__(self, minutes, capacity, depth, spans, atr, window):
+        """
+        :param minutes: Bar length.
+        :param capacity: Symbols the arrays are sized for.
+        :param depth: Bars kept per symbol in the ring buffers.
+        :param spans: EMA spans, in bars.
+        :param atr: ATR period, in bars.
+        :param window: Rolling high / low window, in bars.
+        """
+        self.minutes = minutes
+        self.period = minutes * 60
+        self.depth = depth
+        self.spans = tuple(spans)
+        self.alphas = tuple(2.0 / (span + 1) for span in self.spans)
+        self.atr_period = atr
+        self.window = window
+        for name, fill, dtype, shape in self._layout():
+            setattr(self, name, np.full((capacity,) + shape, fill, dtype=dtype))
+
+    def __repr__(self):
+        return 'Frame({} minutes)'.format(self.minutes)
+
+    def _layout(self):
+        """
+        :return: (name, initial value, dtype, shape after the symbol axis) of every per-symbol array.
+        """
+        depth, window, spans = (self.depth,), (self.window,), (len(self.spans),)
+        return (
+            # Ring buffers: bar j of a symbol is in slot j % depth.
+            ('timestamp', 0, np.int64, depth),
+            ('open', np.nan, np.float64, depth),
+            ('high', np.nan, np.float64, depth),
+            ('low', np.nan, np.float64, depth),
+            ('close', np.nan, np.float64, depth),
+            ('volume', np.nan, np.float64, depth),
+            ('pos', self.depth - 1, np.int64, ()),
+            # Finished bars, which is also the sequence number of the current bar.
+            ('count', 0, np.int64, ()),
+            ('bucket', 0, np.int64, ()),
+            # Minute bars of the current bar that are already finished.
+            ('part_open', np.nan, np.float64, ()),
+            ('part_high', -np.inf, np.float64, ()),
+            ('part_low', np.inf, np.float64, ()),
+            ('part_volume', 0.0, np.float64, ()),
+            ('part_count', 0, np.int64, ()),
+            # Indicators as of the last finished bar, and including the current bar.
+            ('ema_previous', np.nan, np.float64, spans),
+            ('ema', np.nan, np.float64, spans),
+            ('atr_previous', np.nan, np.float64, ()),
+            ('atr', np.nan, np.float64, ()),
+            ('previous_close', np.nan, np.float64, ()),
+            # Monotonic queues of the finished bars inside the rolling window (lows negated).
+            ('high_queue', np.nan, np.float64, window),
+            ('high_seq', 0, np.int64, window),
+            ('high_head', 0, np.int64, ()),
+            ('high_len', 0, np.int64, ()),
+            ('low_queue', np.nan, np.float64, window),
+            ('low_seq', 0, np.int64, window),
+            ('low_head', 0, np.int64, ()),
+            ('low_len', 0, np.int64, ()),
+            ('rolling_high', np.nan, np.float64, ()),
+            ('rolling_low', np.nan, np.float64, ()),
+            ('rolling_high_previous', np.nan, np.float64, ()),
+            ('rolling_low_previous', np.nan, np.float64, ()),
+        )
+
+    def _grow(self, capacity, n):
+        for name, fill, dtype, shape in self._layout():
+            old = getattr(self, name)
+            new = np.full((capacity,) + shape, fill, dtype=dtype)
+            new[:n] = old[:n]
+            setattr(self, name, new)
+
+    def _reset(self, i):
+        for name, fill, _, _ in self._layout():
+            getattr(self, name)[i] = fill
+
+    # ----------------------------------------------- updates ------------------------------------------------------
+
+    def _start(self, i, bucket):
+        """
+        Begin a new bar ending at bucket.
+        """
+        self.bucket[i] = bucket
+        pos = self.pos[i] = (self.pos[i] + 1) % self.depth
+        self.timestamp[i, pos] = bucket
+        self.part_open[i] = np.nan
+        self.part_high[i] = -np.inf
+        self.part_low[i] = np.inf
+        self.part_volume[i] = 0.0
+        self.part_count[i] = 0
+
+    def _fold(self, i, o, h, l, v):
+        """
+        Add a finished minute bar to the current bar.
+        """
+        if not self.part_count[i]:
+            self.part_open[i] = o
+        if h > self.part_high[i]:
+            self.part_high[i] = h
+        if l < self.part_low[i]:
+            self.part_low[i] = l
+        self.part_volume[i] += v
+        self.part_count[i] += 1
+
+    def _write(self, i, o, h, l, c, v):
+        """
+        Set the current bar from the finished minute bars in it and the minute bar in progress, and update the
+        indicators that include it.
+        """
+        pos = self.pos[i]
+        if self.part_count[i]:
+            o = self.part_open[i]
+            h = max(h, self.part_high[i])
+            l = min(l, self.part_low[i])
+            v += self.part_volume[i]
+        self.open[i, pos] = o
+        self.high[i, pos] = h
+        self.low[i, pos] = l
+        self.close[i, pos] = c
+        self.volume[i, pos] = v
+
+        ema, previous = self.ema, self.ema_previous
+        for k, alpha in enumerate(self.alphas):
+            e = previous[i, k]
+            ema[i, k] = c if math.isnan(e) else e + alpha * (c - e)
+
+        close = self.previous_close[i]
+        true_range = h - l if math.isnan(close) else max(h, close) - min(l, close)
+        n = self.count[i]
+        atr = self.atr_previous[i]
+        if n == 0:
+            self.atr[i] = true_range
+        elif n < self.atr_period:
+            self.atr[i] = (atr * n + true_range) / (n + 1)
+        else:
+            self.atr[i] = atr + (true_range - atr) / self.atr_period
+
+        self.rolling_high[i] = max(h, self.rolling_high_previous[i]) if self.high_len[i] else h
+        self.rolling_low[i] = min(l, self.rolling_low_previous[i]) if self.low_len[i] else l
+
+    @staticmethod
+    def _push(queue, seqs, heads, lens, i, seq, value, window):
+        """
+        Add finished bar seq to a monotonic queue and drop the bars that fall out of the window of the next bar.
+        """
+        head, n = heads[i], lens[i]
+        while n and queue[i, (head + n - 1) % window] <= value:
+            n -= 1
+        slot = (head + n) % window
+        queue[i, slot] = value
+        seqs[i, slot] = seq
+        n += 1
+        first = seq - window + 2
+        while n and seqs[i, head] < first:
+            head = (head + 1) % window
+            n -= 1
+        heads[i], lens[i] = head, n
+
+    def _finish(self, i):
+        """
+        The current bar is complete: fold it into the indicators as of the last finished bar.
+        """
+        pos = self.pos[i]
+        seq = self.count[i]
+        self.ema_previous[i] = self.ema[i]
+        self.atr_previous[i] = self.atr[i]
+        self.previous_close[i] = self.close[i, pos]
+        window = self.window
+        self._push(self.high_queue, self.high_seq, self.high_head, self.high_len, i, seq, self.high[i, pos], window)
+        self._push(self.low_queue, self.low_seq, self.low_head, self.low_len, i, seq, -self.low[i, pos], window)
+        self.rolling_high_previous[i] = (self.high_queue[i, self.high_head[i]] if self.high_len[i] else np.nan)
+        self.rolling_low_previous[i] = (-self.low_queue[i, self.low_head[i]] if self.low_len[i] else np.nan)
+        self.count[i] = seq + 1
+
+    def _fill(self, i, ts, o, h, l, c, v):
+        """
+        Set the state of symbol i from a run of minute bars at once, as if they had been updated one by one: every
+        bar finished except the last minute bar, which stays in progress.
+        :param ts: int64 array of bar end times in epoch seconds, increasing.
+        """
+        self._reset(i)
+        buckets = -(-ts // self.period) * self.period
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(ts)] - 1
+        highs = np.maximum.reduceat(h, starts)
+        lows = np.minimum.reduceat(l, starts)
+        closes = c[ends]
+        m = len(starts)
+        kept = min(m, self.depth)
+        slots = np.arange(m - kept, m) % self.depth
+        self.timestamp[i, slots] = buckets[starts][-kept:]
+        self.open[i, slots] = o[starts][-kept:]
+        self.high[i, slots] = highs[-kept:]
+        self.low[i, slots] = lows[-kept:]
+        self.close[i, slots] = closes[-kept:]
+        self.volume[i, slots] = np.add.reduceat(v, starts)[-kept:]
+        self.pos[i] = (m - 1) % self.depth
+        self.bucket[i] = buckets[-1]
+
+        first, last = starts[-1], len(ts) - 1
+        if last > first:
+            self.part_open[i] = o[first]
+            self.part_high[i] = h[first:last].max()
+            self.part_low[i] = l[first:last].min()
+            self.part_volume[i] = v[first:last].sum()
+            self.part_count[i] = last - first
+
+        k = m - 1
+        if k:
+            # EMA seeded with the first close: weight (1 - a)^(k-1) on it, a (1 - a)^(k-1-j) on close j.
+            for j, alpha in enumerate(self.alphas):
+                weights = alpha * (1 - alpha) ** np.arange(k - 1, -1, -1, dtype=np.float64)
+                weights[0] = (1 - alpha) ** (k - 1)
+                self.ema_previous[i, j] = weights @ closes[:k]
+            true_range = highs[:k] - lows[:k]
+            true_range[1:] = np.maximum(highs[1:k], closes[:k - 1]) - np.minimum(lows[1:k], closes[:k - 1])
+            # Wilder's ATR: the mean of the first period true ranges, then smoothed by 1 / period.
+            period = self.atr_period
+            if k <= period:
+                atr = true_range.mean()
+            else:
+                r = 1 - 1 / period
+                atr = (r ** (k - period) * true_range[:period].mean()
+                       + (true_range[period:] * r ** np.arange(k - period - 1, -1, -1, dtype=np.float64)).sum()
+                       / period)
+            self.atr_previous[i] = atr
+            self.previous_close[i] = closes[k - 1]
+            window = self.window
+            for seq in range(max(0, k - window + 1), k):
+                self._push(self.high_queue, self.high_seq, self.high_head, self.high_len, i, seq, highs[seq],
+                           window)
+                self._push(self.low_queue, self.low_seq, self.low_head, self.low_len, i, seq, -lows[seq], window)
+            self.rolling_high_previous[i] = (self.high_queue[i, self.high_head[i]] if self.high_len[i] else np.nan)
+            self.rolling_low_previous[i] = (-self.low_queue[i, self.low_head[i]] if self.low_len[i] else np.nan)
+            self.count[i] = k
+        self._write(i, o[last], h[last], l[last], c[last], v[last])
+
+    # ----------------------------------------------- lookups ------------------------------------------------------
+
+    def bars(self, i, n=None):
+        """
+        :param n: Most recent bars to return, all kept (up to depth) if None.
+        :return: Dictionary of arrays (see FIELDS), oldest first, ending with the current bar.
+        """
+        kept = min(int(self.count[i]) + (1 if self.bucket[i] else 0), self.depth)
+        if n is not None:
+            kept = min(kept, n)
+        slots = np.arange(self.pos[i] - kept + 1, self.pos[i] + 1) % self.depth
+        return {name: getattr(self, name)[i, slots] for name in FIELDS}
+
+    def current(self, field, n):
+        """
+        :return: Array of one field of the current bar of the first n symbols.
+        """
+        return getattr(self, field)[np.arange(n), self.pos[:n]]
+
+
+class BarEngine:
+
+    def __init__(self, symbols=(), frames=(1, 5, 15, 60), depth=256, ema=(9, 21), atr=14, window=20,
+                 session_offset=8 * 3600, capacity=1024):
+        """
+        :param symbols: Symbols to register up front, in id order.
+        :param frames: Timeframes in minutes. Bars fed to the engine are minute bars.
+        :param depth: Bars of each timeframe kept per symbol.
+        :param ema: EMA spans in bars.
+        :param atr: ATR period in bars.
+        :param window: Rolling high / low window in bars, including the current bar.
+        :param session_offset: Seconds after 00:00 UTC at which the VWAP session starts over. The default (08:00 UTC)
+        falls before the US pre-market.
+        :param capacity: Symbols the arrays are sized for. They double in size when full, after which previously
+        returned views no longer update.
+        """
+        capacity = max(capacity, 1)
+        self.frames = [Frame(minutes, capacity, depth, ema, atr, window) for minutes in frames]
+        self._frames = {frame.minutes: frame for frame in self.frames}
+        self.spans = tuple(ema)
+        self.session_offset = session_offset
+        self.index = {}
+        self.symbols = []
+        self.updates = 0
+        # Minute bar in progress per symbol.
+        self.base = np.full((capacity, 5), np.nan)
+        self.base_timestamp = np.zeros(capacity, dtype=np.int64)
+        # VWAP sums over the finished minute bars of the session, session number and value including the current bar.
+        self.vwap_value = np.zeros(capacity)
+        self.vwap_volume = np.zeros(capacity)
+        self.session = np.zeros(capacity, dtype=np.int64)
+        self.vwap = np.full(capacity, np.nan)
+        self._lock = threading.Lock()
+        self._threads = []
+        self.add(symbols)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def __repr__(self):
+        return 'BarEngine({} symbols, frames={})'.format(len(self.symbols), [frame.minutes for frame in self.frames])
+
+    def _grow(self, size):
+        capacity = len(self.base_timestamp)
+        while capacity < size:
+            capacity *= 2
+        n = len(self.symbols)
+        for frame in self.frames:
+            frame._grow(capacity, n)
+        for name, fill in (('base', np.nan), ('base_timestamp', 0), ('vwap_value', 0.0), ('vwap_volume', 0.0),
+                           ('session', 0), ('vwap', np.nan)):
+            old = getattr(self, name)
+            new = np.full((capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            new[:n] = old[:n]
+            setattr(self, name, new)
+
+    def add(self, symbols):
+        """
+        Register symbols, giving each the next free id. Known symbols keep their id.
+        :return: List of ids in the order of symbols.
+        """
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        with self._lock:
+            ids = []
+            for symbol in symbols:
+                i = self.index.get(symbol)
+                if i is None:
+                    i = len(self.symbols)
+                    if i >= len(self.base_timestamp):
+                        self._grow(i + 1)
+                    self.index[symbol] = i
+                    self.symbols.append(symbol)
+                ids.append(i)
+            return ids
+
+    def id(self, symbol):
+        """
+        :return: Id of a registered symbol. Raises KeyError for unknown symbols.
+        """
+        return self.index[symbol]
+
+    def ids(self, symbols):
+        """
+        :return: int64 array of the ids of symbols, for indexing columns.
+        """
+        index = self.index
+        return np.fromiter((index[symbol] for symbol in symbols), dtype=np.int64, count=len(symbols))
+
+    def frame(self, minutes):
+        """
+        :return: The Frame of a timeframe.
+        """
+        return self._frames[minutes]
+
+    # ----------------------------------------------- updates ------------------------------------------------------
+
+    def _id(self, symbol):
+        i = self.index.get(symbol)
+        return i if i is not None else self.add((symbol,))[0]
+
+    def update(self, symbol, timestamp, open, high, low, close, volume):
+        """
+        Apply one minute bar.
+        :param timestamp: End of the bar in epoch seconds.
+        :return: False if the bar is older than the current one and was ignored.
+        """
+        i = self._id(symbol)
+        with self._lock:
+            return self._update(i, int(timestamp), float(open), float(high), float(low), float(close), float(volume))
+
+    def _update(self, i, ts, o, h, l, c, v):
+        last = self.base_timestamp[i]
+        if ts < last:
+            return False
+        base = self.base[i]
+        new_bar = ts > last
+        for frame in self.frames:
+            bucket = -(-ts // frame.period) * frame.period
+            if bucket != frame.bucket[i]:
+                if frame.bucket[i]:
+                    frame._finish(i)
+                frame._start(i, bucket)
+            elif new_bar:
+                frame._fold(i, base[0], base[1], base[2], base[4])
+            frame._write(i, o, h, l, c, v)
+
+        if new_bar:
+            session = (ts - self.session_offset) // 86400
+            if session != self.session[i]:
+                self.session[i] = session
+                self.vwap_value[i] = 0.0
+                self.vwap_volume[i] = 0.0
+            elif last:
+                self.vwap_value[i] += (base[1] + base[2] + base[3]) / 3 * base[4]
+                self.vwap_volume[i] += base[4]
+            self.base_timestamp[i] = ts
+        base[:] = (o, h, l, c, v)
+        volume = self.vwap_volume[i] + v
+        self.vwap[i] = (self.vwap_value[i] + (h + l + c) / 3 * v) / volume if volume else np.nan
+        self.updates += 1
+        return True
+
+    def update_bar(self, symbol, bar):
+        """
+        Apply one bar as decoded from fetch_bars or a bar stream message, or a TradeStationModels.Bar.
+        :return: False if the bar is older than the current one and was ignored.
+        """
+        if isinstance(bar, dict):
+            return self.update(symbol, _epoch_ms(bar) // 1000, bar['Open'], bar['High'], bar['Low'], bar['Close'],
+                               bar.get('TotalVolume') or 0)
+        epoch = bar.epoch if bar.epoch is not None else _epoch_ms({'TimeStamp': bar.timestamp})
+        return self.update(symbol, epoch // 1000, bar.open, bar.high, bar.low, bar.close, bar.total_volume or 0)
+
+    def update_many(self, symbol, data):
+        """
+        Apply the bars of a fetch_bars response in order.
+        :param data: Response text, the decoded response, or a list of bars or Bar models.
+        """
+        if isinstance(data, (str, bytes)):
+            data = models.loads(data)
+        if isinstance(data, dict):
+            data = data.get('Bars', [])
+        for bar in data:
+            self.update_bar(symbol, bar)
+
+    def backfill(self, symbol, columns):
+        """
+        Set a symbol's state from historical minute bars in one vectorized pass, replacing what it had. Feed later
+        bars with update or follow; the last backfilled bar can still be revised.
+        :param columns: Dictionary of arrays as returned by fetch_bar_history (timestamp in epoch milliseconds,
+        open, high, low, close, volume).
+        """
+        i = self._id(symbol)
+        ts = np.asarray(columns['timestamp'], dtype=np.int64) // 1000
+        if not len(ts):
+            return
+        order = np.argsort(ts, kind='stable')
+        ts = ts[order]
+        o, h, l, c, v = (np.asarray(columns[name], dtype=np.float64)[order] for name in FIELDS[1:])
+        with self._lock:
+            for frame in self.frames:
+                frame._fill(i, ts, o, h, l, c, v)
+            sessions = (ts - self.session_offset) // 86400
+            first = np.searchsorted(sessions, sessions[-1])
+            typical = (h[first:-1] + l[first:-1] + c[first:-1]) / 3
+            self.session[i] = sessions[-1]
+            self.vwap_value[i] = (typical * v[first:-1]).sum()
+            self.vwap_volume[i] = v[first:-1].sum()
+            self.base_timestamp[i] = ts[-1]
+            self.base[i] = (o[-1], h[-1], l[-1], c[-1], v[-1])
+            volume = self.vwap_volume[i] + v[-1]
+            self.vwap[i] = ((self.vwap_value[i] + (h[-1] + l[-1] + c[-1]) / 3 * v[-1]) / volume if volume
+                            else np.nan)
+            self.updates += len(ts)
+
+    def follow(self, events, symbol):
+        """
+        Apply the bars of a minute bar stream (client.stream_bars) from a background thread until it ends or is
+        closed.
+        :param symbol: Symbol of the stream; bar messages do not carry it.
+        :return: The thread.
+        """
+        def run():
+            for event in events:
+                if isinstance(event, DataEvent) and 'Close' in event.data:
+                    self.update_bar(symbol, event.data)
+
+        thread = threading.Thread(target=run, name='BarEngine', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return thread
+
+    # ----------------------------------------------- lookups ------------------------------------------------------
+
+    def bars(self, symbol, minutes=1, n=None):
+        """
+        :param n: Most recent bars to return, all kept if None.
+        :return: Dictionary of arrays (see FIELDS), oldest first, ending with the current bar.
+        """
+        return self._frames[minutes].bars(self.index[symbol], n)
+
+    def get(self, symbol, name, minutes=1):
+        """
+        :param name: Bar field of the current bar, ema_<span>, atr, rolling_high, rolling_low (or their _previous
+        values) or vwap.
+        :return: Latest value, NaN if not known yet.
+        """
+        i = self.index[symbol]
+        if name == 'vwap':
+            return float(self.vwap[i])
+        frame = self._frames[minutes]
+        if name in FIELDS:
+            return getattr(frame, name)[i, frame.pos[i]].item()
+        if name.startswith('ema_'):
+            previous = name.endswith('_previous')
+            span = int(name[4:-9] if previous else name[4:])
+            return float((frame.ema_previous if previous else frame.ema)[i, self.spans.index(span)])
+        return float(getattr(frame, name)[i])
+
+    def snapshot(self, minutes=1):
+        """
+        :return: Dictionary of arrays over all symbols in id order: the current bar (see FIELDS), ema_<span>, atr,
+        rolling_high, rolling_low, their _previous values, vwap and count (finished bars). Copies, consistent with
+        each other.
+        """
+        frame = self._frames[minutes]
+        n = len(self.symbols)
+        with self._lock:
+            table = {name: frame.current(name, n) for name in FIELDS}
+            for k, span in enumerate(self.spans):
+                table['ema_{}'.format(span)] = frame.ema[:n, k].copy()
+                table['ema_{}_previous'.format(span)] = frame.ema_previous[:n, k].copy()
+            for name in ('atr', 'atr_previous', 'rolling_high', 'rolling_low', 'rolling_high_previous',
+                         'rolling_low_previous', 'count'):
+                table[name] = getattr(frame, name)[:n].copy()
+            table['vwap'] = self.vwap[:n].copy()
+        return table
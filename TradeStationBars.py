@@ -0,0 +1,241 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import TradeStationModels as models
+
+"""
+    === COLUMNAR BAR DOWNLOADS ===
+
+    Helpers behind CreateTSClient.fetch_bar_history. A long date range is split into pages expected to hold at most
+    MAX_BARS_PER_REQUEST bars, the pages are requested in parallel and every page is decoded straight into column
+    arrays (no Bar objects or row records in between):
+
+        timestamp   int64 epoch milliseconds
+        open, high, low, close, volume   float64
+
+    Backfilling a universe:
+
+        client = CreateTSClient(CLIENT_ID, CLIENT_SECRET)
+        history = {symbol: client.fetch_bar_history(symbol, '2015-01-01', interval=1, unit='Minute')
+                   for symbol in symbols}
+
+    Pages are sized on trading time: the number of bars a weekday holds is estimated from the session template
+    (regular US equity hours by default, see SESSION_MINUTES) and weekends hold none, so a page of 1 minute bars
+    spans about 140 trading days rather than 40 calendar days. Symbols trading other hours (futures, forex, crypto)
+    should pass bars_per_day. An estimate that falls short is still safe: a page answered with the maximum number of
+    bars is continued from its last bar until its range is covered, at the cost of one more round of requests.
+
+    Pages of one symbol are fetched concurrently; run symbols from several threads (or use AsyncTSClient and
+    batch) to overlap symbols too. Every page request goes through the client's rate limiter."""
+
+MAX_BARS_PER_REQUEST = 57600
+
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+# Trading minutes per weekday of each session template, US equity hours (Default is the regular session). Unknown
+# templates are assumed to trade around the clock.
+SESSION_MINUTES = {
+    None: 390,
+    'Default': 390,
+    'USEQPre': 720,
+    'USEQPost': 630,
+    'USEQPreAndPost': 960,
+    'USEQ24Hour': 1440,
+}
+
+# Trading days covered by one bar of interval 1, rounded down so pages err on the small side.
+UNIT_DAYS = {
+    'Daily': 1,
+    'Weekly': 5,
+    'Monthly': 20,
+}
+
+# Share of max_bars a page is planned to hold, leaving room for a day split across two pages and for sessions
+# running longer than their template.
+PAGE_FILL = 0.9
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class BarDownloadError(Exception):
+    """
+    Raised when some pages of a bar download failed.
+    """
+
+    def __init__(self, symbol, failures):
+        """
+        :param failures: List of (page, error message).
+        """
+        self.symbol = symbol
+        self.failures = failures
+        super().__init__('{} of the bar pages for {} failed. First error: {}'.format(
+            len(failures), symbol, failures[0][1]))
+
+
+def to_datetime(value):
+    """
+    :param value: datetime, or string formatted YYYY-mm-dd or YYYY-mm-ddTHH:MM:SS(Z).
+    :return: naive UTC datetime.
+    """
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    value = value.rstrip('Z')
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S' if 'T' in value else '%Y-%m-%d')
+
+
+def format_date(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def bars_per_day(interval=1, unit='Minute', sessiontemplate=None):
+    """
+    :return: Expected number of bars per trading day (weekday).
+    """
+    if unit == 'Minute':
+        return -(-SESSION_MINUTES.get(sessiontemplate, 1440) // interval)
+    if unit not in UNIT_DAYS:
+        raise ValueError('Unknown bar unit: {}'.format(unit))
+    return 1 / (UNIT_DAYS[unit] * interval)
+
+
+def plan_pages(firstdate, lastdate, interval=1, unit='Minute', max_bars=MAX_BARS_PER_REQUEST, sessiontemplate=None,
+               per_day=None):
+    """
+    Split a date range into ranges expected to hold at most max_bars bars each. Every page spans a whole number of
+    weekdays (UTC), plus the weekends between them.
+    :param sessiontemplate: Session template of the request, for the number of bars per day.
+    :param per_day: Expected bars per weekday, instead of the estimate from bars_per_day.
+    :return: List of {"firstdate": ..., "lastdate": ...} query parameters.
+    """
+    start = to_datetime(firstdate)
+    end = to_datetime(lastdate) if lastdate is not None else datetime.utcnow()
+    if per_day is None:
+        per_day = bars_per_day(interval, unit, sessiontemplate)
+    days = max(1, int(max_bars * PAGE_FILL / per_day))
+    last_day = np.datetime64(end.date(), 'D')
+
+    pages = []
+    day = np.datetime64(start.date(), 'D')
+    while start <= end:
+        day = np.busday_offset(day, days, roll='forward')
+        if day > last_day:
+            page_end = end
+        else:
+            page_end = min(end, day.astype('datetime64[s]').astype(datetime) - timedelta(seconds=1))
+        pages.append({"firstdate": format_date(start), "lastdate": format_date(page_end)})
+        start = page_end + timedelta(seconds=1)
+    return pages
+
+
+def empty_columns():
+    return {name: np.empty(0, np.int64 if name == 'timestamp' else np.float64) for name in COLUMNS}
+
+
+def _epoch_ms(bar):
+    epoch = bar.get('Epoch')
+    if epoch is not None:
+        return int(epoch)
+    return int(np.datetime64(bar['TimeStamp'].rstrip('Z'), 'ms').astype(np.int64))
+
+
+def decode_bars(data):
+    """
+    Decode a barcharts response into columns.
+    :param data: Response text, bytes, or the decoded response.
+    :return: Dictionary of arrays (see COLUMNS).
+    :raises ValueError: The response holds no Bars, eg. an error body.
+    """
+    if isinstance(data, (str, bytes)):
+        data = models.loads(data)
+    if not isinstance(data, dict) or 'Bars' not in data:
+        raise ValueError(data.get('Message', data) if isinstance(data, dict) else data)
+
+    bars = data['Bars']
+    n = len(bars)
+    return {
+        'timestamp': np.fromiter((_epoch_ms(bar) for bar in bars), np.int64, n),
+        'open': np.fromiter((bar['Open'] for bar in bars), np.float64, n),
+        'high': np.fromiter((bar['High'] for bar in bars), np.float64, n),
+        'low': np.fromiter((bar['Low'] for bar in bars), np.float64, n),
+        'close': np.fromiter((bar['Close'] for bar in bars), np.float64, n),
+        'volume': np.fromiter((bar.get('TotalVolume') or 0 for bar in bars), np.float64, n),
+    }
+
+
+def concat_columns(parts):
+    """
+    Join column dictionaries, sort by timestamp and drop duplicate timestamps (pages and merges can overlap).
+    """
+    parts = [part for part in parts if len(part['timestamp'])]
+    if not parts:
+        return empty_columns()
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+    timestamps, index = np.unique(columns['timestamp'], return_index=True)
+    if len(index) == len(columns['timestamp']) and np.all(index[1:] > index[:-1]):
+        return columns
+    return {name: (timestamps if name == 'timestamp' else values[index]) for name, values in columns.items()}
+
+
+class PagedDownload:
+    """
+    Responses of a paged bar download, decoded as they arrive. A page answered with max_bars bars may have been cut
+    short by the API, which returns the bars from the start of the range, so it is continued with a page starting
+    after its last bar.
+    """
+
+    def __init__(self, symbol, max_bars=MAX_BARS_PER_REQUEST):
+        self.symbol = symbol
+        self.max_bars = max_bars
+        self.parts = []
+        self.failures = []
+
+    def receive(self, pages, results):
+        """
+        Decode the responses of a round of pages.
+        :return: Pages continuing the ones that came back full, to request in the next round.
+        """
+        follow_up = []
+        for page, result in zip(pages, results):
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                columns = decode_bars(result)
+            except Exception as e:
+                self.failures.append((page, str(e)))
+                continue
+            self.parts.append(columns)
+            if len(columns['timestamp']) >= self.max_bars:
+                after = EPOCH + timedelta(milliseconds=int(columns['timestamp'].max())) + timedelta(seconds=1)
+                if after <= to_datetime(page['lastdate']):
+                    follow_up.append({"firstdate": format_date(after), "lastdate": page['lastdate']})
+        return follow_up
+
+    def columns(self):
+        """
+        :return: Bars of every page, joined and sorted.
+        :raises BarDownloadError: Some pages failed.
+        """
+        if self.failures:
+            raise BarDownloadError(self.symbol, self.failures)
+        return concat_columns(self.parts)
+
+
+def merge_pages(symbol, pages, results):
+    """
+    Decode and join the responses of a paged bar download, without continuing full pages.
+    :raises BarDownloadError: Some pages failed.
+    """
+    download = PagedDownload(symbol)
+    download.receive(pages, results)
+    return download.columns()
+
+
+def to_frame(columns):
+    """
+    :return: pandas DataFrame of the columns indexed by UTC timestamp.
+    """
+    import pandas as pd
+
+    index = pd.to_datetime(columns['timestamp'], unit='ms', utc=True)
+    return pd.DataFrame({name: columns[name] for name in COLUMNS[1:]}, index=index)
@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+"""
+    === TTL CACHE FOR REFERENCE ENDPOINTS ===
+
+    Symbol details, option expirations and strikes, spread types, routes, activation triggers and crypto interest
+    rates change at most daily. CreateTSClient keeps their successful responses in a ResponseCache so repeated calls
+    are answered from memory without using rate budget.
+
+    - Every endpoint has its own time to live (DEFAULT_TTLS, overridable).
+    - The cache is bounded by entry count and by bytes and evicts least recently used entries first.
+    - Concurrent misses for the same request are coalesced: one request goes out and the other callers (threads or
+      asyncio tasks) wait for its result.
+    - Optionally persisted to a JSON file, loaded on start and written by save() or client.close().
+    - stats() reports hits, misses, coalesced misses and evictions."""
+
+# Seconds a cached response stays valid, per endpoint.
+DEFAULT_TTLS = {
+    'symbol_details': 12 * 3600,
+    'opt_expirations': 3600,
+    'opt_strikes': 3600,
+    'spread_types': 24 * 3600,
+    'routes': 24 * 3600,
+    'activation_triggers': 24 * 3600,
+    'interests': 3600,
+    # What-if order confirmations depend on prices and buying power, so they are only reused briefly.
+    'order_confirm': 10,
+}
+
+
+class _Flight:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+
+    def __init__(self, ttls=None, max_entries=4096, max_bytes=64 * 2 ** 20, path=None):
+        """
+        :param ttls: Dictionary of endpoint -> seconds overriding DEFAULT_TTLS. Endpoints with a TTL of 0 or
+        None are not cached.
+        :param max_entries: Most responses kept.
+        :param max_bytes: Most response bytes kept.
+        :param path: JSON file to persist the cache to. Loaded now if it exists.
+        """
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.bytes = 0
+        # key -> (expires at as epoch seconds, response text, size)
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._async_inflight = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def stats(self):
+        """
+        :return: Dictionary of hits, misses, coalesced, evictions, entries and bytes.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                    "evictions": self.evictions, "entries": len(self._entries), "bytes": self.bytes}
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry[2]
+
+    def get(self, key):
+        """
+        :return: Cached response text, or None if missing or expired.
+        """
+        with self._lock:
+            return self._lookup(key)
+
+    def put(self, key, endpoint, value, expires=None):
+        """
+        Store a response under the endpoint's TTL, evicting least recently used entries past the limits.
+        """
+        ttl = self.ttls.get(endpoint)
+        if not ttl and expires is None:
+            return
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires if expires is not None else time.time() + ttl, value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def get_or_load(self, key, endpoint, load):
+        """
+        Return the cached response, or call load once for all threads missing the same key at the same time.
+        :param load: Function returning (status code, response text). Only 200 responses are cached.
+        :return: Response text.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            status, value = load()
+            if status == 200:
+                self.put(key, endpoint, value)
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    async def get_or_load_async(self, key, endpoint, load):
+        """
+        Same as get_or_load for asyncio tasks.
+        :param load: Function returning an awaitable of (status code, response text).
+        """
+        import asyncio
+
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            future = self._async_inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._async_inflight[key] = asyncio.get_running_loop().create_future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            status, value = await load()
+            if status == 200:
+                self.put(key, endpoint, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Retrieve it so a lone caller does not leave an unhandled exception warning behind.
+                future.exception()
+            raise
+        finally:
+            with self._lock:
+                del self._async_inflight[key]
+
+    def save(self, path=None):
+        """
+        Write the unexpired entries to a JSON file, atomically.
+        """
+        path = path or self.path
+        if path is None:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [[list(key), expires, value] for key, (expires, value, _) in self._entries.items()
+                       if expires > now]
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp, path)
+
+    def load(self, path=None):
+        """
+        Read entries saved with save(), skipping expired ones.
+        """
+        path = path or self.path
+        with open(path, 'r') as f:
+            entries = json.load(f)
+        now = time.time()
+        for key, expires, value in entries:
+            if expires > now:
+                self.put(tuple(key), None, value, expires=expires)
@@ -1,41 +1,460 @@
-import requests
-import http.server
-import socketserver
-import requests
-import webbrowser
-from datetime import datetime, timedelta
+import os
+import threading
+from TradeStationCache import ResponseCache
+from TradeStationMetrics import NO_INSTRUMENTATION
+from TradeStationRateLimit import RateLimiter
+from TradeStationRetry import CircuitBreaker, RetryPolicy
+from TradeStationTokens import TokenManager
+import TradeStationModels as models
+from TradeStationModels import Bar, Balance, Order, OrderResult, Position, Quote
+from datetime import datetime
 import json
+import time
 
 """
     === IMPLEMENTATION OF TRADESTATION'S VERSION3 ENDPOINTS USING AUTH0 KEYS ===
     
-    Only for HTTP requests.
-    It would be better to use the HTTP streams directly from main scripts.
+    HTTP requests return the response text. Quote, bar, market depth and option chain streams are available through
+    the stream_* methods, which return TradeStationStreams.Stream objects yielding typed events.
     Generate Auth0 Code using the Generate_AuthCode.py file first if refresh code has never been created.
     
     Auth0 code and refresh code should only be generated once since post refresh token generation, the expiry of 
     refresh token is set infinite. Refresh code expiry time can be changed by contacting TradeStation support.
     
-    In case the expiry time of refresh is set ot a certain limit. You will have to generate auth code and refresh code post expiries."""
+    In case the expiry time of refresh is set ot a certain limit. You will have to generate auth code and refresh code post expiries.
+
+    Importing this module and creating a client are kept cheap for short-lived workers: requests, the thread pool and
+    the feature modules are imported when first used, and the access token is loaded on the first request. The
+    credentials can also be passed in memory or through the environment instead of the token files:
+
+        client = CreateTSClient(refresh_token=REFRESH_TOKEN, token_file=None)    # key and secret from the environment
+
+    Environment variables: TRADESTATION_CLIENT_ID, TRADESTATION_CLIENT_SECRET, TRADESTATION_REFRESH_TOKEN and
+    TRADESTATION_ACCESS_TOKEN."""
 
 
 class CreateTSClient:
 
-    def __init__(self, key: str, secret: str, redirect_uri='http://localhost:3000/'):
+    # Most symbols the API accepts in one quotes or symbol details request.
+    symbols_per_request = 50
+    # Most accounts the API accepts in one balances, positions or orders request.
+    accounts_per_request = 25
+
+    def __init__(self, key: str = None, secret: str = None, redirect_uri='http://localhost:3000/', pool_connections=2,
+                 pool_maxsize=10, keep_alive=True, timeout=20, api_url='https://api.tradestation.com',
+                 sim_api_url='https://sim-api.tradestation.com', rate_limiter=None, typed=False,
+                 response_cache=None, refresh_margin=120, background_refresh=True, token_store=None,
+                 token_url='https://signin.tradestation.com/oauth/token', instrumentation=None, retry_policy=None,
+                 circuit_breaker=None, refresh_token=None, access_token=None, token_file='access_token.txt'):
         """
-        :param key: Your API client ID or key.
-        :param secret: Your API secret key.
+        :param key: Your API client ID or key. Read from TRADESTATION_CLIENT_ID if not given.
+        :param secret: Your API secret key. Read from TRADESTATION_CLIENT_SECRET if not given.
         :param redirect_uri: Specify a different port on localhost or custom redirect_uri if requested from TradeStation. Default port is 3000.
+        :param pool_connections: Number of per-host connection pools to keep (api and sim-api by default).
+        :param pool_maxsize: Maximum number of persistent connections kept open per host.
+        :param keep_alive: Reuse connections between calls. Set to False to close the connection after every request.
+        :param timeout: Default timeout in seconds for every request, either a number or a (connect, read) tuple.
+        :param api_url: Base URL of the live API. Override to point the client at a proxy or a local stub server.
+        :param sim_api_url: Base URL of the simulator API.
+        :param rate_limiter: RateLimiter pacing requests per endpoint family. By default a new one with TradeStation's
+        250 requests per 5 minutes budget is created. Pass a shared instance to let several clients use one budget,
+        or False to disable client side rate limiting.
+        :param typed: Set to True to get TradeStationModels objects (Quote, Bar, Position, Order, Balance) from the
+        endpoints that support them instead of the response text. Decoding into models is slower than json.loads
+        and peaks higher in memory, in exchange for smaller retained responses and numeric fields converted once;
+        see TradeStationModels.
+        :param response_cache: ResponseCache for the slow-changing reference endpoints (symbol details, option
+        expirations and strikes, spread types, routes, activation triggers, interest rates). By default an in-memory
+        cache with TradeStationCache.DEFAULT_TTLS is created. Pass False to always call the API.
+        :param refresh_margin: Seconds before expiry at which the access token is refreshed in the background.
+        :param background_refresh: Refresh the access token in a background thread ahead of expiry. If False, the
+        token is refreshed when a request finds it expired or is answered with 401.
+        :param token_store: TradeStationTokens.SharedTokenStore shared by the worker processes of a host, so that one
+        of them refreshes the token and the others pick it up without a token request.
+        :param token_url: OAuth token endpoint. Override to point the client at a local stub server.
+        :param instrumentation: TradeStationMetrics.Instrumentation receiving request and response hooks, eg. a
+        MetricsCollector. By default nothing is recorded.
+        :param retry_policy: TradeStationRetry.RetryPolicy retrying requests that are safe to repeat after 429, 5xx or
+        connection failures, and setting per-endpoint timeouts if it is given any. A default RetryPolicy (which keeps
+        the timeout above for every endpoint) is created if None; pass False to send every request once.
+        :param circuit_breaker: TradeStationRetry.CircuitBreaker failing requests fast while a host keeps failing. A
+        default CircuitBreaker is created if None; pass False to disable.
+        :param refresh_token: Refresh token. Read from TRADESTATION_REFRESH_TOKEN, or else from refresh_token.txt on
+        the first refresh, if not given.
+        :param access_token: Access token to start with, eg. handed over by a parent process. Read from
+        TRADESTATION_ACCESS_TOKEN, or else from token_file on the first request, if not given. Its expiry is
+        unknown, so it is used until the API rejects it.
+        :param token_file: File the access token is loaded from and saved to. None to keep it in memory only.
         """
-        self.key = key
-        self.secret = secret
+        environ = os.environ
+        self.key = key if key is not None else environ.get('TRADESTATION_CLIENT_ID')
+        self.secret = secret if secret is not None else environ.get('TRADESTATION_CLIENT_SECRET')
         self.redirect_uri = redirect_uri
-        self.token_url = 'https://signin.tradestation.com/oauth/token'
+        self.token_url = token_url
+        self.api_url = api_url.rstrip('/')
+        self.sim_api_url = sim_api_url.rstrip('/')
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.typed = typed
+        self.instrumentation = instrumentation or NO_INSTRUMENTATION
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+        self.rate_limiter = rate_limiter
+        if response_cache is None:
+            response_cache = ResponseCache()
+        self.response_cache = response_cache
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        if circuit_breaker is None:
+            circuit_breaker = CircuitBreaker()
+        self.circuit_breaker = circuit_breaker
+
+        self.pool_connections = pool_connections
+        self.keep_alive = keep_alive
+        # One session per client so every endpoint shares the same keep-alive connection pool per host. Created on
+        # first use, together with the import of requests.
+        self._session = None
+        self._session_lock = threading.Lock()
+        # Worker threads for fanning out chunked requests, created on first use.
+        self._executor = None
+        # TradeStationOrderTracker.OrderTracker recording the outcome of order requests, if one is attached.
+        self.order_tracker = None
+        # TradeStationRecorder.Recorder writing every stream message to disk, if recording.
+        self.recorder = None
+
+        # The access token is read from token_file on the first request and then kept in memory.
+        self.tokens = TokenManager(self.key, self.secret, redirect_uri, self.token_url, lambda: self.session,
+                                   refresh_token=refresh_token or environ.get('TRADESTATION_REFRESH_TOKEN'),
+                                   access_token_file=token_file, refresh_margin=refresh_margin,
+                                   background=background_refresh, store=token_store)
+        access_token = access_token or environ.get('TRADESTATION_ACCESS_TOKEN')
+        if access_token:
+            self.tokens.set_token(access_token, None)
+
+    @property
+    def session(self):
+        """
+        requests.Session holding the client's connection pool.
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    if not self.keep_alive:
+                        session.headers['Connection'] = 'close'
+                    self._session = session
+        return self._session
+
+    @property
+    def _transient_errors(self):
+        """
+        Failures without a response that the retry policy may retry.
+        """
+        import requests
+
+        return requests.ConnectionError, requests.Timeout
+
+    @property
+    def access_token(self):
+        return self.tokens.current()
+
+    @access_token.setter
+    def access_token(self, value):
+        self.tokens.set_token(value, self.tokens.expiry)
+
+    @property
+    def access_token_expiry(self):
+        self.tokens.prepare()
+        return self.tokens.expiry
+
+    @access_token_expiry.setter
+    def access_token_expiry(self, value):
+        if isinstance(value, str):
+            value = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+        self.tokens.set_token(self.tokens.access_token, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the pooled connections and worker threads held by the client, and persist the response cache if it
+        has a file.
+        """
+        self.tokens.stop()
+        if self._session is not None:
+            self._session.close()
+        if self.response_cache:
+            self.response_cache.save()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _map(self, func, items):
+        """
+        Call func on every item concurrently using the client's worker threads. Requests are still paced by the
+        rate limiter and bounded by the connection pool size.
+        :return: Results in the order of items. Exceptions are returned in place of the result of a failed call.
+        """
+        if len(items) <= 1:
+            return [self._executor_call(func, item) for item in items]
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_maxsize)
+        futures = [self._executor.submit(self._executor_call, func, item) for item in items]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _executor_call(func, item):
+        try:
+            return func(item)
+        except Exception as e:
+            return e
+
+    def _chunk_symbols(self, symbols):
+        """
+        Drop duplicate symbols (keeping order) and split them into chunks the API accepts in one request.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        size = self.symbols_per_request
+        return [symbols[i:i + size] for i in range(0, len(symbols), size)]
 
-        # load access token
-        with open('access_token.txt', 'r') as f:
-            self.access_token = f.readline().strip()
-            self.access_token_expiry = datetime.strptime(f.readline().strip(), '%Y-%m-%d %H:%M:%S')
+    @staticmethod
+    def _merge_symbol_chunks(chunks, results, key):
+        """
+        Merge the responses of chunked symbol requests into one response in the API's own format.
+        :param chunks: Lists of symbols, one per request.
+        :param results: Response text or the exception raised, one per request.
+        :param key: Collection name in the response, eg. Quotes or Symbols.
+        :return: {key: [...], "Errors": [...]} with entries unique by symbol. A chunk that failed as a whole
+        reports an error for each of its symbols.
+        """
+        by_symbol = {}
+        errors = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                message = str(result)
+            else:
+                try:
+                    data = models.loads(result)
+                except ValueError:
+                    data = {"Message": result}
+                if isinstance(data, dict) and key in data:
+                    for item in data[key]:
+                        by_symbol.setdefault(item.get('Symbol'), item)
+                    errors.extend(data.get('Errors', []))
+                    continue
+                message = data.get('Message', result) if isinstance(data, dict) else result
+            errors.extend({"Symbol": symbol, "Error": message} for symbol in chunk)
+
+        return {key: list(by_symbol.values()), "Errors": errors}
+
+    def _fan_out(self, calls, finish, raw=False):
+        """
+        Send several requests in parallel and hand all the results to finish. AsyncTSClient overrides this with a
+        coroutine, so endpoint methods built on it work for both clients.
+        :param calls: List of (method, url, kwargs) for _request. Sent in this order as far as the worker threads go.
+        :param finish: Called with the list of response texts (or exceptions) in the order of calls.
+        :param raw: Send through _send and hand (status code, response text) to finish instead of the response text.
+        :return: Whatever finish returns.
+        """
+        send = self._send if raw else self._request
+        results = self._map(lambda call: send(call[0], call[1], **call[2]), calls)
+        return finish(results)
+
+    def _fan_out_phases(self, phases, finish, raw=False):
+        """
+        Like _fan_out, for requests that must go out in phases: the requests of a phase are sent in parallel, and the
+        next phase only starts once every response of the previous one has arrived.
+        :param phases: List of lists of (method, url, kwargs).
+        :param finish: Called with the results of all phases, in order.
+        """
+        send = self._send if raw else self._request
+        results = []
+        for calls in phases:
+            results += self._map(lambda call: send(call[0], call[1], **call[2]), calls)
+        return finish(results)
+
+    def _fan_out_rounds(self, calls, receive, finish, raw=False):
+        """
+        Like _fan_out, for requests whose responses can call for more requests: every round is sent in parallel, and
+        receive plans the next one from its results.
+        :param receive: Called with the calls and the results of a round; returns the calls of the next round, empty
+        when done.
+        :param finish: Called without arguments once a round needs no follow-up.
+        """
+        send = self._send if raw else self._request
+        while calls:
+            calls = receive(calls, self._map(lambda call: send(call[0], call[1], **call[2]), calls))
+        return finish()
+
+    def _fetch_symbol_chunks(self, url, symbols, key, model=None, cache=None):
+        """
+        Request symbols in chunks of symbols_per_request in parallel and merge the responses.
+        :param url: Endpoint URL with a {} placeholder for the comma separated symbols.
+        :param cache: Response cache endpoint name, to cache each chunk.
+        """
+        chunks = self._chunk_symbols(symbols)
+        calls = [("GET", url.format(",".join(chunk)), {"cache": cache}) for chunk in chunks]
+        return self._fan_out(calls, lambda results: self._result(self._merge_symbol_chunks(chunks, results, key),
+                                                                 model))
+
+    def _result(self, data, model=None):
+        """
+        Shape a response for the caller.
+        :param data: Response text, or an already decoded response.
+        :param model: (collection name, model class) the response decodes into when the client is typed.
+        :return: Models if the client is typed and the endpoint has a model, else the response text.
+        """
+        if self.typed and model is not None:
+            return models.decode(data, *model)
+        if isinstance(data, str):
+            return data
+        return json.dumps(data)
+
+    def _send(self, method, url, **kwargs):
+        """
+        Send a request through the pooled session with the current access token. A request answered with 401 is
+        sent once more after refreshing the token. Requests the retry policy considers safe to repeat are retried
+        after 429, 5xx and connection failures, and the circuit breaker fails requests fast while their host keeps
+        failing.
+        :param method: HTTP method.
+        :param url: Full endpoint URL.
+        :param kwargs: Passed on to requests (params, json, timeout, ...). The endpoint timeout of the retry policy,
+        or the client timeout, is used if none is given.
+        :return: (status code, response text).
+        """
+        headers = kwargs.pop('headers', None) or {}
+        policy = self.retry_policy
+        breaker = self.circuit_breaker
+        if policy:
+            kwargs = policy.prepare(method, url, kwargs)
+        kwargs.setdefault('timeout', self.timeout)
+        retryable = policy and policy.retryable(method, url, kwargs)
+        instrumentation = self.instrumentation
+        retries = 0
+        refreshed = False
+
+        while True:
+            if breaker:
+                breaker.before(url)
+            token = self.tokens.token()
+            headers['Authorization'] = f"Bearer {token}"
+            if instrumentation.enabled:
+                instrumentation.on_request(method, url)
+                started = time.perf_counter()
+            if self.rate_limiter:
+                self.rate_limiter.acquire(url)
+            if instrumentation.enabled:
+                sent_at = time.perf_counter()
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except Exception as e:
+                instrumentation.on_error(method, url, e)
+                if not isinstance(e, self._transient_errors):
+                    raise
+                if breaker:
+                    breaker.record(url, None)
+                delay = policy.delay(retries) if retryable else None
+                if delay is None:
+                    raise
+                instrumentation.on_retry(method, url, type(e).__name__)
+                time.sleep(delay)
+                retries += 1
+                continue
+            status = response.status_code
+            if self.rate_limiter:
+                self.rate_limiter.update(url, status, response.headers)
+            if breaker:
+                breaker.record(url, status)
+            if instrumentation.enabled:
+                self._observe(method, url, status, kwargs, len(response.content), started, sent_at,
+                              {'server': response.elapsed.total_seconds()})
+            if status == 401 and not refreshed:
+                refreshed = True
+                instrumentation.on_retry(method, url, 401)
+                self.tokens.refresh(stale_token=token)
+                continue
+            delay = policy.delay(retries, response.headers) if retryable and status in policy.statuses else None
+            if delay is None:
+                return status, response.text
+            instrumentation.on_retry(method, url, status)
+            time.sleep(delay)
+            retries += 1
+
+    def _order_request(self, action, request, method, url, o_id=None, **kwargs):
+        """
+        Send a place, replace or cancel request and report its outcome to the attached order tracker.
+        :param request: Order payload or order ID, as recorded in the OrderResult.
+        :return: Response text.
+        """
+        if self.order_tracker is None:
+            return self._request(method, url, **kwargs)
+
+        def finish(results):
+            result = results[0]
+            if isinstance(result, Exception):
+                raise result
+            if self.order_tracker is not None:
+                self.order_tracker.record(OrderResult.from_response(action, request, result, o_id))
+            return self._result(result[1])
+
+        return self._fan_out([(method, url, kwargs)], finish, raw=True)
+
+    def _observe(self, method, url, status, kwargs, received, started, sent_at, timings):
+        """
+        Complete the phase timings of a request and report them to the instrumentation.
+        :param timings: Phases measured by the transport: server, and dns and connect where known.
+        """
+        done = time.perf_counter()
+        measured = sum(timings.values())
+        timings['wait'] = sent_at - started
+        timings['transfer'] = max(0.0, done - sent_at - measured)
+        timings['total'] = done - started
+        body = kwargs.get('json')
+        sent = len(json.dumps(body)) if body is not None else len(kwargs.get('data') or '')
+        bucket = self.rate_limiter.bucket(url) if self.rate_limiter else None
+        self.instrumentation.on_response(method, url, status, timings, sent, received,
+                                         bucket.remaining if bucket is not None else None)
+
+    @staticmethod
+    def _cache_key(method, url, kwargs):
+        key = method, url, json.dumps(kwargs.get('params'), sort_keys=True)
+        if kwargs.get('json') is not None:
+            key += (json.dumps(kwargs['json'], sort_keys=True),)
+        return key
+
+    def _request(self, method, url, model=None, cache=None, **kwargs):
+        """
+        Send a request and shape the response for the caller.
+        :param model: (collection name, model class) for typed responses, eg. ('Quotes', Quote).
+        :param cache: Endpoint name in the response cache TTLs, for endpoints whose responses may be cached.
+        :param kwargs: See _send.
+        :return: Response body as text, or models for typed clients.
+        """
+        if cache is not None and self.response_cache:
+            text = self.response_cache.get_or_load(self._cache_key(method, url, kwargs), cache,
+                                                   lambda: self._send(method, url, **kwargs))
+        else:
+            text = self._send(method, url, **kwargs)[1]
+
+        if self.instrumentation.enabled:
+            started = time.perf_counter()
+            result = self._result(text, model)
+            self.instrumentation.on_decode(method, url, time.perf_counter() - started)
+            return result
+        return self._result(text, model)
 
     # ===================================== LOGINs ==================================================
 
@@ -53,7 +472,7 @@ class CreateTSClient:
         print(auth_code)
 
         # Send a POST request to the token endpoint to obtain a refresh token
-        response = requests.post(
+        response = self.session.post(
             self.token_url,
             headers={'Content-Type': 'application/x-www-form-urlencoded'},
             data={
@@ -71,6 +490,7 @@ class CreateTSClient:
             # Write the refresh token to a text file
             with open('refresh_token.txt', 'w') as f:
                 f.write(ref_token)
+            self.tokens.refresh_token = ref_token
 
             # Write the access token to a text file
             with open('refresh_access_token.txt', 'w') as f:
@@ -90,113 +510,129 @@ class CreateTSClient:
     def fetch_access_token(self):
         """
 
-        Get access token and expiry time of the same. Return it and save it in a text file.
+        Get access token and expiry time of the same. Return it and save it to token_file, if there is one.
+        Concurrent calls share a single refresh.
         :return: Access token and expiry time in datetime format.
 
         """
-        print('=' * 25)
-        # Read the authorization code from the text file
-        with open('refresh_token.txt', 'r') as f:
-            ref_token = f.read()
-        print(ref_token)
-        # Send a POST request to the token endpoint to obtain a refresh token
-        response = requests.post(
-            self.token_url,
-            headers={'Content-Type': 'application/x-www-form-urlencoded'},
-            data={
-                'grant_type': 'refresh_token',
-                'redirect_uri': self.redirect_uri,
-                'client_id': self.key,
-                'client_secret': self.secret,
-                'refresh_token': ref_token
-            }
-        )
-        self.access_token = response.json()['access_token']
-        self.access_token_expiry = datetime.now() + timedelta(seconds=response.json()['expires_in'] - 60)
-        self.access_token_expiry = self.access_token_expiry.strftime('%Y-%m-%d %H:%M:%S')
-
-        # Write the access token and expiry time to a text file
-        with open('access_token.txt', 'w') as f:
-            f.write(self.access_token)
-            f.write('\n')
-            f.write(self.access_token_expiry)
-
-        # Print a success message
-        print(f'Access token saved to access_token.txt')
-        print(self.access_token_expiry)
-        self.access_token_expiry = datetime.strptime(self.access_token_expiry, '%Y-%m-%d %H:%M:%S')
-        print('=' * 25)
-        return self.access_token, self.access_token_expiry
+        token, expiry = self.tokens.refresh(force=True)
+        if self.tokens.access_token_file is not None:
+            print(f'Access token saved to {self.tokens.access_token_file}, expires {expiry}')
+        return token, expiry
 
     def get_saved_access_token(self):
         """
         Get previously stored access token and expiry datetime
         :return:
         """
-        with open('access_token.txt', 'r') as f:
-            self.access_token = f.readline().strip()
-            self.access_token_expiry = f.readline().strip()
-
+        self.tokens.load()
         return self.access_token, self.access_token_expiry
 
     # ======================================= MARKET DATA =======================================================
 
-    def fetch_bars(self, symbol):
+    def fetch_bars(self, symbol, interval=None, unit=None, barsback=None, firstdate=None, lastdate=None,
+                   sessiontemplate=None):
         """
         Get market data bars for specified ticker/ symbol
         eg. AAPL
+        Parameters left as None are not sent and the API defaults apply (1 Daily bar).
+        :param interval: Number of units per bar. Up to 1440 for Minute bars, 1 for the other units.
+        :param unit: Minute, Daily, Weekly or Monthly.
+        :param barsback: Number of bars to return, counting back from lastdate. Maximum of 57,600.
+        :param firstdate: First date of the range (YYYY-mm-dd or YYYY-mm-ddTHH:MM:SSZ). Not to be used with barsback.
+        :param lastdate: Last date of the range. Defaults to now.
+        :param sessiontemplate: USEQPre, USEQPost, USEQPreAndPost, USEQ24Hour or Default.
+        :return: Bars.
         """
-        bar_url = "https://api.tradestation.com/v3/marketdata/barcharts/{}".format(symbol)
+        bar_url = self.api_url + "/v3/marketdata/barcharts/{}".format(symbol)
+        params = {"interval": interval, "unit": unit, "barsback": barsback, "firstdate": firstdate,
+                  "lastdate": lastdate, "sessiontemplate": sessiontemplate}
+        params = {key: value for key, value in params.items() if value is not None}
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
+        return self._request("GET", bar_url, params=params or None, model=('Bars', Bar))
+
+    def fetch_bar_history(self, symbol, firstdate, lastdate=None, interval=1, unit='Minute', sessiontemplate=None,
+                          as_frame=False, max_bars=None, bars_per_day=None):
+        """
+        Download bars for a long date range. The range is split into pages the API can answer in one request, sized
+        on the trading hours of the session template, the pages are requested in parallel within the rate limit and
+        decoded straight into columns. Pages that come back full are continued from their last bar.
+        Needs numpy (and pandas for as_frame).
+
+        eg. client.fetch_bar_history('MSFT', '2015-01-01', '2024-01-01', interval=1, unit='Minute')
+
+        :param symbol: Ticker/ symbol eg. AAPL
+        :param firstdate: Start of the range, as datetime or string (YYYY-mm-dd or YYYY-mm-ddTHH:MM:SSZ).
+        :param lastdate: End of the range. Defaults to now.
+        :param interval: Number of units per bar.
+        :param unit: Minute, Daily, Weekly or Monthly.
+        :param sessiontemplate: USEQPre, USEQPost, USEQPreAndPost, USEQ24Hour or Default.
+        :param as_frame: Return a pandas DataFrame indexed by timestamp instead of a dictionary of arrays.
+        :param max_bars: Bars per request. Defaults to the API maximum of 57,600.
+        :param bars_per_day: Expected bars per weekday, for symbols that do not trade US equity hours, eg. about
+        1380 for 1 minute bars of a future trading 23 hours. Estimated from the session template by default.
+        :return: Dictionary of numpy arrays: timestamp (int64 epoch milliseconds), open, high, low, close and
+        volume (float64), sorted by timestamp.
+        """
+        import TradeStationBars as bars
 
-        response = requests.request("GET", bar_url, headers=headers)
+        bar_url = self.api_url + "/v3/marketdata/barcharts/{}".format(symbol)
+        max_bars = max_bars or bars.MAX_BARS_PER_REQUEST
+        pages = bars.plan_pages(firstdate, lastdate, interval, unit, max_bars, sessiontemplate, bars_per_day)
+        params = {"interval": interval, "unit": unit}
+        if sessiontemplate is not None:
+            params["sessiontemplate"] = sessiontemplate
+        download = bars.PagedDownload(symbol, max_bars)
 
-        return response.text
+        def calls(pages):
+            return [("GET", bar_url, {"params": dict(params, **page)}) for page in pages]
+
+        def receive(sent, results):
+            pages = [{key: kwargs["params"][key] for key in ("firstdate", "lastdate")} for _, _, kwargs in sent]
+            return calls(download.receive(pages, results))
+
+        def finish():
+            columns = download.columns()
+            return bars.to_frame(columns) if as_frame else columns
+
+        return self._fan_out_rounds(calls(pages), receive, finish)
 
     def fetch_symbol_details(self, symbols):
         """
         Fetch details for the specified symbol or symbols.
         The symbol or symbols should be in a list.
-        You can get details for a maximum of 50 symbols at a time.
+        The API accepts a maximum of 50 symbols at a time. Longer lists are split into chunks of 50 which are
+        requested in parallel and merged into one response.
         :param symbols: list or string of symbol or symbols.
-        :return: Symbol details.
+        :return: Symbol details. For chunked requests failures of whole chunks are listed per symbol under Errors.
 
         """
         if isinstance(symbols, str):
             symbols = [symbols]
 
-        sd_url = "https://api.tradestation.com/v3/marketdata/symbols/{}"
+        sd_url = self.api_url + "/v3/marketdata/symbols/{}"
+        if len(symbols) > self.symbols_per_request:
+            return self._fetch_symbol_chunks(sd_url, symbols, 'Symbols', cache='symbol_details')
+
         symbol_str = ",".join(symbols)
         sd_url = sd_url.format(symbol_str)
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-
-        response = requests.request("GET", sd_url, headers=headers)
-
-        return response.text
+        return self._request("GET", sd_url, cache='symbol_details')
 
     def fetch_interests(self):
         """
         :return: Return interest rates of cryptocurrencies
         """
-        url = "https://api.tradestation.com/v3/marketdata/crypto/interestrates"
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.request("GET", url, headers=headers)
-
-        return response.text
+        url = self.api_url + "/v3/marketdata/crypto/interestrates"
+        return self._request("GET", url, cache='interests')
 
     def fetch_opt_expirations(self, symbol):
         """
         Get expiration dates for specified underlying symbol.
         """
-        bar_url = "https://api.tradestation.com/v3/marketdata/options/expirations/{}".format(symbol)
-
-        headers = {"Authorization": f"Bearer {self.access_token}"}
+        bar_url = self.api_url + "/v3/marketdata/options/expirations/{}".format(symbol)
 
-        response = requests.request("GET", bar_url, headers=headers)
-
-        return response.text
+        return self._request("GET", bar_url, cache='opt_expirations')
 
     def fetch_opt_risk_reward(self, payload):
         """
@@ -216,62 +652,243 @@ class CreateTSClient:
         }
         """
 
-        risk_reward_url = "https://api.tradestation.com/v3/marketdata/options/riskreward"
+        risk_reward_url = self.api_url + "/v3/marketdata/options/riskreward"
 
-        headers = {
-            "content-type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
-        }
+        return self._request("POST", risk_reward_url, json=payload)
 
-        response = requests.request("POST", risk_reward_url, json=payload, headers=headers)
-        return response.text
-
-    def fetch_opt_strikes(self, symbol):
+    def fetch_opt_strikes(self, symbol, expiration=None):
         """
         Fetch strike prices for an underlying.
+        :param expiration: Expiration date (MM-DD-YYYY) to list the strikes of. The next expiration by default.
         :return: collection of strikes.
         """
-        bar_url = "https://api.tradestation.com/v3/marketdata/options/strikes/{}".format(symbol)
+        bar_url = self.api_url + "/v3/marketdata/options/strikes/{}".format(symbol)
+        params = {"expiration": expiration} if expiration is not None else None
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
+        return self._request("GET", bar_url, cache='opt_strikes', params=params)
 
-        response = requests.request("GET", bar_url, headers=headers)
+    def fetch_option_chain(self, underlying, expirations=None, quotes=True):
+        """
+        Assemble the option chain of an underlying into expiration x strike x call/put arrays. The strikes of all
+        expirations are requested in parallel, then the quotes of all listed options in parallel chunks.
 
-        return response.text
+        chain = client.fetch_option_chain('MSFT', expirations=4)
+        rr = chain.verticals(chain.expirations[0]).risk_reward()
+
+        :param underlying: Underlying symbol eg. MSFT
+        :param expirations: Expiration dates (YYYY-mm-dd) to include, or the number of nearest ones. All by default.
+        :param quotes: Request the quotes of the options.
+        :return: TradeStationOptionChain.OptionChain, whose spreads are evaluated locally with risk_reward.
+        """
+        from TradeStationOptionChain import OptionChain
+
+        return OptionChain.fetch(self, underlying, expirations=expirations, quotes=quotes)
 
     def fetch_spread_types(self):
         """
         Fetch spread types.
         """
-        st_url = "https://api.tradestation.com/v3/marketdata/options/spreadtypes"
-
-        headers = {"Authorization": f"Bearer {self.access_token}"}
+        st_url = self.api_url + "/v3/marketdata/options/spreadtypes"
 
-        response = requests.request("GET", st_url, headers=headers)
-
-        return response.text
+        return self._request("GET", st_url, cache='spread_types')
 
     def fetch_quotes(self, symbols):
         """
         Get quotes for specified symbols.
         The symbol or symbols should be in a list or string(allowed for single symbol).
-        You can get details for a maximum of 50 symbols at a time.
+        The API accepts a maximum of 50 symbols at a time. Longer lists are split into chunks of 50 which are
+        requested in parallel and merged into one response.
         :param symbols: list or string of symbol or symbols.
-        :return: Symbol details.
+        :return: Quotes. For chunked requests failures of whole chunks are listed per symbol under Errors.
 
         """
         if isinstance(symbols, str):
             symbols = [symbols]
 
-        q_url = "https://api.tradestation.com/v3/marketdata/quotes/{}"
+        q_url = self.api_url + "/v3/marketdata/quotes/{}"
+        if len(symbols) > self.symbols_per_request:
+            return self._fetch_symbol_chunks(q_url, symbols, 'Quotes', model=('Quotes', Quote))
+
         symbol_str = ",".join(symbols)
         q_url = q_url.format(symbol_str)
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
+        return self._request("GET", q_url, model=('Quotes', Quote))
+
+    def quote_book(self, symbols, stream=False, **kwargs):
+        """
+        Last-value cache of quotes, filled with one fetch_quotes call and optionally kept current by quote streams
+        (one per 100 symbols). Refresh a polled book with book.poll(client), or await book.poll_async(client) with
+        AsyncTSClient, whose quote_book is a coroutine.
+        :param symbols: list of symbols.
+        :param stream: Follow quote streams from background threads.
+        :param kwargs: Stream options (heartbeat_timeout, reconnect, max_backoff, recorder).
+        :return: TradeStationQuoteBook.QuoteBook; read prices with book.get(symbol) or book.column('last').
+        """
+        from TradeStationQuoteBook import QuoteBook
+
+        book = QuoteBook(symbols, capacity=max(len(symbols), 1024))
+        book.poll(self)
+        if stream:
+            for i in range(0, len(symbols), 100):
+                book.follow(self.stream_quotes(symbols[i:i + 100], **kwargs))
+        return book
+
+    def bar_engine(self, symbols, firstdate=None, stream=False, sessiontemplate=None, **kwargs):
+        """
+        Resampled bars and rolling indicators of symbols, backfilled from minute bar history and optionally kept
+        current by minute bar streams (one per symbol). CreateTSClient only, since the backfill is synchronous.
+        :param symbols: list of symbols.
+        :param firstdate: Backfill minute bars from this date (YYYY-mm-dd) with fetch_bar_history. No backfill if
+        None.
+        :param stream: Follow a minute bar stream per symbol from background threads.
+        :param sessiontemplate: USEQPre, USEQPost, USEQPreAndPost, USEQ24Hour or Default, for backfill and streams.
+        :param kwargs: BarEngine options (frames, depth, ema, atr, window, session_offset).
+        :return: TradeStationBarEngine.BarEngine; read it with engine.snapshot(minutes) or engine.get(symbol, name).
+        """
+        from TradeStationBarEngine import BarEngine
+
+        engine = BarEngine(symbols, capacity=max(len(symbols), 1024), **kwargs)
+        if firstdate is not None:
+            for symbol in symbols:
+                engine.backfill(symbol, self.fetch_bar_history(symbol, firstdate, sessiontemplate=sessiontemplate))
+        if stream:
+            for symbol in symbols:
+                engine.follow(self.stream_bars(symbol, sessiontemplate=sessiontemplate), symbol)
+        return engine
+
+    # ===================================== MARKET DATA STREAMS =================================================
+
+    def record_streams(self, directory='recordings', **kwargs):
+        """
+        Record every message received by this client's streams, including those already open once they reconnect,
+        until recorder.close(). Replay the files with TradeStationRecorder.Replay(directory).
+        :param directory: Folder the log files are written to.
+        :param kwargs: Recorder options (prefix, streams, batch_size, flush_interval, rotate_bytes, level).
+        :return: TradeStationRecorder.Recorder, also set as client.recorder.
+        """
+        from TradeStationRecorder import Recorder
+
+        self.recorder = Recorder(directory, **kwargs)
+        return self.recorder
 
-        response = requests.request("GET", q_url, headers=headers)
+    def stream_quotes(self, symbols, **kwargs):
+        """
+        Stream quote updates for the specified symbols.
+        :param symbols: list or string of symbol or symbols (maximum of 100 per stream).
+        :param kwargs: Stream options (heartbeat_timeout, reconnect, max_backoff, recorder).
+        :return: Stream of DataEvent (quote changes), HeartbeatEvent, StatusEvent and ErrorEvent.
+        """
+        if isinstance(symbols, str):
+            symbols = [symbols]
+
+        url = self.api_url + "/v3/marketdata/stream/quotes/{}".format(",".join(symbols))
+
+        from TradeStationStreams import Stream
+
+        return Stream(self, url, 'quotes', **kwargs)
+
+    def stream_bars(self, symbol, interval=1, unit='Minute', barsback=None, sessiontemplate=None, **kwargs):
+        """
+        Stream bars for a symbol. The most recent barsback bars are sent first, followed by live updates.
+        :param symbol: Ticker/ symbol eg. AAPL
+        :param interval: Number of units per bar.
+        :param unit: Minute, Daily, Weekly or Monthly.
+        :param barsback: Number of historical bars to send before live updates.
+        :param sessiontemplate: USEQPre, USEQPost, USEQPreAndPost, USEQ24Hour or Default.
+        :param kwargs: Stream options (heartbeat_timeout, reconnect, max_backoff, recorder).
+        :return: Stream of DataEvent (bars), HeartbeatEvent, StatusEvent and ErrorEvent.
+        """
+        url = self.api_url + "/v3/marketdata/stream/barcharts/{}".format(symbol)
+        params = {"interval": interval, "unit": unit}
+        if barsback is not None:
+            params["barsback"] = barsback
+        if sessiontemplate is not None:
+            params["sessiontemplate"] = sessiontemplate
+
+        from TradeStationStreams import Stream
+
+        return Stream(self, url, 'bars', params=params, **kwargs)
+
+    def stream_market_depth(self, symbol, maxlevels=None, aggregate=False, **kwargs):
+        """
+        Stream level 2 market depth for a symbol.
+        :param symbol: Ticker/ symbol eg. AAPL
+        :param maxlevels: Number of price levels per side.
+        :param aggregate: Set to True to stream depth aggregated per price level instead of per participant.
+        :param kwargs: Stream options (heartbeat_timeout, reconnect, max_backoff, recorder).
+        :return: Stream of DataEvent (bids and asks), HeartbeatEvent, StatusEvent and ErrorEvent.
+        """
+        kind = 'aggregates' if aggregate else 'quotes'
+        url = self.api_url + "/v3/marketdata/stream/marketdepth/{}/{}".format(kind, symbol)
+        params = {"maxlevels": maxlevels} if maxlevels is not None else None
+
+        from TradeStationStreams import Stream
+
+        return Stream(self, url, 'marketdepth', params=params, **kwargs)
+
+    def stream_option_chain(self, underlying, expiration=None, strike_proximity=None, spread_type=None,
+                            **kwargs):
+        """
+        Stream the option chain of an underlying symbol.
+        :param underlying: Underlying symbol eg. MSFT
+        :param expiration: Expiration date (YYYY-mm-dd). The nearest expiration is used if not given.
+        :param strike_proximity: Number of strikes above and below the underlying price.
+        :param spread_type: Spread type from fetch_spread_types. Defaults to Single.
+        :param kwargs: Stream options (heartbeat_timeout, reconnect, max_backoff, recorder).
+        :return: Stream of DataEvent (chain rows), HeartbeatEvent, StatusEvent and ErrorEvent.
+        """
+        url = self.api_url + "/v3/marketdata/stream/options/chains/{}".format(underlying)
+        params = {}
+        if expiration is not None:
+            params["expiration"] = expiration
+        if strike_proximity is not None:
+            params["strikeProximity"] = strike_proximity
+        if spread_type is not None:
+            params["spreadType"] = spread_type
+
+        from TradeStationStreams import Stream
+
+        return Stream(self, url, 'optionchains', params=params or None, **kwargs)
+
+    # ====================================== BROKERAGE STREAMS ================================================
+
+    def stream_orders(self, accounts, sim=True, **kwargs):
+        """
+        Stream order updates of accounts. The orders of the accounts are sent first, followed by every change.
+        :param accounts: account in string or accounts in list.
+        :param sim: Sim set to True will access the simulator endpoints.
+        :param kwargs: Stream options (heartbeat_timeout, reconnect, max_backoff, recorder).
+        :return: Stream of DataEvent (orders), HeartbeatEvent, StatusEvent and ErrorEvent.
+        """
+        if isinstance(accounts, str):
+            accounts = [accounts]
+
+        base_url = self.sim_api_url if sim else self.api_url
+        url = base_url + "/v3/brokerage/stream/accounts/{}/orders".format(",".join(accounts))
+
+        from TradeStationStreams import Stream
+
+        return Stream(self, url, 'orders', **kwargs)
+
+    def stream_positions(self, accounts, changes=False, sim=True, **kwargs):
+        """
+        Stream position updates of accounts. The positions of the accounts are sent first, followed by every change.
+        :param accounts: account in string or accounts in list.
+        :param changes: Send only the fields that changed after the first message of a position; closed positions
+        are sent with Deleted set.
+        :param sim: Sim set to True will access the simulator endpoints.
+        :param kwargs: Stream options (heartbeat_timeout, reconnect, max_backoff, recorder).
+        :return: Stream of DataEvent (positions), HeartbeatEvent, StatusEvent and ErrorEvent.
+        """
+        if isinstance(accounts, str):
+            accounts = [accounts]
+
+        base_url = self.sim_api_url if sim else self.api_url
+        url = base_url + "/v3/brokerage/stream/accounts/{}/positions".format(",".join(accounts))
 
-        return response.text
+        from TradeStationStreams import Stream
+
+        return Stream(self, url, 'positions', params={"changes": "true"} if changes else None, **kwargs)
 
     # =========================================== BROKERAGE ===================================================
     def fetch_accounts(self, sim=True):
@@ -279,15 +896,11 @@ class CreateTSClient:
         Fetch listed accounts.
         """
         if sim:
-            acc_url = "https://sim-api.tradestation.com/v3/brokerage/accounts"
+            acc_url = self.sim_api_url + "/v3/brokerage/accounts"
         else:
-            acc_url = "https://api.tradestation.com/v3/brokerage/accounts"
-
-        headers = {"Authorization": f"Bearer {self.access_token}"}
+            acc_url = self.api_url + "/v3/brokerage/accounts"
 
-        response = requests.request("GET", acc_url, headers=headers)
-
-        return response.text
+        return self._request("GET", acc_url)
 
     def fetch_balances(self, accounts, sim=True):
         """
@@ -297,20 +910,16 @@ class CreateTSClient:
         :return: Account balances.
         """
         if sim:
-            bal_url = "https://sim-api.tradestation.com/v3/brokerage/accounts/{}/balances"
+            bal_url = self.sim_api_url + "/v3/brokerage/accounts/{}/balances"
         else:
-            bal_url = "https://api.tradestation.com/v3/brokerage/accounts/{}/balances"
+            bal_url = self.api_url + "/v3/brokerage/accounts/{}/balances"
 
         if isinstance(accounts, str):
             accounts = [accounts]
-        accounts_str = ", ".join(accounts)
+        accounts_str = ",".join(accounts)
         bal_url = bal_url.format(accounts_str)
-        print(bal_url)
-
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.request("GET", bal_url, headers=headers, timeout=20)
 
-        return response.text
+        return self._request("GET", bal_url, model=('Balances', Balance))
 
     def fetch_bod_balances(self, accounts, sim=True):
         """
@@ -320,59 +929,62 @@ class CreateTSClient:
         :return: Account balances.
         """
         if sim:
-            bod_bal_url = "https://sim-api.tradestation.com/v3/brokerage/accounts/{}/bodbalances"
+            bod_bal_url = self.sim_api_url + "/v3/brokerage/accounts/{}/bodbalances"
         else:
-            bod_bal_url = "https://api.tradestation.com/v3/brokerage/accounts/{}/bodbalances"
+            bod_bal_url = self.api_url + "/v3/brokerage/accounts/{}/bodbalances"
 
         if isinstance(accounts, str):
             accounts = [accounts]
-        accounts_str = ", ".join(accounts)
+        accounts_str = ",".join(accounts)
         bod_bal_url = bod_bal_url.format(accounts_str)
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.request("GET", bod_bal_url, headers=headers, timeout=20)
-
-        return response.text
+        return self._request("GET", bod_bal_url)
 
-    def fetch_hist_orders(self, accounts, since_date, sim=True):
+    def fetch_hist_orders(self, accounts, since_date, sim=True, page_size=None, next_token=None):
         """
         Fetch orders for one or multiple accounts if passed as list.
+        Only one page is returned; use iter_hist_orders to walk all of them.
         :param accounts: account in string or accounts in list.
         :param since_date: starting date for historical orders(string only with format YYYY-mm-dd).
         :param sim: Sim set to True will access the simulator endpoints.
+        :param page_size: Orders per page, at most 600.
+        :param next_token: NextToken of the previous page, to fetch the page after it.
         :return: Historical orders for given accounts and time range.
         """
         if sim:
-            hist_orders_url = "https://sim-api.tradestation.com/v3/brokerage/accounts/{}/historicalorders"
+            hist_orders_url = self.sim_api_url + "/v3/brokerage/accounts/{}/historicalorders"
         else:
-            hist_orders_url = "https://api.tradestation.com/v3/brokerage/accounts/{}/historicalorders"
+            hist_orders_url = self.api_url + "/v3/brokerage/accounts/{}/historicalorders"
 
         if isinstance(accounts, str):
             accounts = [accounts]
 
         query = {"since": since_date}
+        if page_size is not None:
+            query["pageSize"] = page_size
+        if next_token is not None:
+            query["nextToken"] = next_token
 
-        accounts_str = ", ".join(accounts)
+        accounts_str = ",".join(accounts)
         hist_orders_url = hist_orders_url.format(accounts_str)
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.request("GET", hist_orders_url, headers=headers, params=query)
+        return self._request("GET", hist_orders_url, params=query, model=('Orders', Order))
 
-        return response.text
-
-    def fetch_hist_orders_by_oid(self, accounts, since_date, o_id, sim=True):
+    def fetch_hist_orders_by_oid(self, accounts, since_date, o_id, sim=True, page_size=None, next_token=None):
         """
         Fetch order details for specified order IDs for one or multiple accounts if passed as list.
         :param accounts: account in string or accounts in list.
         :param since_date: starting date for historical orders(string only with format YYYY-mm-dd).
         :param sim: Sim set to True will access the simulator endpoints.
         :param o_id: list of order ID/s.
+        :param page_size: Orders per page, at most 600.
+        :param next_token: NextToken of the previous page, to fetch the page after it.
         :return: Historical orders for given accounts and time range.
         """
         if sim:
-            hist_orders_oid_url = "https://sim-api.tradestation.com/v3/brokerage/accounts/{}/historicalorders/{}"
+            hist_orders_oid_url = self.sim_api_url + "/v3/brokerage/accounts/{}/historicalorders/{}"
         else:
-            hist_orders_oid_url = "https://api.tradestation.com/v3/brokerage/accounts/{}/historicalorders/{}"
+            hist_orders_oid_url = self.api_url + "/v3/brokerage/accounts/{}/historicalorders/{}"
 
         if isinstance(accounts, str):
             accounts = [accounts]
@@ -381,33 +993,56 @@ class CreateTSClient:
             o_id = [o_id]
 
         query = {"since": since_date}
+        if page_size is not None:
+            query["pageSize"] = page_size
+        if next_token is not None:
+            query["nextToken"] = next_token
 
-        accounts_str = ", ".join(accounts)
-        o_id_str = ", ".join(o_id)
+        accounts_str = ",".join(accounts)
+        o_id_str = ",".join(o_id)
 
         hist_orders_oid_url = hist_orders_oid_url.format(accounts_str, o_id_str)
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.request("GET", hist_orders_oid_url, headers=headers, params=query)
+        return self._request("GET", hist_orders_oid_url, params=query, model=('Orders', Order))
+
+    def iter_hist_orders(self, accounts, since_date, o_ids=None, page_size=600, next_token=None, checkpoint=None,
+                         sim=True):
+        """
+        Walk every page of historical orders lazily, prefetching the next page in the background.
 
-        return response.text
+        for order in client.iter_hist_orders(ACCOUNT, '2024-01-01'):
+            print(order.order_id, order.status)
+
+        :param accounts: account in string or accounts in list.
+        :param since_date: starting date for historical orders(string only with format YYYY-mm-dd).
+        :param o_ids: Order ID or list of order IDs to restrict the history to.
+        :param page_size: Orders per page, at most 600.
+        :param next_token: Page token to resume from (history.resume_token of an earlier run).
+        :param checkpoint: File to save the resume token to after every page and resume from on start.
+        :param sim: Sim set to True will access the simulator endpoints.
+        :return: TradeStationOrderHistory.OrderHistory yielding Order models, with to_csv and to_parquet. Raises
+        TypeError on AsyncTSClient, whose requests cannot be iterated synchronously.
+        """
+        from TradeStationOrderHistory import OrderHistory
+
+        return OrderHistory(self, accounts, since_date, o_ids=o_ids, page_size=page_size, next_token=next_token,
+                            checkpoint=checkpoint, sim=sim)
 
     def fetch_positions(self, account, sim=True):
         """
         Fetch placed positions of the account
 
-        :param account: Account number
+        :param account: Account number, or account numbers in list.
         :param sim: Set to True to use the simulation account
         :return: Placed Positions
         """
+        if not isinstance(account, str):
+            account = ",".join(account)
         if sim:
-            pos_url = "https://sim-api.tradestation.com/v3/brokerage/accounts/{}/positions".format(account)
+            pos_url = self.sim_api_url + "/v3/brokerage/accounts/{}/positions".format(account)
         else:
-            pos_url = "https://api.tradestation.com/v3/brokerage/accounts/{}/positions".format(account)
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.request("GET", pos_url, headers=headers, timeout=20)
-
-        return response.text
+            pos_url = self.api_url + "/v3/brokerage/accounts/{}/positions".format(account)
+        return self._request("GET", pos_url, model=('Positions', Position))
 
     def fetch_orders(self, accounts, sim=True):
         """
@@ -417,20 +1052,16 @@ class CreateTSClient:
         :return: Orders for given accounts.
         """
         if sim:
-            orders_url = "https://sim-api.tradestation.com/v3/brokerage/accounts/{}/orders"
+            orders_url = self.sim_api_url + "/v3/brokerage/accounts/{}/orders"
         else:
-            orders_url = "https://api.tradestation.com/v3/brokerage/accounts/{}/orders"
+            orders_url = self.api_url + "/v3/brokerage/accounts/{}/orders"
 
         if isinstance(accounts, str):
             accounts = [accounts]
-        accounts_str = ", ".join(accounts)
+        accounts_str = ",".join(accounts)
         orders_url = orders_url.format(accounts_str)
-        print(orders_url)
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.request("GET", orders_url, headers=headers, timeout=20)
-
-        return response.text
+        return self._request("GET", orders_url, model=('Orders', Order))
 
     def fetch_orders_by_oid(self, accounts, o_id, sim=True):
         """
@@ -441,9 +1072,9 @@ class CreateTSClient:
         :return: Orders for given accounts and order IDs.
         """
         if sim:
-            orders_oid_url = "https://sim-api.tradestation.com/v3/brokerage/accounts/{}/orders/{}"
+            orders_oid_url = self.sim_api_url + "/v3/brokerage/accounts/{}/orders/{}"
         else:
-            orders_oid_url = "https://api.tradestation.com/v3/brokerage/accounts/{}/orders/{}"
+            orders_oid_url = self.api_url + "/v3/brokerage/accounts/{}/orders/{}"
 
         if isinstance(accounts, str):
             accounts = [accounts]
@@ -451,15 +1082,71 @@ class CreateTSClient:
         if isinstance(o_id, str):
             o_id = [o_id]
 
-        accounts_str = ", ".join(accounts)
-        o_id_str = ", ".join(o_id)
+        accounts_str = ",".join(accounts)
+        o_id_str = ",".join(o_id)
 
         orders_oid_url = orders_oid_url.format(accounts_str, o_id_str)
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.request("GET", orders_oid_url, headers=headers)
+        return self._request("GET", orders_oid_url, model=('Orders', Order))
+
+    def fetch_snapshot(self, accounts, sim=True):
+        """
+        Fetch balances, positions and orders of many accounts concurrently, in chunks of accounts_per_request. Every
+        page of orders is fetched, following NextToken.
+        :param accounts: account in string or accounts in list.
+        :param sim: Sim set to True will access the simulator endpoints.
+        :return: TradeStationSnapshot.Snapshot of typed models, whether or not the client is typed.
+        """
+        from TradeStationSnapshot import SECTIONS, Snapshot, next_page_token
+
+        if isinstance(accounts, str):
+            accounts = [accounts]
+        accounts = list(dict.fromkeys(accounts))
+        base_url = (self.sim_api_url if sim else self.api_url) + "/v3/brokerage/accounts/{}/{}"
+        size = self.accounts_per_request
+        chunks = [accounts[i:i + size] for i in range(0, len(accounts), size)]
+
+        # (section, chunk) of the requests in flight, and of every request answered so far with its result.
+        pending = [(section, chunk) for section in SECTIONS for chunk in chunks]
+        answered = []
+        calls = [("GET", base_url.format(",".join(chunk), SECTIONS[section][0]), {}) for section, chunk in pending]
+
+        def receive(sent, results):
+            current = pending[:]
+            del pending[:]
+            answered.extend(zip(current, results))
+            follow_up = []
+            for request, (method, url, _), result in zip(current, sent, results):
+                token = next_page_token(result) if request[0] == 'orders' else None
+                if token is not None:
+                    pending.append(request)
+                    follow_up.append((method, url, {"params": {"nextToken": token}}))
+            return follow_up
+
+        def finish():
+            return Snapshot.from_responses(accounts, [request for request, _ in answered],
+                                           [result for _, result in answered])
+
+        return self._fan_out_rounds(calls, receive, finish)
+
+    def track_orders(self, accounts, sim=True, positions=True, **kwargs):
+        """
+        Keep the orders and positions of accounts in memory from the brokerage streams, instead of polling
+        fetch_orders. Orders placed, replaced and cancelled through this client are recorded as well.
+
+        tracker = client.track_orders(ACCOUNT)
+        order = tracker.filled(order_id).result(timeout=30)
 
-        return response.text
+        :param accounts: account in string or accounts in list.
+        :param sim: Sim set to True will follow the simulator accounts.
+        :param positions: Follow the position stream as well.
+        :param kwargs: Stream options (heartbeat_timeout, max_backoff).
+        :return: Started TradeStationOrderTracker.OrderTracker. With AsyncTSClient create an OrderTracker and await
+        its run() instead.
+        """
+        from TradeStationOrderTracker import OrderTracker
+
+        return OrderTracker(self, accounts, sim=sim, positions=positions, **kwargs).start()
 
     def get_crypto_wallets(self, crypto_account):
         """
@@ -467,12 +1154,9 @@ class CreateTSClient:
         :param crypto_account: A Cryptocurrency wallet account ID.
         :return: Wallet information.
         """
-        wallet_url = "https://api.tradestation.com/v3/brokerage/accounts/{}/wallets".format(crypto_account)
-
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.request("GET", wallet_url, headers=headers)
+        wallet_url = self.api_url + "/v3/brokerage/accounts/{}/wallets".format(crypto_account)
 
-        return response.text
+        return self._request("GET", wallet_url)
 
     # =========================================== EXECUTION ===================================================
     def confirm_order(self, payload):
@@ -493,16 +1177,9 @@ class CreateTSClient:
         :param payload: Pass a dictionary imitating the order you wish to place. This will only estimate pricing and
         info. and not place any order. :return: Order estimated pricing, commision and other information.
         """
-        confirm_url = "https://api.tradestation.com/v3/orderexecution/orderconfirm"
+        confirm_url = self.api_url + "/v3/orderexecution/orderconfirm"
 
-        headers = {
-            "content-type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
-        }
-
-        response = requests.request("POST", confirm_url, json=payload, headers=headers)
-
-        return response.text
+        return self._request("POST", confirm_url, json=payload)
 
     def confirm_group_order(self, payload):
         """
@@ -549,16 +1226,44 @@ class CreateTSClient:
         pricing and information and won't place any order. :return: Order estimated pricing, commision and other
         information.
         """
-        confirm_group_url = "https://api.tradestation.com/v3/orderexecution/orderconfirm"
-
-        headers = {
-            "content-type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
-        }
+        confirm_group_url = self.api_url + "/v3/orderexecution/ordergroupconfirm"
 
-        response = requests.request("POST", confirm_group_url, json=payload, headers=headers)
+        return self._request("POST", confirm_group_url, json=payload)
 
-        return response.text
+    def estimate_orders(self, orders=(), groups=(), cache=True):
+        """
+        Confirm many what-if orders and order groups concurrently without placing them. Identical payloads are sent
+        once and paced by the rate limiter.
+
+        estimates = client.estimate_orders(orders=variants)
+        costs = estimates.columns()['cost']
+
+        :param orders: Order payloads, as for confirm_order.
+        :param groups: Group payloads, as for confirm_group_order.
+        :param cache: Reuse confirmations of identical payloads made in the last few seconds (see the response
+        cache's 'order_confirm' TTL).
+        :return: TradeStationEstimates.Estimates with one Estimate (cost, commission, buying power effect) per
+        variant, orders first, then groups. A failed variant never raises; check estimate.ok.
+        """
+        from TradeStationEstimates import Estimate, Estimates
+
+        urls = {'order': self.api_url + "/v3/orderexecution/orderconfirm",
+                'group': self.api_url + "/v3/orderexecution/ordergroupconfirm"}
+        variants = [('order', payload) for payload in orders] + [('group', payload) for payload in groups]
+        keys = [(kind, json.dumps(payload, sort_keys=True)) for kind, payload in variants]
+        # Request key -> index of the call sending it.
+        unique = {}
+        calls = []
+        for key, (kind, payload) in zip(keys, variants):
+            if key not in unique:
+                unique[key] = len(calls)
+                calls.append(("POST", urls[kind], {"json": payload, "cache": 'order_confirm' if cache else None}))
+
+        def finish(results):
+            return Estimates(Estimate.from_response(kind, payload, results[unique[key]])
+                             for key, (kind, payload) in zip(keys, variants))
+
+        return self._fan_out(calls, finish)
 
     def place_orders(self, payload, sim=True):
         """
@@ -580,18 +1285,11 @@ class CreateTSClient:
         """
 
         if sim:
-            place_order_url = "https://sim-api.tradestation.com/v3/orderexecution/orders"
+            place_order_url = self.sim_api_url + "/v3/orderexecution/orders"
         else:
-            place_order_url = "https://api.tradestation.com/v3/orderexecution/orders"
+            place_order_url = self.api_url + "/v3/orderexecution/orders"
 
-        headers = {
-            "content-type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
-        }
-
-        response = requests.request("POST", place_order_url, json=payload, headers=headers)
-
-        return response.text
+        return self._order_request('place', payload, "POST", place_order_url, json=payload)
 
     def place_group_orders(self, payload, sim=True):
         """
@@ -629,18 +1327,11 @@ class CreateTSClient:
         """
 
         if sim:
-            place_group_order_url = "https://sim-api.tradestation.com/v3/orderexecution/ordergroups"
+            place_group_order_url = self.sim_api_url + "/v3/orderexecution/ordergroups"
         else:
-            place_group_order_url = "https://api.tradestation.com/v3/orderexecution/ordergroups"
+            place_group_order_url = self.api_url + "/v3/orderexecution/ordergroups"
 
-        headers = {
-            "content-type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
-        }
-
-        response = requests.request("POST", place_group_order_url, json=payload, headers=headers)
-
-        return response.text
+        return self._order_request('place', payload, "POST", place_group_order_url, json=payload)
 
     def replace_order(self, o_id, payload, sim=True):
         """
@@ -660,18 +1351,11 @@ class CreateTSClient:
         """
 
         if sim:
-            replace_url = "https://sim-api.tradestation.com/v3/orderexecution/orders/{}".format(o_id)
+            replace_url = self.sim_api_url + "/v3/orderexecution/orders/{}".format(o_id)
         else:
-            replace_url = "https://api.tradestation.com/v3/orderexecution/orders/{}".format(o_id)
+            replace_url = self.api_url + "/v3/orderexecution/orders/{}".format(o_id)
 
-        headers = {
-            "content-type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
-        }
-
-        response = requests.request("PUT", replace_url, json=payload, headers=headers)
-
-        return response.text
+        return self._order_request('replace', (o_id, payload), "PUT", replace_url, o_id=o_id, json=payload)
 
     def cancel_order(self, o_id, sim=True):
         """
@@ -683,40 +1367,95 @@ class CreateTSClient:
         """
 
         if sim:
-            cancel_url = "https://sim-api.tradestation.com/v3/orderexecution/orders/{}".format(o_id)
+            cancel_url = self.sim_api_url + "/v3/orderexecution/orders/{}".format(o_id)
         else:
-            cancel_url = "https://api.tradestation.com/v3/orderexecution/orders/{}".format(o_id)
+            cancel_url = self.api_url + "/v3/orderexecution/orders/{}".format(o_id)
+
+        return self._order_request('cancel', o_id, "DELETE", cancel_url, o_id=o_id)
+
+    def execute_orders_bulk(self, places=(), replaces=(), cancels=(), sim=True, priority=True):
+        """
+        Place, replace and cancel many orders concurrently over the pooled connections, paced by the rate limiter.
+        Up to pool_maxsize requests are in flight at once (all of them with AsyncTSClient, within its pool).
+
+        results = client.execute_orders_bulk(places=new_orders, cancels=stale_order_ids)
+        failed = [result for result in results if not result.ok]
 
-        headers = {
-            "content-type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
+        :param places: Order payloads to place, as for place_orders.
+        :param replaces: (order ID, payload) pairs or a dictionary of order ID -> payload, as for replace_order.
+        :param cancels: Order IDs to cancel.
+        :param sim: Set to true if you need to work on simulation account.
+        :param priority: Send all cancels and wait for their responses, then all replaces, then the new orders, so
+        that orders being taken down free buying power and position before new ones arrive. Each phase costs one
+        round trip. If False, everything is sent at once, in the order places, replaces, cancels, and may reach the
+        server interleaved.
+        :return: List of TradeStationModels.OrderResult, one per order in the order the requests were sent. A failed
+        order never raises; check result.ok.
+        """
+        base_url = (self.sim_api_url if sim else self.api_url) + "/v3/orderexecution/orders"
+        if isinstance(replaces, dict):
+            replaces = replaces.items()
+
+        groups = {
+            'place': [(payload, None, ("POST", base_url, {"json": payload})) for payload in places],
+            'replace': [((o_id, payload), o_id, ("PUT", base_url + "/{}".format(o_id), {"json": payload}))
+                        for o_id, payload in replaces],
+            'cancel': [(o_id, o_id, ("DELETE", base_url + "/{}".format(o_id), {})) for o_id in cancels],
         }
+        order = ('cancel', 'replace', 'place') if priority else ('place', 'replace', 'cancel')
+        requests_sent = [(action, request, o_id, call) for action in order
+                         for request, o_id, call in groups[action]]
+
+        def finish(results):
+            results = [OrderResult.from_response(action, request, result, o_id)
+                       for (action, request, o_id, _), result in zip(requests_sent, results)]
+            if self.order_tracker is not None:
+                for result in results:
+                    self.order_tracker.record(result)
+            return results
+
+        if not priority:
+            return self._fan_out([call for _, _, _, call in requests_sent], finish, raw=True)
+        phases = [[call for _, _, call in groups[action]] for action in order if groups[action]]
+        return self._fan_out_phases(phases, finish, raw=True)
+
+    def place_orders_bulk(self, payloads, sim=True):
+        """
+        Place many orders concurrently. See execute_orders_bulk.
+        :param payloads: List of order payloads, as for place_orders.
+        :return: List of OrderResult in the order of payloads.
+        """
+        return self.execute_orders_bulk(places=payloads, sim=sim)
 
-        response = requests.request("DELETE", cancel_url, headers=headers)
+    def replace_orders_bulk(self, replaces, sim=True):
+        """
+        Modify many active orders concurrently. See execute_orders_bulk.
+        :param replaces: (order ID, payload) pairs or a dictionary of order ID -> payload.
+        :return: List of OrderResult in the order of replaces.
+        """
+        return self.execute_orders_bulk(replaces=replaces, sim=sim)
 
-        return response.text
+    def cancel_orders_bulk(self, o_ids, sim=True):
+        """
+        Cancel many active orders concurrently. See execute_orders_bulk.
+        :param o_ids: List of order IDs.
+        :return: List of OrderResult in the order of o_ids.
+        """
+        return self.execute_orders_bulk(cancels=o_ids, sim=sim)
 
     def fetch_activation_triggers(self):
         """
         :return: List of valid activation trigger methods.
         """
 
-        act_url = "https://api.tradestation.com/v3/orderexecution/activationtriggers"
-
-        headers = {"Authorization": f"Bearer {self.access_token}"}
+        act_url = self.api_url + "/v3/orderexecution/activationtriggers"
 
-        response = requests.request("GET", act_url, headers=headers)
-
-        return response.text
+        return self._request("GET", act_url, cache='activation_triggers')
 
     def fetch_routes(self):
         """
         :return: Fetch a list of available routes for placing an order.
         """
-        routes_url = "https://api.tradestation.com/v3/orderexecution/routes"
-
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-
-        response = requests.request("GET", routes_url, headers=headers)
+        routes_url = self.api_url + "/v3/orderexecution/routes"
 
-        return response.text
+        return self._request("GET", routes_url, cache='routes')
@@ -0,0 +1,114 @@
+import numpy as np
+
+import TradeStationModels as models
+from TradeStationModels import to_float
+
+"""
+    === BATCHED PRE-TRADE ESTIMATES ===
+
+    client.estimate_orders runs many what-if orders and order groups through the order confirmation endpoints at
+    once. Single orders go to /orderconfirm and groups to /ordergroupconfirm, concurrently and paced by the rate
+    limiter. Identical payloads are sent once, and confirmations are kept in the response cache for a few seconds
+    ('order_confirm' in TradeStationCache.DEFAULT_TTLS), so running the same variants again right away costs
+    nothing.
+
+        estimates = client.estimate_orders(orders=variants)
+        table = estimates.columns()
+        affordable = table['buying_power_effect'] > -available
+
+    The result is an Estimates list with one Estimate per variant, in the order given (orders, then groups).
+    Amounts of a group are the sums over its orders."""
+
+# Numeric columns of Estimates.columns().
+COLUMNS = ('price', 'cost', 'commission', 'buying_power_effect')
+
+
+class Estimate:
+    """
+    Estimated cost of one order or order group.
+    """
+    __slots__ = ('kind', 'request', 'ok', 'price', 'cost', 'commission', 'buying_power_effect', 'summary',
+                 'message', 'response')
+
+    def __init__(self, kind, request, ok, price=None, cost=None, commission=None, buying_power_effect=None,
+                 summary=None, message=None, response=None):
+        """
+        :param kind: 'order' or 'group'.
+        :param request: Payload, as passed in.
+        :param ok: True if the API confirmed the variant.
+        :param price: Estimated price (of the only order of the variant).
+        :param cost: Estimated cost.
+        :param commission: Estimated commission.
+        :param buying_power_effect: Estimated debit (negative) or credit (positive) to buying power
+        (DebitCreditEstimatedCost).
+        :param summary: Summary messages of the confirmations, one per line.
+        :param message: Error reported by the API, or the exception text.
+        :param response: Decoded response body.
+        """
+        self.kind = kind
+        self.request = request
+        self.ok = ok
+        self.price = price
+        self.cost = cost
+        self.commission = commission
+        self.buying_power_effect = buying_power_effect
+        self.summary = summary
+        self.message = message
+        self.response = response
+
+    def __repr__(self):
+        if not self.ok:
+            return 'Estimate({}, ok=False, message={!r})'.format(self.kind, self.message)
+        return 'Estimate({}, cost={}, commission={}, buying_power_effect={})'.format(
+            self.kind, self.cost, self.commission, self.buying_power_effect)
+
+    @staticmethod
+    def _sum(confirmations, key):
+        values = [to_float(confirmation.get(key)) for confirmation in confirmations]
+        values = [value for value in values if value is not None]
+        return sum(values) if values else None
+
+    @classmethod
+    def from_response(cls, kind, request, result):
+        """
+        :param result: Response text of the confirmation request, or the exception it raised.
+        """
+        if isinstance(result, Exception):
+            return cls(kind, request, False, message=str(result))
+        try:
+            data = models.loads(result)
+        except ValueError:
+            return cls(kind, request, False, message=result)
+        confirmations = data.get('Confirmations') if isinstance(data, dict) else None
+        if not confirmations:
+            errors = (data.get('Errors') or [data]) if isinstance(data, dict) else [{}]
+            message = errors[0].get('Message') or errors[0].get('Error') or result
+            return cls(kind, request, False, message=message, response=data)
+        return cls(
+            kind, request, True,
+            price=to_float(confirmations[0].get('EstimatedPrice')) if len(confirmations) == 1 else None,
+            cost=cls._sum(confirmations, 'EstimatedCost'),
+            commission=cls._sum(confirmations, 'EstimatedCommission'),
+            buying_power_effect=cls._sum(confirmations, 'DebitCreditEstimatedCost'),
+            summary='\n'.join(c['SummaryMessage'] for c in confirmations if c.get('SummaryMessage')),
+            response=data)
+
+
+class Estimates(list):
+    """
+    List of Estimate in the order of the variants.
+    """
+
+    def columns(self):
+        """
+        :return: Dictionary of price, cost, commission and buying_power_effect -> float64 array (NaN where a variant
+        failed or the API gave no value), ok -> bool array, kind -> object array.
+        """
+        table = {name: np.array([np.nan if getattr(e, name) is None else getattr(e, name) for e in self],
+                                dtype=np.float64) for name in COLUMNS}
+        table['ok'] = np.array([e.ok for e in self], dtype=bool)
+        table['kind'] = np.array([e.kind for e in self], dtype=object)
+        return table
+
+    def failed(self):
+        return [estimate for estimate in self if not estimate.ok]
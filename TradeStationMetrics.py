@@ -0,0 +1,289 @@
+import bisect
+import threading
+from urllib.parse import urlsplit
+
+from TradeStationRateLimit import endpoint_family
+
+"""
+    === REQUEST INSTRUMENTATION ===
+
+    CreateTSClient reports every request to its instrumentation object. The default, NO_INSTRUMENTATION, is disabled,
+    and the client then skips all timing work, so uninstrumented clients pay a single attribute check per request.
+
+    Subclass Instrumentation to add your own request and response hooks, or use the MetricsCollector, which keeps
+    per-endpoint histograms of the latency phases and response sizes, counts requests by status, retries and 429s,
+    and tracks the remaining rate budget per endpoint family:
+
+        metrics = MetricsCollector()
+        client = CreateTSClient(CLIENT_ID, CLIENT_SECRET, instrumentation=metrics)
+        ...
+        print(metrics.summary())
+        metrics.start_http_server(9100)     # Prometheus scrape endpoint, or metrics.to_prometheus() for the text
+
+    Latency phases, in seconds:
+        wait       time spent waiting for rate budget
+        dns        resolving the host (AsyncTSClient, new connections only)
+        connect    opening the connection, TLS included (AsyncTSClient, new connections only)
+        server     from sending the request to receiving the response headers (includes connecting for
+                   CreateTSClient, since requests does not report it separately)
+        transfer   reading the response body
+        decode     turning the response into text or models
+        total      wait + dns + connect + server + transfer
+
+    Endpoints are labelled by path template, eg. /v3/brokerage/accounts/{}/orders, so account IDs, symbols and order
+    IDs do not create a label each."""
+
+# Path segments that are part of the API's routes. Any other segment is an ID or symbol and labelled {}.
+ROUTE_SEGMENTS = frozenset((
+    'v3', 'marketdata', 'barcharts', 'symbols', 'quotes', 'options', 'expirations', 'strikes', 'spreadtypes',
+    'riskreward', 'crypto', 'interestrates', 'stream', 'marketdepth', 'aggregates', 'chains', 'brokerage',
+    'accounts', 'balances', 'bodbalances', 'historicalorders', 'orders', 'positions', 'wallets', 'orderexecution',
+    'orderconfirm', 'ordergroupconfirm', 'ordergroups', 'activationtriggers', 'routes', 'oauth', 'token',
+))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def endpoint_label(url):
+    """
+    :return: Path of url with IDs and symbols replaced by {}.
+    """
+    path = urlsplit(url).path
+    return '/'.join(part if not part or part in ROUTE_SEGMENTS else '{}' for part in path.split('/'))
+
+
+class Instrumentation:
+    """
+    No-op base class of the instrumentation hooks. Set enabled to True in subclasses.
+    """
+    enabled = False
+
+    def on_request(self, method, url):
+        """
+        Called before a request waits for rate budget and is sent.
+        """
+
+    def on_response(self, method, url, status, timings, sent, received, remaining):
+        """
+        Called once the response body has been read.
+        :param status: HTTP status code.
+        :param timings: Dictionary of phase -> seconds (see the module documentation).
+        :param sent: Request body bytes.
+        :param received: Response body bytes.
+        :param remaining: Requests left in the endpoint family's rate budget, None without a rate limiter.
+        """
+
+    def on_decode(self, method, url, seconds):
+        """
+        Called after a response was turned into text or models.
+        """
+
+    def on_retry(self, method, url, reason):
+        """
+        Called when a request is about to be sent again, eg. after a 401.
+        """
+
+    def on_error(self, method, url, error):
+        """
+        Called when a request failed without a response.
+        """
+
+
+NO_INSTRUMENTATION = Instrumentation()
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed bucket bounds, in the Prometheus layout.
+    """
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        :return: Upper bound of the bucket holding the q quantile (the largest bound for the overflow bucket).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.bounds[-1]
+
+
+class MetricsCollector(Instrumentation):
+    enabled = True
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, size_buckets=SIZE_BUCKETS):
+        self.latency_buckets = latency_buckets
+        self.size_buckets = size_buckets
+        # (endpoint, phase) -> Histogram
+        self.latency = {}
+        # (endpoint, direction) -> Histogram of body bytes
+        self.sizes = {}
+        # (endpoint, method, status) -> count
+        self.responses = {}
+        self.retries = {}
+        self.errors = {}
+        # endpoint family -> requests left
+        self.rate_remaining = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, table, key, bounds):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(bounds)
+        return histogram
+
+    def on_response(self, method, url, status, timings, sent, received, remaining):
+        endpoint = endpoint_label(url)
+        with self._lock:
+            for phase, seconds in timings.items():
+                self._histogram(self.latency, (endpoint, phase), self.latency_buckets).observe(seconds)
+            self._histogram(self.sizes, (endpoint, 'sent'), self.size_buckets).observe(sent)
+            self._histogram(self.sizes, (endpoint, 'received'), self.size_buckets).observe(received)
+            key = (endpoint, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            if remaining is not None:
+                self.rate_remaining[endpoint_family(url)] = remaining
+
+    def on_decode(self, method, url, seconds):
+        with self._lock:
+            self._histogram(self.latency, (endpoint_label(url), 'decode'), self.latency_buckets).observe(seconds)
+
+    def on_retry(self, method, url, reason):
+        key = (endpoint_label(url), str(reason))
+        with self._lock:
+            self.retries[key] = self.retries.get(key, 0) + 1
+
+    def on_error(self, method, url, error):
+        key = (endpoint_label(url), type(error).__name__)
+        with self._lock:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.latency.clear()
+            self.sizes.clear()
+            self.responses.clear()
+            self.retries.clear()
+            self.errors.clear()
+            self.rate_remaining.clear()
+
+    def summary(self):
+        """
+        :return: Dictionary of endpoint -> {count, p50, p99, mean, throttled, errors} from the total latency, worst
+        p99 first. Quantiles are bucket upper bounds.
+        """
+        with self._lock:
+            result = {}
+            for (endpoint, phase), histogram in self.latency.items():
+                if phase != 'total':
+                    continue
+                result[endpoint] = {
+                    "count": histogram.count,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99),
+                    "mean": histogram.sum / histogram.count,
+                    "throttled": sum(n for (e, _, status), n in self.responses.items() if e == endpoint and
+                                     status == 429),
+                    "errors": sum(n for (e, _, status), n in self.responses.items() if e == endpoint and
+                                  status >= 400) + sum(n for (e, _), n in self.errors.items() if e == endpoint),
+                }
+        return dict(sorted(result.items(), key=lambda item: -item[1]["p99"]))
+
+    # ----------------------------------------- Prometheus export --------------------------------------------------
+
+    @staticmethod
+    def _labels(**labels):
+        return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                        for name, value in labels.items())
+
+    def _histogram_lines(self, name, histogram, **labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(histogram.bounds + (float('inf'),), histogram.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append('{}_bucket{{{}}} {}'.format(name, self._labels(**labels, le=le), cumulative))
+        lines.append('{}_sum{{{}}} {}'.format(name, self._labels(**labels), histogram.sum))
+        lines.append('{}_count{{{}}} {}'.format(name, self._labels(**labels), histogram.count))
+        return lines
+
+    def to_prometheus(self):
+        """
+        :return: The metrics in the Prometheus / OpenMetrics text exposition format.
+        """
+        with self._lock:
+            lines = ['# HELP tradestation_request_seconds Request latency by phase.',
+                     '# TYPE tradestation_request_seconds histogram']
+            for (endpoint, phase), histogram in sorted(self.latency.items()):
+                lines += self._histogram_lines('tradestation_request_seconds', histogram, endpoint=endpoint,
+                                               phase=phase)
+            lines += ['# HELP tradestation_body_bytes Request and response body sizes.',
+                      '# TYPE tradestation_body_bytes histogram']
+            for (endpoint, direction), histogram in sorted(self.sizes.items()):
+                lines += self._histogram_lines('tradestation_body_bytes', histogram, endpoint=endpoint,
+                                               direction=direction)
+            lines += ['# HELP tradestation_responses_total Responses by status code.',
+                      '# TYPE tradestation_responses_total counter']
+            for (endpoint, method, status), count in sorted(self.responses.items()):
+                lines.append('tradestation_responses_total{{{}}} {}'.format(
+                    self._labels(endpoint=endpoint, method=method, status=status), count))
+            lines += ['# HELP tradestation_retries_total Requests sent again.',
+                      '# TYPE tradestation_retries_total counter']
+            for (endpoint, reason), count in sorted(self.retries.items()):
+                lines.append('tradestation_retries_total{{{}}} {}'.format(
+                    self._labels(endpoint=endpoint, reason=reason), count))
+            lines += ['# HELP tradestation_request_errors_total Requests that failed without a response.',
+                      '# TYPE tradestation_request_errors_total counter']
+            for (endpoint, error), count in sorted(self.errors.items()):
+                lines.append('tradestation_request_errors_total{{{}}} {}'.format(
+                    self._labels(endpoint=endpoint, error=error), count))
+            lines += ['# HELP tradestation_rate_remaining Requests left in the rate budget.',
+                      '# TYPE tradestation_rate_remaining gauge']
+            for family, remaining in sorted(self.rate_remaining.items()):
+                lines.append('tradestation_rate_remaining{{{}}} {}'.format(self._labels(family=family), remaining))
+        return '\n'.join(lines) + '\n'
+
+    def start_http_server(self, port, host='127.0.0.1'):
+        """
+        Serve to_prometheus() on http://host:port/metrics from a daemon thread.
+        :param host: Address to listen on. Only the local host by default, since the metrics reveal which endpoints
+        are in use and how much rate budget is left; pass '0.0.0.0' to let a scraper on another machine reach it.
+        :return: The HTTP server; call shutdown() on it to stop.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = collector.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='MetricsExporter', daemon=True).start()
+        return server
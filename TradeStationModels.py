@@ -0,0 +1,328 @@
+import json
+
+"""
+    === TYPED RESPONSE MODELS ===
+
+    Compact __slots__ models for the most used responses. Numeric fields arrive from the API as strings; they are
+    converted to float once when the response is decoded so hot loops can use them directly.
+
+    Create the client with typed=True to get models instead of response text:
+
+        client = CreateTSClient(CLIENT_ID, CLIENT_SECRET, typed=True)
+        for position in client.fetch_positions(ACCOUNT):
+            print(position.symbol, position.quantity * position.last)
+
+    JSON is decoded with the fastest backend installed (orjson, then ujson) and falls back to the json module.
+    Use set_json_backend to pick one explicitly.
+
+    Typed models are off by default because they are not free. The response is still parsed into dicts first, and
+    the models are built from those, so decoding is never faster than loads alone: benchmarks/bench_decode.py shows
+    typed decoding with orjson 20-40% slower than json.loads of the same response, and the json module about twice
+    as slow, and the peak memory of the decode about 1.5x higher while the dicts and the models coexist. In
+    exchange the models retain about a third of the memory of the dicts and the string-to-float conversions are
+    paid once, so a loop over the numeric fields is 5 to 7 times faster. They pay off for responses that are kept
+    around or read more than once; for a single pass over a response, plain text + loads is cheaper."""
+
+_BACKENDS = {'json': json.loads}
+
+try:
+    import orjson
+    _BACKENDS['orjson'] = orjson.loads
+except ImportError:
+    pass
+
+try:
+    import ujson
+    _BACKENDS['ujson'] = ujson.loads
+except ImportError:
+    pass
+
+json_backend = next(name for name in ('orjson', 'ujson', 'json') if name in _BACKENDS)
+loads = _BACKENDS[json_backend]
+
+
+def set_json_backend(name):
+    """
+    :param name: orjson, ujson or json.
+    """
+    global json_backend, loads
+    if name not in _BACKENDS:
+        raise ValueError('JSON backend {} is not installed. Available: {}'.format(name, ', '.join(_BACKENDS)))
+    json_backend = name
+    loads = _BACKENDS[name]
+
+
+def to_float(value):
+    """
+    :return: value as float, or None if it is missing or empty.
+    """
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def to_int(value):
+    """
+    :return: value as int, or None if it is missing or empty.
+    """
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def to_str(value):
+    return value
+
+
+class Model:
+    """
+    Base class of the typed models. Subclasses are built with _model, which lists their fields as
+    (attribute, API field, converter) in _fields and every attribute name, including ones filled in by an overridden
+    from_dict, in _attrs.
+    """
+    __slots__ = ()
+    _fields = ()
+    _attrs = ()
+
+    def __init__(self, **kwargs):
+        for attr in self._attrs:
+            setattr(self, attr, kwargs.get(attr))
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        :param data: One decoded object of the API response.
+        """
+        obj = cls.__new__(cls)
+        cls._fill(obj, data)
+        return obj
+
+    @staticmethod
+    def _fill(obj, data):
+        pass
+
+    def to_dict(self):
+        return {attr: getattr(self, attr) for attr in self._attrs}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ', '.join('{}={!r}'.format(attr, getattr(self, attr)) for attr in self._attrs[:4])
+        return '{}({}, ...)'.format(type(self).__name__, fields)
+
+
+def _make_fill(fields):
+    """
+    Generate the function copying and converting the fields of a decoded object into a model. The conversions are
+    written out inline, which is much faster than looping over the fields and calling a converter for each.
+    """
+    lines = ['def _fill(obj, data):', '    get = data.get']
+    namespace = {}
+    for i, (attr, key, convert) in enumerate(fields):
+        lines.append('    v = get({!r})'.format(key))
+        if convert is to_str:
+            lines.append('    obj.{} = v'.format(attr))
+        elif convert is to_float:
+            lines.append("    obj.{} = None if v is None or v == '' else float(v)".format(attr))
+        elif convert is to_int:
+            lines.append("    obj.{} = None if v is None or v == '' else int(v)".format(attr))
+        else:
+            namespace['convert{}'.format(i)] = convert
+            lines.append('    obj.{} = convert{}(v)'.format(attr, i))
+    exec('\n'.join(lines), namespace)
+    return staticmethod(namespace['_fill'])
+
+
+def _model(name, fields, extra=(), base=None):
+    """
+    Build a Model subclass with __slots__ for the given fields and extra attributes.
+    """
+    attrs = tuple(attr for attr, _, _ in fields) + tuple(extra)
+    return type(name, (base or Model,), {'__slots__': attrs, '_fields': tuple(fields), '_attrs': attrs,
+                                         '_fill': _make_fill(fields)})
+
+
+Quote = _model('Quote', (
+    ('symbol', 'Symbol', to_str),
+    ('last', 'Last', to_float),
+    ('bid', 'Bid', to_float),
+    ('ask', 'Ask', to_float),
+    ('bid_size', 'BidSize', to_float),
+    ('ask_size', 'AskSize', to_float),
+    ('open', 'Open', to_float),
+    ('high', 'High', to_float),
+    ('low', 'Low', to_float),
+    ('close', 'Close', to_float),
+    ('previous_close', 'PreviousClose', to_float),
+    ('volume', 'Volume', to_float),
+    ('net_change', 'NetChange', to_float),
+    ('net_change_pct', 'NetChangePct', to_float),
+    ('vwap', 'VWAP', to_float),
+    ('trade_time', 'TradeTime', to_str),
+))
+
+Bar = _model('Bar', (
+    ('timestamp', 'TimeStamp', to_str),
+    ('epoch', 'Epoch', to_int),
+    ('open', 'Open', to_float),
+    ('high', 'High', to_float),
+    ('low', 'Low', to_float),
+    ('close', 'Close', to_float),
+    ('total_volume', 'TotalVolume', to_float),
+    ('up_volume', 'UpVolume', to_float),
+    ('down_volume', 'DownVolume', to_float),
+    ('bar_status', 'BarStatus', to_str),
+))
+
+Position = _model('Position', (
+    ('account_id', 'AccountID', to_str),
+    ('position_id', 'PositionID', to_str),
+    ('symbol', 'Symbol', to_str),
+    ('asset_type', 'AssetType', to_str),
+    ('long_short', 'LongShort', to_str),
+    ('quantity', 'Quantity', to_float),
+    ('average_price', 'AveragePrice', to_float),
+    ('last', 'Last', to_float),
+    ('bid', 'Bid', to_float),
+    ('ask', 'Ask', to_float),
+    ('market_value', 'MarketValue', to_float),
+    ('total_cost', 'TotalCost', to_float),
+    ('unrealized_pnl', 'UnrealizedProfitLoss', to_float),
+    ('unrealized_pnl_pct', 'UnrealizedProfitLossPercent', to_float),
+    ('todays_pnl', 'TodaysProfitLoss', to_float),
+    ('timestamp', 'Timestamp', to_str),
+))
+
+Balance = _model('Balance', (
+    ('account_id', 'AccountID', to_str),
+    ('account_type', 'AccountType', to_str),
+    ('cash_balance', 'CashBalance', to_float),
+    ('buying_power', 'BuyingPower', to_float),
+    ('equity', 'Equity', to_float),
+    ('market_value', 'MarketValue', to_float),
+    ('todays_pnl', 'TodaysProfitLoss', to_float),
+    ('uncleared_deposit', 'UnclearedDeposit', to_float),
+    ('commission', 'Commission', to_float),
+))
+
+
+class _OrderBase(Model):
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Lift the symbol, trade action and quantities of the first leg to the top level.
+        """
+        obj = super().from_dict(data)
+        leg = (data.get('Legs') or [{}])[0]
+        obj.symbol = leg.get('Symbol')
+        obj.trade_action = leg.get('BuyOrSell')
+        obj.quantity = to_float(leg.get('QuantityOrdered'))
+        obj.filled_quantity = to_float(leg.get('ExecQuantity'))
+        obj.remaining_quantity = to_float(leg.get('QuantityRemaining'))
+        return obj
+
+
+Order = _model('Order', (
+    ('account_id', 'AccountID', to_str),
+    ('order_id', 'OrderID', to_str),
+    ('status', 'Status', to_str),
+    ('status_description', 'StatusDescription', to_str),
+    ('order_type', 'OrderType', to_str),
+    ('limit_price', 'LimitPrice', to_float),
+    ('stop_price', 'StopPrice', to_float),
+    ('filled_price', 'FilledPrice', to_float),
+    ('duration', 'Duration', to_str),
+    ('opened', 'OpenedDateTime', to_str),
+    ('closed', 'ClosedDateTime', to_str),
+    ('legs', 'Legs', to_str),
+), extra=('symbol', 'trade_action', 'quantity', 'filled_quantity', 'remaining_quantity'), base=_OrderBase)
+
+
+class ModelList(list):
+    """
+    List of models decoded from a response, with the Errors reported alongside them.
+    """
+
+    def __init__(self, items=(), errors=None):
+        super().__init__(items)
+        self.errors = errors or []
+
+
+def decode(data, key, model):
+    """
+    Decode a response into models. This parses the response and then converts every item, so it costs more than
+    loads alone (see the module docstring).
+    :param data: Response text, bytes, or the already decoded object.
+    :param key: Collection name in the response, eg. Quotes.
+    :param model: Model class of the collection items.
+    :return: ModelList of models. A response without the collection (eg. an error body) gives an empty list with the
+    response in errors.
+    """
+    if isinstance(data, (str, bytes)):
+        data = loads(data)
+    if not isinstance(data, dict) or key not in data:
+        return ModelList(errors=[data])
+    from_dict = model.from_dict
+    return ModelList([from_dict(item) for item in data[key]], data.get('Errors'))
+
+
+class OrderResult:
+    """
+    Outcome of one order in a bulk place, replace or cancel call.
+    """
+    __slots__ = ('action', 'request', 'ok', 'status', 'order_id', 'message', 'response')
+
+    def __init__(self, action, request, ok, status=None, order_id=None, message=None, response=None):
+        """
+        :param action: 'place', 'replace' or 'cancel'.
+        :param request: Order payload, order ID, or (order ID, payload) for a replace, as passed in.
+        :param ok: True if the API accepted the request.
+        :param status: HTTP status code, None if the request failed before a response arrived.
+        :param order_id: Order ID reported by the API, or the one the request was for.
+        :param message: Message or error reported by the API, or the exception text.
+        :param response: Decoded response body.
+        """
+        self.action = action
+        self.request = request
+        self.ok = ok
+        self.status = status
+        self.order_id = order_id
+        self.message = message
+        self.response = response
+
+    def __repr__(self):
+        return 'OrderResult({}, ok={}, status={}, order_id={!r}, message={!r})'.format(
+            self.action, self.ok, self.status, self.order_id, self.message)
+
+    @classmethod
+    def from_response(cls, action, request, result, order_id=None):
+        """
+        :param result: (status code, response text) of the request, or the exception it raised.
+        :param order_id: Order ID the request was for (replace and cancel).
+        """
+        if isinstance(result, Exception):
+            return cls(action, request, False, order_id=order_id, message=str(result))
+        status, text = result
+        try:
+            data = loads(text)
+        except ValueError:
+            return cls(action, request, False, status, order_id, text)
+        if not isinstance(data, dict):
+            return cls(action, request, False, status, order_id, text, data)
+
+        errors = data.get('Errors') or []
+        # Place answers {"Orders": [...], "Errors": [...]}, replace and cancel answer a single {"OrderID": ...}.
+        order = (data.get('Orders') or [data])[0]
+        order_id = order.get('OrderID') or (errors[0].get('OrderID') if errors else None) or order_id
+        error = errors[0] if errors else None
+        if error is None and 'Error' in data:
+            error = data
+        ok = status == 200 and error is None
+        if error is not None:
+            message = error.get('Message') or error.get('Error')
+        else:
+            message = order.get('Message')
+        return cls(action, request, ok, status, order_id, message, data)
@@ -0,0 +1,403 @@
+from datetime import datetime
+
+import numpy as np
+
+import TradeStationModels as models
+from TradeStationQuoteBook import QuoteBook
+
+"""
+    === OPTION CHAINS AND LOCAL RISK / REWARD ===
+
+    OptionChain assembles the listed options of an underlying into a grid of expiration x strike x side (call, put).
+    The strikes of every expiration are requested in parallel, followed by the quotes of every listed option in
+    parallel chunks of 50 symbols. Quotes are kept in a QuoteBook, so the price grids are NumPy gathers and the
+    chain can be refreshed with chain.book.poll(client) or kept current with chain.book.follow(stream).
+
+        chain = client.fetch_option_chain('MSFT', expirations=4)
+        spreads = chain.verticals(chain.expirations[0], width=1, side='Call')
+        rr = spreads.risk_reward()
+        best = np.argsort(rr.max_gain / -rr.max_loss)[::-1][:10]
+
+    risk_reward evaluates the payoff at expiration of thousands of same-expiration spreads at once, the way
+    fetch_opt_risk_reward does for one spread per request:
+
+        payoff(S) = multiplier * (sum of quantity * intrinsic value of each leg at S - spread price)
+
+    with quantities positive for bought legs and the spread price positive for a debit. The payoff is piecewise
+    linear with kinks at the strikes, so the maximum gain and loss are found among the values at 0 and at the strikes
+    (or are infinite when the payoff keeps rising or falling above the highest strike), and the breakevens are the
+    zero crossings of the segments.
+
+    Option symbols follow the TradeStation format, eg. 'MSFT 240119C420' or 'SPY 240105P472.5'."""
+
+SIDES = ('Call', 'Put')
+
+# Quote fields kept for every option.
+FIELDS = (('bid', 'Bid'), ('ask', 'Ask'), ('last', 'Last'), ('volume', 'Volume'))
+
+
+def format_strike(strike):
+    return ('%f' % strike).rstrip('0').rstrip('.')
+
+
+def option_symbol(underlying, expiration, side, strike):
+    """
+    :param expiration: Expiration date as YYYY-mm-dd.
+    :param side: 'Call' or 'Put'.
+    :return: TradeStation option symbol, eg. 'MSFT 240119C420'.
+    """
+    return '{} {}{}{}'.format(underlying, expiration[2:4] + expiration[5:7] + expiration[8:10], side[0],
+                              format_strike(strike))
+
+
+def parse_option_symbol(symbol):
+    """
+    :return: (underlying, expiration as YYYY-mm-dd, 'Call' or 'Put', strike).
+    """
+    underlying, _, contract = symbol.rpartition(' ')
+    date, side, strike = contract[:6], contract[6], contract[7:]
+    return underlying, '20{}-{}-{}'.format(date[:2], date[2:4], date[4:]), 'Call' if side == 'C' else 'Put', \
+        float(strike)
+
+
+class RiskReward:
+    """
+    Risk / reward of a batch of spreads, as arrays in the order of the spreads. Amounts are in dollars
+    (multiplier included); losses are negative.
+    """
+    __slots__ = ('max_gain', 'max_loss', 'max_gain_infinite', 'max_loss_infinite', 'breakevens')
+
+    def __init__(self, max_gain, max_loss, max_gain_infinite, max_loss_infinite, breakevens):
+        """
+        :param max_gain: Maximum gain, inf where unlimited.
+        :param max_loss: Maximum loss, -inf where unlimited.
+        :param breakevens: (spreads, legs + 1) array of underlying prices where the payoff crosses zero, ascending
+        and padded with NaN.
+        """
+        self.max_gain = max_gain
+        self.max_loss = max_loss
+        self.max_gain_infinite = max_gain_infinite
+        self.max_loss_infinite = max_loss_infinite
+        self.breakevens = breakevens
+
+    def __len__(self):
+        return len(self.max_gain)
+
+    def to_dict(self, i):
+        """
+        :return: Spread i in the shape of a fetch_opt_risk_reward response.
+        """
+        gain_infinite = bool(self.max_gain_infinite[i])
+        loss_infinite = bool(self.max_loss_infinite[i])
+        breakevens = self.breakevens[i]
+        return {
+            "MaxGainIsInfinite": gain_infinite,
+            "AdjustedMaxGain": None if gain_infinite else '{:.2f}'.format(self.max_gain[i]),
+            "MaxLossIsInfinite": loss_infinite,
+            "AdjustedMaxLoss": None if loss_infinite else '{:.2f}'.format(self.max_loss[i]),
+            "BreakevenPoints": ['{:.2f}'.format(b) for b in breakevens[~np.isnan(breakevens)]],
+        }
+
+
+def risk_reward_matches(local, api, tolerance=0.011):
+    """
+    Compare a RiskReward.to_dict result with a fetch_opt_risk_reward response.
+    :param tolerance: Largest difference in dollars (amounts) or underlying price (breakevens), a cent by default.
+    :return: True if they agree.
+    """
+    if local["MaxGainIsInfinite"] != api["MaxGainIsInfinite"] or \
+            local["MaxLossIsInfinite"] != api["MaxLossIsInfinite"]:
+        return False
+    for key in ("AdjustedMaxGain", "AdjustedMaxLoss"):
+        if (local[key] is None) != (api[key] is None):
+            return False
+        if local[key] is not None and abs(float(local[key]) - float(api[key])) > tolerance:
+            return False
+    if len(local["BreakevenPoints"]) != len(api["BreakevenPoints"]):
+        return False
+    return all(abs(float(a) - float(b)) <= tolerance
+               for a, b in zip(local["BreakevenPoints"], api["BreakevenPoints"]))
+
+
+def risk_reward(strikes, calls, quantities, prices, multiplier=100):
+    """
+    Evaluate the payoff at expiration of a batch of spreads whose legs expire together.
+    :param strikes: (spreads, legs) array of strikes.
+    :param calls: (spreads, legs) boolean array, True for calls.
+    :param quantities: (spreads, legs) array of leg quantities per spread, positive to buy and negative to sell.
+    Legs a spread does not use can be given a quantity of 0.
+    :param prices: (spreads,) array of spread prices per share, positive for a debit.
+    :param multiplier: Shares per contract.
+    :return: RiskReward.
+    """
+    strikes = np.asarray(strikes, dtype=np.float64)
+    calls = np.asarray(calls, dtype=bool)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+
+    # Payoff at 0 and at every strike: (spreads, points).
+    points = np.concatenate((np.zeros((len(strikes), 1)), np.sort(strikes, axis=1)), axis=1)
+    distance = points[:, :, None] - strikes[:, None, :]
+    intrinsic = np.maximum(np.where(calls[:, None, :], distance, -distance), 0)
+    values = (np.einsum('npl,nl->np', intrinsic, quantities) - prices[:, None]) * multiplier
+    # Rounding noise of summed leg prices must not turn a flat zero payoff into breakevens.
+    values = np.round(values, 6)
+    # Slope above the highest strike, where only calls are in the money.
+    slope = np.where(calls, quantities, 0).sum(axis=1) * multiplier
+
+    gain_infinite = slope > 0
+    loss_infinite = slope < 0
+    max_gain = np.where(gain_infinite, np.inf, values.max(axis=1))
+    max_loss = np.where(loss_infinite, -np.inf, values.min(axis=1))
+
+    before, after = values[:, :-1], values[:, 1:]
+    start, end = points[:, :-1], points[:, 1:]
+    crossing = (before < 0) & (after > 0) | (before > 0) & (after < 0) | (after == 0) & (before != 0)
+    last = values[:, -1]
+    beyond = last * slope < 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inside = np.where(crossing, start - before * (end - start) / (after - before), np.nan)
+        outside = np.where(beyond, points[:, -1] - last / slope, np.nan)
+    breakevens = np.sort(np.concatenate((inside, outside[:, None]), axis=1), axis=1)
+    return RiskReward(max_gain, max_loss, gain_infinite, loss_infinite, breakevens)
+
+
+class Spreads:
+    """
+    Batch of candidate spreads with the same number of legs, priced from an option chain.
+    """
+
+    def __init__(self, symbols, strikes, calls, quantities, prices):
+        """
+        :param symbols: (spreads, legs) array of option symbols.
+        :param strikes: (spreads, legs) array of strikes.
+        :param calls: (spreads, legs) boolean array, True for calls.
+        :param quantities: (spreads, legs) array of quantities, positive to buy and negative to sell.
+        :param prices: (spreads,) array of spread prices per share, positive for a debit. NaN where a leg has no
+        quote.
+        """
+        self.symbols = symbols
+        self.strikes = strikes
+        self.calls = calls
+        self.quantities = quantities
+        self.prices = prices
+
+    def __len__(self):
+        return len(self.prices)
+
+    @classmethod
+    def from_payloads(cls, payloads):
+        """
+        :param payloads: fetch_opt_risk_reward payloads. Spreads with fewer legs are padded with unused legs.
+        """
+        width = max(len(payload["Legs"]) for payload in payloads)
+        shape = (len(payloads), width)
+        symbols = np.full(shape, '', dtype=object)
+        strikes = np.zeros(shape)
+        calls = np.zeros(shape, dtype=bool)
+        quantities = np.zeros(shape)
+        for i, payload in enumerate(payloads):
+            for j, leg in enumerate(payload["Legs"]):
+                _, _, side, strike = parse_option_symbol(leg["Symbol"])
+                symbols[i, j] = leg["Symbol"]
+                strikes[i, j] = strike
+                calls[i, j] = side == 'Call'
+                quantities[i, j] = float(leg["Quantity"]) * (1 if leg["TradeAction"].startswith("BUY") else -1)
+        prices = np.array([float(payload["SpreadPrice"]) for payload in payloads])
+        return cls(symbols, strikes, calls, quantities, prices)
+
+    def risk_reward(self, multiplier=100):
+        """
+        :return: RiskReward of every spread.
+        """
+        return risk_reward(self.strikes, self.calls, self.quantities, self.prices, multiplier)
+
+    def payload(self, i):
+        """
+        :return: fetch_opt_risk_reward payload of spread i.
+        """
+        return {
+            "SpreadPrice": float(self.prices[i]),
+            "Legs": [{"Symbol": symbol, "Quantity": abs(int(quantity)), "TradeAction": "BUY" if quantity > 0 else
+                      "SELL"} for symbol, quantity in zip(self.symbols[i], self.quantities[i]) if quantity],
+        }
+
+
+class OptionChain:
+
+    def __init__(self, underlying, expirations, strikes, listed, book=None):
+        """
+        :param expirations: Expiration dates as YYYY-mm-dd, ascending.
+        :param strikes: Ascending strikes of all expirations.
+        :param listed: (expirations, strikes) boolean array, True where the strike is listed for the expiration.
+        :param book: QuoteBook with the quotes of the options. A new, empty one by default.
+        """
+        self.underlying = underlying
+        self.expirations = list(expirations)
+        self.strikes = np.asarray(strikes, dtype=np.float64)
+        self.listed = np.asarray(listed, dtype=bool)
+        self.errors = []
+        self.book = book if book is not None else QuoteBook(capacity=int(self.listed.sum()) * 2, fields=FIELDS)
+
+        # (expiration, strike, side) -> id of the option in the book, -1 where not listed.
+        self.ids = np.full(self.listed.shape + (2,), -1, dtype=np.int64)
+        e, k = np.nonzero(self.listed)
+        for side in range(2):
+            self.ids[e, k, side] = self.book.add([self.symbol(i, j, side) for i, j in zip(e, k)])
+
+    @classmethod
+    def fetch(cls, client, underlying, expirations=None, quotes=True):
+        """
+        Build the chain with CreateTSClient: the expirations, then the strikes of every expiration in parallel, then
+        the quotes of every listed option in parallel chunks.
+        :param expirations: Expiration dates (YYYY-mm-dd) to include, or the number of nearest ones. All by default.
+        :param quotes: Request the quotes of the options.
+        """
+        if expirations is None or isinstance(expirations, int):
+            expirations = cls._nearest(client.fetch_opt_expirations(underlying), expirations)
+        expirations = sorted(expirations)
+        chain = client._fan_out(cls._strike_calls(client, underlying, expirations),
+                                lambda responses: cls._from_strikes(underlying, expirations, responses))
+        if quotes and len(chain.book):
+            chain.book.poll(client)
+        return chain
+
+    @classmethod
+    async def fetch_async(cls, client, underlying, expirations=None, quotes=True):
+        """
+        Same as fetch, with AsyncTSClient.
+        """
+        if expirations is None or isinstance(expirations, int):
+            expirations = cls._nearest(await client.fetch_opt_expirations(underlying), expirations)
+        expirations = sorted(expirations)
+        chain = await client._fan_out(cls._strike_calls(client, underlying, expirations),
+                                      lambda responses: cls._from_strikes(underlying, expirations, responses))
+        if quotes and len(chain.book):
+            await chain.book.poll_async(client)
+        return chain
+
+    @staticmethod
+    def _nearest(response, count):
+        """
+        :return: The first count expiration dates of a fetch_opt_expirations response, all of them if count is None.
+        """
+        data = models.loads(response)
+        dates = [expiration["Date"][:10] for expiration in data.get("Expirations", [])]
+        return dates[:count] if count is not None else dates
+
+    @classmethod
+    def _strike_calls(cls, client, underlying, expirations):
+        url = client.api_url + "/v3/marketdata/options/strikes/{}".format(underlying)
+        return [("GET", url, {"params": {"expiration": cls._expiration_param(date)}, "cache": 'opt_strikes'})
+                for date in expirations]
+
+    @classmethod
+    def _from_strikes(cls, underlying, expirations, responses):
+        """
+        Build the chain, without quotes, from the strikes responses of the expirations.
+        """
+        errors = []
+        by_expiration = []
+        for date, response in zip(expirations, responses):
+            if isinstance(response, Exception):
+                errors.append({"Expiration": date, "Error": type(response).__name__, "Message": str(response)})
+                continue
+            data = models.loads(response)
+            if "Strikes" not in data:
+                errors.append({"Expiration": date, "Error": data.get("Error"), "Message": data.get("Message")})
+                continue
+            by_expiration.append((date, [float(strike[0]) for strike in data["Strikes"]]))
+
+        strikes = np.unique(np.concatenate([s for _, s in by_expiration])) if by_expiration else np.zeros(0)
+        listed = np.zeros((len(by_expiration), len(strikes)), dtype=bool)
+        for i, (_, listed_strikes) in enumerate(by_expiration):
+            listed[i, np.searchsorted(strikes, listed_strikes)] = True
+
+        chain = cls(underlying, [date for date, _ in by_expiration], strikes, listed)
+        chain.errors = errors
+        return chain
+
+    @staticmethod
+    def _expiration_param(date):
+        return datetime.strptime(date, '%Y-%m-%d').strftime('%m-%d-%Y')
+
+    def symbol(self, expiration, strike, side):
+        """
+        :param expiration: Index of the expiration.
+        :param strike: Index of the strike.
+        :param side: 0 for the call, 1 for the put.
+        """
+        return option_symbol(self.underlying, self.expirations[expiration], SIDES[side], self.strikes[strike])
+
+    def expiration_index(self, expiration):
+        return self.expirations.index(expiration) if isinstance(expiration, str) else expiration
+
+    def field(self, name):
+        """
+        :param name: bid, ask, last, volume or mid.
+        :return: (expirations, strikes, 2) array of the field, NaN where not listed or not quoted.
+        """
+        if name == 'mid':
+            return (self.field('bid') + self.field('ask')) / 2
+        column = self.book.column(name)
+        return np.where(self.ids >= 0, column[np.maximum(self.ids, 0)] if len(column) else np.nan, np.nan)
+
+    @property
+    def bid(self):
+        return self.field('bid')
+
+    @property
+    def ask(self):
+        return self.field('ask')
+
+    @property
+    def mid(self):
+        return self.field('mid')
+
+    # ---------------------------------------------- spreads -------------------------------------------------------
+
+    def spreads(self, expiration, offsets, quantities, sides, price='mid'):
+        """
+        Every spread of one shape in an expiration, anchored at each listed strike.
+        :param offsets: Strike index offset of each leg from the anchor strike, eg. (0, 1) for a vertical.
+        :param quantities: Quantity of each leg, positive to buy.
+        :param sides: Side of each leg, 0 for calls and 1 for puts.
+        :param price: Field the legs are priced with: 'mid', 'bid', 'ask' or 'last'.
+        :return: Spreads whose legs are all listed.
+        """
+        e = self.expiration_index(expiration)
+        offsets = np.asarray(offsets)
+        sides = np.asarray(sides)
+        anchors = np.arange(len(self.strikes) - offsets.max())
+        anchors = anchors[anchors + offsets.min() >= 0]
+        legs = anchors[:, None] + offsets[None, :]
+        ids = self.ids[e, legs, sides[None, :]]
+        keep = (ids >= 0).all(axis=1)
+        legs, ids = legs[keep], ids[keep]
+
+        quantities = np.broadcast_to(np.asarray(quantities, dtype=np.float64), legs.shape)
+        leg_prices = self.field(price)[e, legs, sides[None, :]]
+        symbols = np.array(self.book.symbols, dtype=object)[ids] if len(ids) else np.zeros(legs.shape, dtype=object)
+        calls = np.broadcast_to(sides == 0, legs.shape)
+        return Spreads(symbols, self.strikes[legs], calls, quantities, (leg_prices * quantities).sum(axis=1))
+
+    def verticals(self, expiration, width=1, side='Call', price='mid'):
+        """
+        Debit verticals: buy a strike and sell the one width strikes above (calls) or below (puts).
+        """
+        s = SIDES.index(side)
+        offsets = (0, width) if s == 0 else (width, 0)
+        return self.spreads(expiration, offsets, (1, -1), (s, s), price)
+
+    def butterflies(self, expiration, width=1, side='Call', price='mid'):
+        """
+        Long butterflies: buy the wings width strikes either side of two sold body options.
+        """
+        s = SIDES.index(side)
+        return self.spreads(expiration, (0, width, 2 * width), (1, -2, 1), (s, s, s), price)
+
+    def straddles(self, expiration, price='mid'):
+        """
+        Long straddles: buy the call and the put of a strike.
+        """
+        return self.spreads(expiration, (0, 0), (1, 1), (0, 1), price)
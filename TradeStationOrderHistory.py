@@ -0,0 +1,196 @@
+import csv
+import inspect
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import TradeStationModels as models
+from TradeStationModels import Order
+from TradeStationTokens import write_atomic
+
+"""
+    === PAGED HISTORICAL ORDERS ===
+
+    Walks the historical orders of one or more accounts page by page using the API's nextToken, yielding typed
+    Order models one at a time. Only the page being handled and the next one, requested in the background while the
+    caller works through the current one, are held in memory.
+
+        history = client.iter_hist_orders(ACCOUNTS, '2024-01-01', checkpoint='orders.token')
+        for order in history:
+            ...
+        history.to_csv('orders.csv')
+
+    With a checkpoint file the token of the next unhandled page is saved after every page, and a new iterator given
+    the same file picks up from there after a crash. Pages are handled at least once: a page interrupted half way is
+    fetched again.
+
+    Works with CreateTSClient only. AsyncTSClient's requests are coroutines, so an OrderHistory built on one raises
+    TypeError; use its fetch_hist_orders with next_token instead."""
+
+# Largest pageSize the historical orders endpoint accepts.
+MAX_PAGE_SIZE = 600
+
+# Columns written by to_csv and to_parquet. Legs are written as JSON.
+COLUMNS = Order._attrs
+
+
+class OrderHistoryError(Exception):
+    """
+    Raised when a page of historical orders could not be fetched.
+    """
+
+    def __init__(self, token, status, message):
+        """
+        :param token: Page token of the failed page, to resume from.
+        """
+        self.token = token
+        self.status = status
+        super().__init__('Historical orders page failed with status {}: {}'.format(status, message))
+
+
+class OrderHistory:
+
+    def __init__(self, client, accounts, since_date, o_ids=None, page_size=MAX_PAGE_SIZE, next_token=None,
+                 checkpoint=None, prefetch=True, sim=True):
+        """
+        :param client: CreateTSClient. TypeError is raised for an AsyncTSClient.
+        :param accounts: account in string or accounts in list.
+        :param since_date: starting date for historical orders(string only with format YYYY-mm-dd).
+        :param o_ids: Order ID or list of order IDs to restrict the history to.
+        :param page_size: Orders per page, at most 600.
+        :param next_token: Page token to start from, eg. history.resume_token saved by an earlier run.
+        :param checkpoint: File the resume token is saved to after every page. Read on start if it exists and no
+        next_token is given. Removed once the last page is handled.
+        :param prefetch: Request the next page while the caller handles the current one.
+        :param sim: Sim set to True will access the simulator endpoints.
+        """
+        if inspect.iscoroutinefunction(client._send):
+            raise TypeError('OrderHistory needs a CreateTSClient; the requests of {} are coroutines'.format(
+                type(client).__name__))
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise ValueError('page_size must be between 1 and {}'.format(MAX_PAGE_SIZE))
+        if isinstance(accounts, str):
+            accounts = [accounts]
+        if isinstance(o_ids, str):
+            o_ids = [o_ids]
+
+        base_url = client.sim_api_url if sim else client.api_url
+        self.url = base_url + "/v3/brokerage/accounts/{}/historicalorders".format(",".join(accounts))
+        if o_ids:
+            self.url += "/{}".format(",".join(o_ids))
+        self.client = client
+        self.since_date = since_date
+        self.page_size = page_size
+        self.checkpoint = checkpoint
+        self.prefetch = prefetch
+        if next_token is None and checkpoint is not None and os.path.exists(checkpoint):
+            with open(checkpoint, 'r') as f:
+                next_token = f.read().strip() or None
+        # Token of the first page not completely handled yet; None before the first page and once done.
+        self.resume_token = next_token
+        self.done = False
+        self.pages = 0
+        self.errors = []
+
+    def _fetch(self, token):
+        params = {"since": self.since_date, "pageSize": self.page_size}
+        if token is not None:
+            params["nextToken"] = token
+        status, text = self.client._send("GET", self.url, params=params)
+        if status != 200:
+            raise OrderHistoryError(token, status, text)
+        data = models.loads(text)
+        # Page of orders, token of the following page.
+        return models.decode(data, 'Orders', Order), data.get('NextToken')
+
+    def _save(self, token):
+        if self.checkpoint is None:
+            return
+        if token is None:
+            if os.path.exists(self.checkpoint):
+                os.remove(self.checkpoint)
+        else:
+            write_atomic(self.checkpoint, token)
+
+    def iter_pages(self):
+        """
+        Yield the pages one at a time as ModelLists of Order. The resume token moves past a page once the caller
+        asks for the next one.
+        """
+        if self.done:
+            return
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        try:
+            token = self.resume_token
+            pending = executor.submit(self._fetch, token) if executor else None
+            while True:
+                orders, next_token = pending.result() if executor else self._fetch(token)
+                if executor and next_token:
+                    pending = executor.submit(self._fetch, next_token)
+                self.pages += 1
+                self.errors.extend(orders.errors)
+                yield orders
+                # The caller came back for more, so this page is handled.
+                self.resume_token = next_token
+                self._save(next_token)
+                if not next_token:
+                    self.done = True
+                    return
+                token = next_token
+        finally:
+            if executor:
+                executor.shutdown(wait=False)
+
+    def __iter__(self):
+        for page in self.iter_pages():
+            yield from page
+
+    # ---------------------------------------------- writers -------------------------------------------------------
+
+    @staticmethod
+    def _row(order):
+        row = [getattr(order, name) for name in COLUMNS]
+        row[COLUMNS.index('legs')] = json.dumps(order.legs)
+        return row
+
+    def to_csv(self, path, append=None):
+        """
+        Write every order to a CSV file, one page at a time.
+        :param append: Append to an existing file instead of starting a new one. By default appends when resuming
+        from a token, so an interrupted export can be continued.
+        :return: Number of orders written.
+        """
+        if append is None:
+            append = self.resume_token is not None and os.path.exists(path)
+        count = 0
+        with open(path, 'a' if append else 'w', newline='') as f:
+            writer = csv.writer(f)
+            if not append:
+                writer.writerow(COLUMNS)
+            for page in self.iter_pages():
+                writer.writerows(self._row(order) for order in page)
+                f.flush()
+                count += len(page)
+        return count
+
+    def to_parquet(self, path):
+        """
+        Write every order to a Parquet file, one row group per page. Needs pyarrow.
+        :return: Number of orders written.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        floats = {attr for attr, _, convert in Order._fields if convert is models.to_float}
+        floats.update(('quantity', 'filled_quantity', 'remaining_quantity'))
+        schema = pa.schema([(name, pa.float64() if name in floats else pa.string()) for name in COLUMNS])
+
+        count = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            for page in self.iter_pages():
+                rows = [self._row(order) for order in page]
+                table = pa.Table.from_pydict({name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)},
+                                             schema=schema)
+                writer.write_table(table)
+                count += len(rows)
+        return count
@@ -0,0 +1,356 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+from TradeStationModels import Order, Position
+from TradeStationStreams import DataEvent
+
+"""
+    === LOCAL ORDER STATE ===
+
+    OrderTracker follows the brokerage order and position streams of a set of accounts and keeps every order in
+    memory, indexed by order ID, symbol and account, with its status and filled and remaining quantities. Orders
+    placed, replaced or cancelled through the client are recorded as soon as the API answers, before the stream
+    reports them. Strategies read the tracker instead of polling fetch_orders:
+
+        tracker = client.track_orders(ACCOUNTS)
+        client.place_orders(order)
+        ...
+        order = tracker.filled(order_id).result(timeout=30)          # or: await tracker.wait_filled(order_id)
+
+    filled, cancelled and done return concurrent.futures.Future objects that resolve with the Order once it reaches
+    that state, and fail with OrderEndedError if it ends some other way (eg. a wait for a fill on an order that was
+    cancelled).
+
+    The streams send a snapshot of the accounts' orders and positions on every connect. After a reconnect the
+    tracker additionally fetches one REST snapshot (client.fetch_snapshot) to catch up with anything that changed
+    while it was disconnected. No polling happens otherwise.
+
+    Sync clients run the streams on background threads (start); with AsyncTSClient await tracker.run() in a task."""
+
+FILLED = frozenset(('FLL',))
+CANCELLED = frozenset(('CAN', 'EXP', 'OUT', 'TSC', 'REJ', 'BRO'))
+# Final statuses: also partially filled and then cancelled (FLP) and replaced by another order (UCH).
+DONE = FILLED | CANCELLED | frozenset(('FLP', 'UCH'))
+
+# Status recorded when the API accepts a request, until the stream reports the order.
+PLACED = ('ACK', 'Received')
+REPLACE_SENT = ('RSN', 'Replace Sent')
+CANCEL_SENT = ('UCN', 'Cancel Sent')
+
+
+class OrderEndedError(Exception):
+    """
+    Raised by a wait whose order reached a final status other than the ones waited for.
+    """
+
+    def __init__(self, order):
+        self.order = order
+        super().__init__('Order {} ended with status {} ({})'.format(order.order_id, order.status,
+                                                                     order.status_description))
+
+
+class OrderTracker:
+
+    def __init__(self, client, accounts, sim=True, positions=True, attach=True, **stream_kwargs):
+        """
+        :param client: CreateTSClient or AsyncTSClient.
+        :param accounts: account in string or accounts in list.
+        :param sim: Sim set to True will follow the simulator accounts.
+        :param positions: Follow the position stream as well.
+        :param attach: Record orders placed, replaced and cancelled through the client (client.order_tracker).
+        :param stream_kwargs: Stream options (heartbeat_timeout, max_backoff).
+        """
+        if isinstance(accounts, str):
+            accounts = [accounts]
+        self.client = client
+        self.accounts = list(dict.fromkeys(accounts))
+        self.sim = sim
+        self.follow_positions = positions
+        self.stream_kwargs = stream_kwargs
+        # order ID -> Order
+        self.orders = {}
+        # symbol / account ID -> set of order IDs
+        self.by_symbol = {}
+        self.by_account = {}
+        # position ID -> Position
+        self.positions = {}
+        self.reconciles = 0
+        self.errors = []
+        # order ID -> [(statuses, Future)]
+        self._waiters = {}
+        self._lock = threading.RLock()
+        self._reconcile_lock = threading.Lock()
+        self._reconciled_at = 0.0
+        self._streams = []
+        self._threads = []
+        if attach:
+            client.order_tracker = self
+
+    def __repr__(self):
+        return 'OrderTracker({} accounts, {} orders, {} live, {} positions)'.format(
+            len(self.accounts), len(self.orders), len(self.live()), len(self.positions))
+
+    # ----------------------------------------------- lookups ------------------------------------------------------
+
+    def get(self, order_id):
+        """
+        :return: The Order, None if unknown.
+        """
+        return self.orders.get(order_id)
+
+    def live(self):
+        """
+        :return: List of the orders that have not reached a final status.
+        """
+        with self._lock:
+            return [order for order in self.orders.values() if order.status not in DONE]
+
+    def for_symbol(self, symbol, live=True):
+        """
+        :param live: Only the orders that have not reached a final status.
+        """
+        with self._lock:
+            orders = [self.orders[o_id] for o_id in self.by_symbol.get(symbol, ())]
+        return [order for order in orders if not live or order.status not in DONE]
+
+    def for_account(self, account, live=True):
+        """
+        :param live: Only the orders that have not reached a final status.
+        """
+        with self._lock:
+            orders = [self.orders[o_id] for o_id in self.by_account.get(account, ())]
+        return [order for order in orders if not live or order.status not in DONE]
+
+    def position(self, symbol, account=None):
+        """
+        :return: List of positions in symbol, of one account or all of them.
+        """
+        return [position for position in list(self.positions.values())
+                if position.symbol == symbol and (account is None or position.account_id == account)]
+
+    # ----------------------------------------------- updates ------------------------------------------------------
+
+    def _store(self, order):
+        with self._lock:
+            previous = self.orders.get(order.order_id)
+            self.orders[order.order_id] = order
+            if previous is None or previous.symbol != order.symbol:
+                self.by_symbol.setdefault(order.symbol, set()).add(order.order_id)
+            if previous is None or previous.account_id != order.account_id:
+                self.by_account.setdefault(order.account_id, set()).add(order.order_id)
+            waiters = self._waiters.get(order.order_id)
+            if waiters:
+                waiters[:] = [(statuses, future) for statuses, future in waiters
+                              if not self._settle(future, statuses, order)]
+                if not waiters:
+                    del self._waiters[order.order_id]
+
+    def apply(self, data):
+        """
+        Apply one order as sent by the order stream or returned by fetch_orders.
+        """
+        if 'OrderID' in data:
+            self._store(Order.from_dict(data))
+
+    def apply_position(self, data):
+        """
+        Apply one position as sent by the position stream or returned by fetch_positions.
+        """
+        position_id = data.get('PositionID')
+        if position_id is None:
+            return
+        if data.get('Deleted'):
+            self.positions.pop(position_id, None)
+        else:
+            self.positions[position_id] = Position.from_dict(data)
+
+    def _mark(self, order_id, status):
+        """
+        Set the status of a known order that has not reached a final status.
+        """
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None or order.status in DONE:
+                return
+            self._store(Order(**dict(order.to_dict(), status=status[0], status_description=status[1])))
+
+    def _placed(self, order_id, payload):
+        with self._lock:
+            if order_id in self.orders:
+                # The stream got there first.
+                return
+            quantity = float(payload.get('Quantity') or 0)
+            self._store(Order(
+                account_id=payload.get('AccountID'), order_id=order_id, status=PLACED[0],
+                status_description=PLACED[1], order_type=payload.get('OrderType'),
+                limit_price=float(payload['LimitPrice']) if payload.get('LimitPrice') else None,
+                stop_price=float(payload['StopPrice']) if payload.get('StopPrice') else None,
+                duration=(payload.get('TimeInForce') or {}).get('Duration'), symbol=payload.get('Symbol'),
+                trade_action=payload.get('TradeAction'), quantity=quantity, filled_quantity=0.0,
+                remaining_quantity=quantity))
+
+    def record(self, result):
+        """
+        Record the outcome of a place, replace or cancel request.
+        :param result: TradeStationModels.OrderResult.
+        """
+        if not result.ok:
+            return
+        if result.action == 'place':
+            payloads = result.request.get('Orders') or [result.request]
+            placed = (result.response or {}).get('Orders') or []
+            for payload, order in zip(payloads, placed):
+                if order.get('OrderID'):
+                    self._placed(order['OrderID'], payload)
+        elif result.action == 'replace':
+            self._mark(result.order_id, REPLACE_SENT)
+        elif result.action == 'cancel':
+            self._mark(result.order_id, CANCEL_SENT)
+
+    def apply_snapshot(self, snapshot):
+        """
+        Catch up with a TradeStationSnapshot.Snapshot. Orders already final are kept as they are, and positions of
+        the snapshot replace the tracked ones unless the positions could not be fetched.
+        """
+        with self._lock:
+            for order in snapshot.orders.values():
+                previous = self.orders.get(order.order_id)
+                if previous is None or previous.status not in DONE:
+                    self._store(order)
+        if not any(error.get("Section") == 'positions' for error in snapshot.errors):
+            self.positions = dict(snapshot.positions)
+        self.errors.extend(snapshot.errors)
+        self.reconciles += 1
+
+    # ------------------------------------------------ waits -------------------------------------------------------
+
+    @staticmethod
+    def _settle(future, statuses, order):
+        """
+        :return: True if the order's status resolved the future.
+        """
+        if order.status in statuses:
+            future.set_result(order)
+        elif order.status in DONE:
+            future.set_exception(OrderEndedError(order))
+        else:
+            return False
+        return True
+
+    def future(self, order_id, statuses=DONE):
+        """
+        :param statuses: Statuses that resolve the future.
+        :return: concurrent.futures.Future resolving with the Order once it has one of statuses.
+        """
+        future = Future()
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None or not self._settle(future, statuses, order):
+                self._waiters.setdefault(order_id, []).append((statuses, future))
+        return future
+
+    def filled(self, order_id):
+        return self.future(order_id, FILLED)
+
+    def cancelled(self, order_id):
+        return self.future(order_id, CANCELLED)
+
+    def done(self, order_id):
+        return self.future(order_id, DONE)
+
+    async def wait_filled(self, order_id, timeout=None):
+        """
+        :return: The Order once filled. Raises OrderEndedError if it ends unfilled, asyncio.TimeoutError on timeout.
+        """
+        return await asyncio.wait_for(asyncio.wrap_future(self.filled(order_id)), timeout)
+
+    async def wait_cancelled(self, order_id, timeout=None):
+        return await asyncio.wait_for(asyncio.wrap_future(self.cancelled(order_id)), timeout)
+
+    async def wait_done(self, order_id, timeout=None):
+        return await asyncio.wait_for(asyncio.wrap_future(self.done(order_id)), timeout)
+
+    # ----------------------------------------------- streams ------------------------------------------------------
+
+    def _make_streams(self):
+        size = self.client.accounts_per_request
+        chunks = [self.accounts[i:i + size] for i in range(0, len(self.accounts), size)]
+        streams = [(self.client.stream_orders(chunk, sim=self.sim, **self.stream_kwargs), self.apply)
+                   for chunk in chunks]
+        if self.follow_positions:
+            streams += [(self.client.stream_positions(chunk, sim=self.sim, **self.stream_kwargs), self.apply_position)
+                        for chunk in chunks]
+        self._streams = [stream for stream, _ in streams]
+        return streams
+
+    def _should_reconcile(self, dropped):
+        """
+        Several streams dropped by the same outage share one snapshot: skip if one was started after the connection
+        dropped.
+        """
+        if self._reconciled_at >= dropped:
+            return False
+        self._reconciled_at = time.monotonic()
+        return True
+
+    def reconcile(self, dropped=None):
+        """
+        Fetch one REST snapshot of the accounts and catch up with it (sync clients).
+        :param dropped: time.monotonic() at which the connection dropped. Always fetches if not given.
+        """
+        with self._reconcile_lock:
+            if self._should_reconcile(dropped if dropped is not None else time.monotonic()):
+                self.apply_snapshot(self.client.fetch_snapshot(self.accounts, sim=self.sim))
+
+    def start(self):
+        """
+        Follow the streams from background threads (CreateTSClient).
+        :return: self
+        """
+        def run(stream, apply):
+            seen = stream.reconnects
+            for event in stream:
+                if stream.reconnects != seen:
+                    seen = stream.reconnects
+                    self.reconcile(stream.dropped_at)
+                if isinstance(event, DataEvent):
+                    apply(event.data)
+
+        for stream, apply in self._make_streams():
+            thread = threading.Thread(target=run, args=(stream, apply), name='OrderTracker', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    async def run(self):
+        """
+        Follow the streams on the running event loop (AsyncTSClient) until stopped.
+        """
+        lock = asyncio.Lock()
+
+        async def reconcile(dropped):
+            async with lock:
+                if self._should_reconcile(dropped):
+                    self.apply_snapshot(await self.client.fetch_snapshot(self.accounts, sim=self.sim))
+
+        async def run(stream, apply):
+            seen = stream.reconnects
+            async for event in stream:
+                if stream.reconnects != seen:
+                    seen = stream.reconnects
+                    await reconcile(stream.dropped_at)
+                if isinstance(event, DataEvent):
+                    apply(event.data)
+
+        await asyncio.gather(*(run(stream, apply) for stream, apply in self._make_streams()))
+
+    def stop(self):
+        """
+        Close the streams and stop recording the client's order requests.
+        """
+        for stream in self._streams:
+            stream.close()
+        if getattr(self.client, 'order_tracker', None) is self:
+            self.client.order_tracker = None
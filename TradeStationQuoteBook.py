@@ -0,0 +1,286 @@
+import threading
+import time
+
+import numpy as np
+
+import TradeStationModels as models
+from TradeStationModels import Quote
+from TradeStationStreams import DataEvent
+
+"""
+    === LAST-VALUE QUOTE BOOK ===
+
+    Keeps the latest quote fields of thousands of symbols in preallocated float64 columns indexed by a symbol id, fed
+    by polling (client.fetch_quotes) or by a quote stream. Updates write straight into the columns without building
+    any per-symbol dictionaries, lookups are O(1), and each column is available as a NumPy view of the whole
+    universe, so portfolio-wide calculations are vectorized:
+
+        book = QuoteBook(UNIVERSE)
+        book.follow(client.stream_quotes(UNIVERSE))     # or book.poll(client) on a timer
+        ...
+        holdings = book.holdings(positions)             # symbol -> quantity, resolved to ids once
+        total, values = book.mark_to_market(holdings)
+
+    Fields missing from every update so far are NaN. Columns returned with copy=False are live views: they change as
+    updates arrive and should be copied (snapshot(copy=True)) when several fields must be read consistently."""
+
+# Quote fields kept, as (column name, API field).
+FIELDS = tuple((attr, key) for attr, key, convert in Quote._fields if convert is models.to_float)
+
+
+class Holdings:
+    """
+    Positions resolved to the ids of a QuoteBook, so that marking them to market is a gather and a product of
+    arrays. Create with QuoteBook.holdings and keep it for as long as the positions do not change.
+    """
+    __slots__ = ('symbols', 'ids', 'quantities')
+
+    def __init__(self, symbols, ids, quantities):
+        """
+        :param symbols: Symbols of the positions.
+        :param ids: int64 array of their ids in the book.
+        :param quantities: float64 array of their quantities.
+        """
+        self.symbols = symbols
+        self.ids = ids
+        self.quantities = quantities
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class QuoteBook:
+
+    def __init__(self, symbols=(), capacity=1024, fields=FIELDS):
+        """
+        :param symbols: Symbols to register up front, in id order.
+        :param capacity: Symbols the columns are sized for. They double in size when full, after which previously
+        returned views no longer update.
+        :param fields: (column name, API field) pairs to keep. Defaults to every numeric Quote field.
+        """
+        self.fields = tuple(attr for attr, _ in fields)
+        # API field -> row, and model attribute -> row.
+        self._rows = {key: row for row, (_, key) in enumerate(fields)}
+        self._attr_rows = {attr: row for row, (attr, _) in enumerate(fields)}
+        self.index = {}
+        self.symbols = []
+        self.data = np.full((len(fields), max(capacity, 1)), np.nan)
+        # Epoch seconds of each symbol's last update, and update count.
+        self.updated = np.zeros(self.data.shape[1])
+        self.updates = np.zeros(self.data.shape[1], dtype=np.int64)
+        self._lock = threading.Lock()
+        self._threads = []
+        self.add(symbols)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def _grow(self, size):
+        capacity = self.data.shape[1]
+        while capacity < size:
+            capacity *= 2
+        data = np.full((self.data.shape[0], capacity), np.nan)
+        data[:, :len(self.symbols)] = self.data[:, :len(self.symbols)]
+        updated = np.zeros(capacity)
+        updated[:len(self.symbols)] = self.updated[:len(self.symbols)]
+        updates = np.zeros(capacity, dtype=np.int64)
+        updates[:len(self.symbols)] = self.updates[:len(self.symbols)]
+        self.data, self.updated, self.updates = data, updated, updates
+
+    def add(self, symbols):
+        """
+        Register symbols, giving each the next free id. Known symbols keep their id.
+        :return: List of ids in the order of symbols.
+        """
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        with self._lock:
+            ids = []
+            for symbol in symbols:
+                i = self.index.get(symbol)
+                if i is None:
+                    i = len(self.symbols)
+                    if i >= self.data.shape[1]:
+                        self._grow(i + 1)
+                    self.index[symbol] = i
+                    self.symbols.append(symbol)
+                ids.append(i)
+            return ids
+
+    def id(self, symbol):
+        """
+        :return: Id of a registered symbol. Raises KeyError for unknown symbols.
+        """
+        return self.index[symbol]
+
+    def ids(self, symbols):
+        """
+        :return: int64 array of the ids of symbols, for indexing columns.
+        """
+        index = self.index
+        return np.fromiter((index[symbol] for symbol in symbols), dtype=np.int64, count=len(symbols))
+
+    # ----------------------------------------------- updates ------------------------------------------------------
+
+    def update(self, data):
+        """
+        Apply one quote as decoded from the API or a stream message. Only the fields present are written, so
+        partial stream updates keep the other fields. Unknown symbols are registered.
+        """
+        symbol = data.get('Symbol')
+        if symbol is None:
+            return
+        i = self.index.get(symbol)
+        if i is None:
+            i = self.add((symbol,))[0]
+        rows = self._rows
+        with self._lock:
+            column = self.data
+            for key, value in data.items():
+                row = rows.get(key)
+                if row is not None and value is not None and value != '':
+                    column[row, i] = value
+            self.updated[i] = time.time()
+            self.updates[i] += 1
+
+    def update_model(self, quote):
+        """
+        Apply one TradeStationModels.Quote.
+        """
+        i = self.index.get(quote.symbol)
+        if i is None:
+            i = self.add((quote.symbol,))[0]
+        with self._lock:
+            column = self.data
+            for attr, row in self._attr_rows.items():
+                value = getattr(quote, attr)
+                if value is not None:
+                    column[row, i] = value
+            self.updated[i] = time.time()
+            self.updates[i] += 1
+
+    def update_many(self, quotes):
+        """
+        Apply a response of fetch_quotes (text, decoded dictionary or ModelList of Quote) or a list of quotes.
+        :return: Number of quotes applied.
+        """
+        if isinstance(quotes, (str, bytes)):
+            quotes = models.loads(quotes)
+        if isinstance(quotes, dict):
+            quotes = quotes.get('Quotes', [])
+        for quote in quotes:
+            if isinstance(quote, Quote):
+                self.update_model(quote)
+            else:
+                self.update(quote)
+        return len(quotes)
+
+    def poll(self, client, symbols=None):
+        """
+        Refresh the book with client.fetch_quotes, which requests large universes in parallel chunks.
+        :param symbols: Symbols to refresh. Defaults to every registered symbol.
+        :return: Number of quotes applied.
+        """
+        return self.update_many(client.fetch_quotes(list(self.symbols if symbols is None else symbols)))
+
+    async def poll_async(self, client, symbols=None):
+        """
+        Same as poll, with AsyncTSClient.
+        """
+        return self.update_many(await client.fetch_quotes(list(self.symbols if symbols is None else symbols)))
+
+    def follow(self, events):
+        """
+        Apply the quotes of a stream (client.stream_quotes) or subscription (QuoteSubscriptionManager.subscribe) from
+        a background thread until it ends or is closed.
+        :return: The thread.
+        """
+        def run():
+            for event in events:
+                if isinstance(event, DataEvent):
+                    self.update(event.data)
+
+        thread = threading.Thread(target=run, name='QuoteBook', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return thread
+
+    # ----------------------------------------------- lookups ------------------------------------------------------
+
+    def get(self, symbol, field='last'):
+        """
+        :return: Latest value of one field, NaN if not received yet.
+        """
+        return float(self.data[self.fields.index(field), self.index[symbol]])
+
+    def quote(self, symbol):
+        """
+        :return: Dictionary of field -> latest value for one symbol.
+        """
+        values = self.data[:, self.index[symbol]]
+        return dict(zip(self.fields, values.tolist()))
+
+    def column(self, field, copy=False):
+        """
+        :return: Array of one field for every registered symbol, in id order. A read-only live view unless copy.
+        """
+        view = self.data[self.fields.index(field), :len(self.symbols)]
+        if copy:
+            with self._lock:
+                return view.copy()
+        view.flags.writeable = False
+        return view
+
+    def snapshot(self, fields=None, copy=True):
+        """
+        :param fields: Field names to include. Defaults to all of them.
+        :param copy: Copy the columns under the lock so the fields are consistent with each other. With False the
+        columns are live read-only views and no memory is copied.
+        :return: Dictionary of field -> array in id order, plus 'symbol', 'updated' and 'updates'.
+        """
+        fields = self.fields if fields is None else fields
+        n = len(self.symbols)
+        with self._lock:
+            result = {field: self.data[self.fields.index(field), :n] for field in fields}
+            result['updated'] = self.updated[:n]
+            result['updates'] = self.updates[:n]
+            if copy:
+                result = {name: values.copy() for name, values in result.items()}
+        if not copy:
+            for values in result.values():
+                values.flags.writeable = False
+        result['symbol'] = np.array(self.symbols, dtype=object)
+        return result
+
+    def holdings(self, positions):
+        """
+        Resolve positions to ids once, for repeated mark_to_market calls. Unknown symbols are registered.
+        :param positions: Dictionary of symbol -> quantity, or (symbols, quantities).
+        :return: Holdings.
+        """
+        if isinstance(positions, dict):
+            symbols, quantities = list(positions), list(positions.values())
+        else:
+            symbols, quantities = list(positions[0]), positions[1]
+        ids = np.array(self.add(symbols), dtype=np.int64)
+        return Holdings(symbols, ids, np.array(quantities, dtype=np.float64))
+
+    def mark_to_market(self, positions, field='last'):
+        """
+        Value positions at the latest prices.
+        :param positions: Holdings from self.holdings, or a dictionary of symbol -> quantity or (symbols,
+        quantities). Pass Holdings when the same positions are valued repeatedly: the others are resolved to ids on
+        every call, which costs more than the valuation itself.
+        :return: (total value, array of per-position values in the order given).
+        """
+        if not isinstance(positions, Holdings):
+            if isinstance(positions, dict):
+                symbols, quantities = list(positions), list(positions.values())
+            else:
+                symbols, quantities = positions
+            positions = Holdings(symbols, self.ids(symbols), np.asarray(quantities, dtype=np.float64))
+        values = self.data[self.fields.index(field), positions.ids] * positions.quantities
+        return float(np.nansum(values)), values
@@ -0,0 +1,184 @@
+import threading
+import time
+
+"""
+    === CLIENT SIDE RATE LIMITING ===
+
+    TradeStation allows 250 requests per 5 minutes for each group of endpoints. CreateTSClient owns a RateLimiter
+    with one token bucket per endpoint family (market data, brokerage, order execution). A bucket starts full, so
+    bursts go through immediately up to the remaining budget, after which callers are paced at the refill rate
+    instead of receiving 429 responses.
+
+    The buckets are also corrected from the rate limit headers returned by the server, and a 429 with Retry-After
+    holds back every caller of that family until the server is ready again."""
+
+MARKET_DATA = 'marketdata'
+BROKERAGE = 'brokerage'
+ORDER_EXECUTION = 'orderexecution'
+
+# (requests, seconds) allowed for each endpoint family.
+DEFAULT_LIMITS = {
+    MARKET_DATA: (250, 300),
+    BROKERAGE: (250, 300),
+    ORDER_EXECUTION: (250, 300),
+}
+
+
+def endpoint_family(url):
+    """
+    :param url: Endpoint URL, eg. https://api.tradestation.com/v3/marketdata/quotes/MSFT
+    :return: Endpoint family name (marketdata, brokerage, orderexecution) or None if the URL is not a v3 endpoint.
+    """
+    parts = url.split('/v3/', 1)
+    if len(parts) < 2:
+        return None
+    return parts[1].split('/', 1)[0].split('?', 1)[0]
+
+
+def _header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket. Callers reserve a token and are told how long to wait for it, which lets sync callers
+    sleep and async callers await without holding the lock.
+    """
+
+    def __init__(self, requests, seconds):
+        """
+        :param requests: Size of the budget (and the largest burst allowed).
+        :param seconds: Period over which the budget refills completely.
+        """
+        self.capacity = float(requests)
+        self.rate = requests / seconds
+        self.tokens = float(requests)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """
+        Take one token, going into debt if the bucket is empty.
+        :return: Seconds the caller has to wait before sending its request.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    @property
+    def remaining(self):
+        """
+        :return: Requests that can be sent right now without waiting.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0, int(self.tokens))
+
+    def limit_remaining(self, remaining, reset_after=None):
+        """
+        Lower the bucket to what the server reports as left in the current window.
+        :param remaining: Requests the server will still accept.
+        :param reset_after: Seconds until the server window resets, if known.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if remaining > 0:
+                self.tokens = min(self.tokens, remaining)
+            elif reset_after:
+                self.tokens = min(self.tokens, -reset_after * self.rate)
+            else:
+                self.tokens = min(self.tokens, 0.0)
+
+    def block_for(self, seconds):
+        """
+        Hold back every caller for the given number of seconds, eg. after a 429 with Retry-After.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class RateLimiter:
+    """
+    One token bucket per endpoint family. A single limiter can be shared by several clients that use the same
+    API key so they draw from one budget.
+    """
+
+    def __init__(self, limits=None, retry_after=5):
+        """
+        :param limits: Dictionary of family -> (requests, seconds) overriding DEFAULT_LIMITS.
+        eg. {'marketdata': (500, 300)}
+        :param retry_after: Seconds to hold back a family after a 429 that carries no Retry-After header.
+        """
+        limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.buckets = {family: TokenBucket(*limit) for family, limit in limits.items()}
+        self.retry_after = retry_after
+
+    def bucket(self, url):
+        return self.buckets.get(endpoint_family(url))
+
+    def acquire(self, url):
+        """
+        Block until a request to the given URL fits within the budget.
+        """
+        bucket = self.bucket(url)
+        if bucket is not None:
+            delay = bucket.reserve()
+            if delay:
+                time.sleep(delay)
+
+    async def acquire_async(self, url):
+        """
+        Same as acquire, without blocking the event loop.
+        """
+        import asyncio
+
+        bucket = self.bucket(url)
+        if bucket is not None:
+            delay = bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+
+    def update(self, url, status, headers):
+        """
+        Correct the budget from a server response.
+        :param url: URL of the request.
+        :param status: HTTP status code of the response.
+        :param headers: Response headers (case-insensitive mapping).
+        """
+        bucket = self.bucket(url)
+        if bucket is None:
+            return
+
+        if status == 429:
+            retry_after = _header(headers, 'Retry-After')
+            bucket.block_for(retry_after if retry_after is not None else self.retry_after)
+            return
+
+        remaining = _header(headers, 'X-RateLimit-Remaining', 'RateLimit-Remaining')
+        if remaining is not None:
+            reset_after = _header(headers, 'X-RateLimit-Reset', 'RateLimit-Reset')
+            # Some servers send the reset as an epoch timestamp rather than a delay.
+            if reset_after is not None and reset_after > 1e9:
+                reset_after = max(0.0, reset_after - time.time())
+            bucket.limit_remaining(remaining, reset_after)
+
+    def remaining(self):
+        """
+        :return: Dictionary of family -> requests that can be sent right now.
+        """
+        return {family: bucket.remaining for family, bucket in self.buckets.items()}
@@ -0,0 +1,323 @@
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from TradeStationStreams import parse_message
+
+"""
+    === STREAM RECORDING AND REPLAY ===
+
+    A Recorder appends every message the client's streams receive (quotes, bars, market depth, option chains, orders,
+    positions, heartbeats and statuses) to compressed, append-only log files, exactly as the API sent it and stamped
+    with the time of arrival in nanoseconds:
+
+        recorder = client.record_streams('recordings', streams=('quotes', 'bars', 'orders'))
+        ...
+        recorder.close()
+
+    Messages are buffered and written in batches of batch_size messages or every flush_interval seconds, whichever
+    comes first, each batch as one zlib-compressed frame. A background thread writes messages that have waited
+    flush_interval, so a quiet stream is on disk within about flush_interval seconds too. A new file is started once a file reaches rotate_bytes.
+    Frames are only ever appended, so a log cut short by a crash loses at most the last, partial frame.
+
+    A Replay reads the logs back through memory-mapped files and yields the same events a Stream does, at the
+    recorded pace, N times faster or as fast as possible. It can stand in for a Stream wherever events are consumed:
+
+        for event in Replay('recordings', speed=10):                  # or: async for event in Replay(...)
+            ...
+        book.follow(Replay('recordings', speed=None, streams=('quotes',)))
+
+    Since the recorded lines go through parse_message again, replaying also benchmarks the client's own parsing on
+    real traffic.
+
+    File layout: frames of HEADER (magic, compressed size, raw size, message count) followed by the compressed
+    messages, each one RECORD (arrival time in ns, stream kind length, line length), the stream kind and the line."""
+
+MAGIC = b'TSR1'
+HEADER = struct.Struct('<4sIII')
+RECORD = struct.Struct('<qBI')
+SUFFIX = '.tsr'
+
+
+class Recorder:
+
+    def __init__(self, directory='recordings', prefix='stream', streams=None, batch_size=1000, flush_interval=1.0,
+                 rotate_bytes=64 * 2**20, level=6):
+        """
+        :param directory: Folder the log files are written to. Created if missing.
+        :param prefix: Start of the file names, followed by the time the file was started and a sequence number.
+        :param streams: Kinds of stream to record (quotes, bars, marketdepth, optionchains, orders, positions). All
+        if None.
+        :param batch_size: Messages buffered before a frame is written.
+        :param flush_interval: Longest time in seconds a message stays buffered. Enforced by a background thread
+        started with the first message, within flush_interval. None to write only full batches.
+        :param rotate_bytes: Size after which the next frame starts a new file.
+        :param level: zlib compression level, 1 (fastest) to 9 (smallest).
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.streams = frozenset(streams) if streams is not None else None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.level = level
+        self.messages = 0
+        self.bytes_written = 0
+        # Paths of the files written, oldest first.
+        self.files = []
+        self.closed = False
+        self._buffer = bytearray()
+        self._count = 0
+        self._flushed_at = time.monotonic()
+        self._file = None
+        self._sequence = 0
+        self._kinds = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return 'Recorder({!r}, {} messages, {} files)'.format(self.directory, self.messages, len(self.files))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, stream, line, timestamp=None):
+        """
+        Record one message.
+        :param stream: Kind of stream the message came from.
+        :param line: The message as received, bytes or str.
+        :param timestamp: Arrival time in ns since the epoch. Now if None.
+        """
+        if self.closed or (self.streams is not None and stream not in self.streams):
+            return
+        if timestamp is None:
+            timestamp = time.time_ns()
+        if isinstance(line, str):
+            line = line.encode()
+        line = line.rstrip(b'\r\n')
+        kind = self._kinds.get(stream)
+        if kind is None:
+            kind = self._kinds[stream] = stream.encode()
+        with self._lock:
+            self._buffer += RECORD.pack(timestamp, len(kind), len(line))
+            self._buffer += kind
+            self._buffer += line
+            self._count += 1
+            self.messages += 1
+            if self._count >= self.batch_size or (self.flush_interval is not None and
+                                                  time.monotonic() - self._flushed_at >= self.flush_interval):
+                self._flush()
+        if self._thread is None and self.flush_interval is not None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None and not self.closed:
+                self._thread = threading.Thread(target=self._run, name='Recorder', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """
+        Write the buffer once its oldest message has waited flush_interval, however quiet the streams are.
+        """
+        wait = self.flush_interval
+        while not self._stop.wait(wait):
+            with self._lock:
+                if self.closed:
+                    return
+                wait = self.flush_interval
+                if self._count:
+                    # Buffered messages arrived after the last write, so none has waited longer than this.
+                    waited = time.monotonic() - self._flushed_at
+                    if waited >= self.flush_interval:
+                        self._flush()
+                    else:
+                        wait = self.flush_interval - waited
+
+    def _open(self):
+        self._sequence += 1
+        name = '{}-{}-{:04d}{}'.format(self.prefix, time.strftime('%Y%m%d-%H%M%S'), self._sequence, SUFFIX)
+        path = os.path.join(self.directory, name)
+        self._file = open(path, 'ab')
+        self.files.append(path)
+
+    def _flush(self):
+        self._flushed_at = time.monotonic()
+        if not self._count:
+            return
+        payload = zlib.compress(bytes(self._buffer), self.level)
+        if self._file is None or self._file.tell() >= self.rotate_bytes:
+            self.rotate()
+        self._file.write(HEADER.pack(MAGIC, len(payload), len(self._buffer), self._count) + payload)
+        self._file.flush()
+        self.bytes_written += HEADER.size + len(payload)
+        self._buffer.clear()
+        self._count = 0
+
+    def flush(self):
+        """
+        Write the buffered messages now.
+        """
+        with self._lock:
+            self._flush()
+
+    def rotate(self):
+        """
+        Start a new file with the next frame.
+        """
+        if self._file is not None:
+            self._file.close()
+        self._open()
+
+    def close(self):
+        """
+        Write the buffered messages and close the current file.
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self._flush()
+            self.closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+
+def recording_files(paths):
+    """
+    :param paths: Log file, folder of log files, or a list of them.
+    :return: List of log file paths in recording order.
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(SUFFIX))
+        else:
+            files.append(path)
+    return files
+
+
+def read_records(path):
+    """
+    Read one log file through a memory map. A partial last frame (a file still being written or cut short) is
+    skipped.
+    :return: Generator of (arrival time in ns, stream kind, line bytes).
+    """
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < HEADER.size:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            kinds = {}
+            try:
+                offset = 0
+                while offset + HEADER.size <= size:
+                    magic, compressed, _, count = HEADER.unpack_from(mapped, offset)
+                    if magic != MAGIC:
+                        raise ValueError('{} is not a stream recording or is corrupt at byte {}'.format(path, offset))
+                    start = offset + HEADER.size
+                    if start + compressed > size:
+                        break
+                    raw = zlib.decompress(view[start:start + compressed])
+                    offset = start + compressed
+                    position = 0
+                    for _ in range(count):
+                        timestamp, kind_size, line_size = RECORD.unpack_from(raw, position)
+                        position += RECORD.size
+                        kind = raw[position:position + kind_size]
+                        stream = kinds.get(kind)
+                        if stream is None:
+                            stream = kinds[kind] = kind.decode()
+                        position += kind_size
+                        yield timestamp, stream, raw[position:position + line_size]
+                        position += line_size
+            finally:
+                view.release()
+
+
+class Replay:
+
+    def __init__(self, paths, speed=1.0, streams=None):
+        """
+        :param paths: Log file, folder of log files (eg. the Recorder's directory), or a list of them.
+        :param speed: 1 replays at the recorded pace, N at N times that pace, None or 0 as fast as possible.
+        :param streams: Kinds of stream to replay. All if None.
+        """
+        self.files = recording_files(paths)
+        self.speed = speed
+        self.streams = frozenset(streams) if streams is not None else None
+        self.messages = 0
+        self.closed = False
+        # Same attributes as a Stream, which never change on a replay.
+        self.reconnects = 0
+        self.dropped_at = None
+
+    def __repr__(self):
+        return 'Replay({} files, speed={})'.format(len(self.files), self.speed)
+
+    def close(self):
+        """
+        Stop the replay. Safe to call from another thread while it is being iterated.
+        """
+        self.closed = True
+
+    def records(self):
+        """
+        :return: Generator of (arrival time in ns, stream kind, line bytes) without pacing or parsing.
+        """
+        for path in self.files:
+            for record in read_records(path):
+                if self.closed:
+                    return
+                if self.streams is None or record[1] in self.streams:
+                    yield record
+
+    def _paced(self):
+        """
+        :return: Generator of (seconds to wait before the record, stream kind, line bytes).
+        """
+        if not self.speed:
+            for _, stream, line in self.records():
+                yield 0, stream, line
+            return
+        first = started = None
+        for timestamp, stream, line in self.records():
+            if first is None:
+                first, started = timestamp, time.monotonic()
+            yield started + (timestamp - first) / 1e9 / self.speed - time.monotonic(), stream, line
+
+    def __iter__(self):
+        for wait, stream, line in self._paced():
+            if wait > 0:
+                time.sleep(wait)
+            event = parse_message(stream, line)
+            if event is not None:
+                self.messages += 1
+                yield event
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        for wait, stream, line in self._paced():
+            if wait > 0:
+                await asyncio.sleep(wait)
+            event = parse_message(stream, line)
+            if event is not None:
+                self.messages += 1
+                yield event
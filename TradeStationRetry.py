@@ -0,0 +1,267 @@
+import random
+import threading
+import time
+
+"""
+    === RETRIES AND CIRCUIT BREAKING ===
+
+    CreateTSClient and AsyncTSClient send every request through a RetryPolicy and a CircuitBreaker.
+
+    The RetryPolicy decides which requests may be sent again after a 429, a 5xx or a dropped connection. Only
+    requests that are safe to repeat are retried: GET, PUT (replace order), DELETE (cancel order) and the POSTs that
+    change nothing (risk / reward and order confirmations). Order submissions are retried only when they carry an
+    OrderConfirmID, which the API uses to drop duplicates, and the policy adds a generated one to every order without
+    it. Retries wait an exponentially growing, jittered delay, or as long as the server asks with Retry-After.
+
+    The CircuitBreaker counts consecutive failures (5xx responses and requests that got no response) per host. After
+    `failures` of them in a row the circuit opens and requests to the host raise CircuitOpenError at once instead of
+    tying up worker threads until they time out. After `reset_after` seconds one request is let through; if it
+    succeeds the circuit closes again, otherwise it stays open for another period.
+
+        client = CreateTSClient(CLIENT_ID, CLIENT_SECRET, retry_policy=RetryPolicy(retries=5),
+                                circuit_breaker=CircuitBreaker(failures=10, reset_after=60))
+
+    Every request waits the client's timeout. Per-endpoint timeouts are opt-in through the policy's timeouts, and
+    ENDPOINT_TIMEOUTS is a ready-made set of them:
+
+        client = CreateTSClient(CLIENT_ID, CLIENT_SECRET, retry_policy=RetryPolicy(timeouts=ENDPOINT_TIMEOUTS))
+
+    Pass retry_policy=False or circuit_breaker=False to turn either off."""
+
+# Methods whose requests can be repeated without changing the outcome.
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+# POST endpoints that only calculate and change nothing.
+SAFE_POSTS = ('/v3/marketdata/options/riskreward', '/v3/orderexecution/orderconfirm',
+              '/v3/orderexecution/ordergroupconfirm')
+
+# POST endpoints submitting orders, made safe to repeat by an OrderConfirmID.
+ORDER_POSTS = ('/v3/orderexecution/orders', '/v3/orderexecution/ordergroups')
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# Timeouts to opt into with RetryPolicy(timeouts=ENDPOINT_TIMEOUTS). Orders fail fast so a retry with the same
+# OrderConfirmID can follow; long bar ranges and order histories get more time.
+ENDPOINT_TIMEOUTS = {
+    '/v3/orderexecution/': 10,
+    '/v3/marketdata/barcharts/': 60,
+    '/historicalorders': 60,
+}
+
+
+def order_confirm_id():
+    """
+    :return: New OrderConfirmID (the API accepts 1 to 22 characters).
+    """
+    import uuid
+
+    return uuid.uuid4().hex[:22]
+
+
+def retry_after(headers):
+    """
+    :return: Seconds the Retry-After header asks to wait, None if there is none.
+    """
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+
+    def __init__(self, retries=3, backoff=0.25, max_backoff=8.0, max_retry_after=60.0, statuses=RETRY_STATUSES,
+                 timeouts=None, order_ids=True):
+        """
+        :param retries: Most times a request is sent again.
+        :param backoff: Delay before the first retry; it doubles with every further retry. Each delay is drawn
+        uniformly between 0 and that value (full jitter) so clients retrying together spread out.
+        :param max_backoff: Largest delay between retries.
+        :param max_retry_after: Longest Retry-After honored. A request asked to wait longer is not retried.
+        :param statuses: Response status codes worth retrying.
+        :param timeouts: Dictionary of path fragment -> timeout in seconds for the endpoints whose URL contains the
+        fragment, checked longest first. Other endpoints, and all of them if None, use the client timeout.
+        :param order_ids: Add a generated OrderConfirmID to submitted orders that have none, so they can be retried.
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.statuses = frozenset(statuses)
+        self.timeouts = sorted((timeouts or {}).items(), key=lambda item: -len(item[0]))
+        self.order_ids = order_ids
+
+    def timeout(self, url, default):
+        """
+        :return: Timeout of the endpoint, default if none is configured for it.
+        """
+        for fragment, timeout in self.timeouts:
+            if fragment in url:
+                return timeout
+        return default
+
+    def prepare(self, method, url, kwargs):
+        """
+        Set the endpoint timeout, if one is configured and the caller gave none, and add OrderConfirmIDs to
+        submitted orders. The caller's payload is copied, not changed.
+        :return: kwargs for the request.
+        """
+        if 'timeout' not in kwargs:
+            timeout = self.timeout(url, None)
+            if timeout is not None:
+                kwargs['timeout'] = timeout
+        if self.order_ids and method == 'POST' and url.endswith(ORDER_POSTS):
+            payload = kwargs.get('json')
+            if isinstance(payload, dict):
+                if 'Orders' in payload:
+                    payload = dict(payload, Orders=[order if order.get('OrderConfirmID') else
+                                                    dict(order, OrderConfirmID=order_confirm_id())
+                                                    for order in payload['Orders']])
+                elif not payload.get('OrderConfirmID'):
+                    payload = dict(payload, OrderConfirmID=order_confirm_id())
+                kwargs['json'] = payload
+        return kwargs
+
+    def retryable(self, method, url, kwargs):
+        """
+        :return: True if the request is safe to send more than once.
+        """
+        if method in IDEMPOTENT_METHODS:
+            return True
+        if method != 'POST':
+            return False
+        path = url.split('?', 1)[0]
+        if path.endswith(SAFE_POSTS):
+            return True
+        if path.endswith(ORDER_POSTS):
+            payload = kwargs.get('json')
+            if not isinstance(payload, dict):
+                return False
+            if 'Orders' in payload:
+                return all(order.get('OrderConfirmID') for order in payload['Orders'])
+            return bool(payload.get('OrderConfirmID'))
+        return False
+
+    def delay(self, attempt, headers=None):
+        """
+        :param attempt: Retries made so far.
+        :param headers: Response headers, for Retry-After.
+        :return: Seconds to wait before the next retry, or None if no retry should be made.
+        """
+        if attempt >= self.retries:
+            return None
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        wait = retry_after(headers) if headers is not None else None
+        if wait is not None:
+            if wait > self.max_retry_after:
+                return None
+            delay = max(delay, wait)
+        return delay
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to a host whose circuit is open.
+    """
+
+    def __init__(self, host, retry_in):
+        """
+        :param retry_in: Seconds until a trial request is let through.
+        """
+        self.host = host
+        self.retry_in = retry_in
+        super().__init__('Circuit open for {}; failing fast for another {:.1f}s'.format(host, retry_in))
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class _Circuit:
+    __slots__ = ('state', 'failures', 'opened')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0.0
+
+
+class CircuitBreaker:
+
+    def __init__(self, failures=5, reset_after=30.0):
+        """
+        :param failures: Consecutive failures that open the circuit of a host.
+        :param reset_after: Seconds an open circuit fails fast before letting a trial request through.
+        """
+        self.failures = failures
+        self.reset_after = reset_after
+        # host -> _Circuit
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url):
+        return url.split('/', 3)[2] if '://' in url else url
+
+    def state(self, url):
+        """
+        :param url: Endpoint URL or host.
+        :return: 'closed', 'open' or 'half-open'.
+        """
+        circuit = self._circuits.get(self._host(url))
+        return circuit.state if circuit is not None else CLOSED
+
+    def before(self, url):
+        """
+        Called before sending a request. Raises CircuitOpenError if the host's circuit is open, and lets one trial
+        request through once reset_after has passed.
+        """
+        circuit = self._circuits.get(self._host(url))
+        if circuit is None or circuit.state == CLOSED:
+            return
+        with self._lock:
+            waited = time.monotonic() - circuit.opened
+            # A trial whose outcome never arrived does not hold the circuit forever.
+            if waited < self.reset_after:
+                raise CircuitOpenError(self._host(url), self.reset_after - waited)
+            circuit.state = HALF_OPEN
+            circuit.opened = time.monotonic()
+
+    def record(self, url, status):
+        """
+        Called with the outcome of a request.
+        :param status: HTTP status code, None if the request got no response.
+        """
+        host = self._host(url)
+        failed = status is None or status >= 500
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            if not failed:
+                return
+            with self._lock:
+                circuit = self._circuits.setdefault(host, _Circuit())
+        if not failed and circuit.state == CLOSED and not circuit.failures:
+            return
+        with self._lock:
+            if failed:
+                circuit.failures += 1
+                if circuit.state == HALF_OPEN or circuit.failures >= self.failures:
+                    circuit.state = OPEN
+                    circuit.opened = time.monotonic()
+            else:
+                circuit.failures = 0
+                circuit.state = CLOSED
+
+    def reset(self):
+        with self._lock:
+            self._circuits.clear()
@@ -0,0 +1,179 @@
+from datetime import datetime
+
+import TradeStationModels as models
+from TradeStationModels import Balance, Order, Position
+
+"""
+    === MULTI-ACCOUNT BROKERAGE SNAPSHOT ===
+
+    client.fetch_snapshot(accounts) requests balances, positions and orders for every account at once, in chunks of
+    accounts_per_request, and merges them into one Snapshot of typed models stamped with the time the last response
+    arrived. The requests are sent concurrently, so the snapshot spans one round trip instead of one per endpoint and
+    account chunk.
+
+    Snapshots are diffed against each other so consumers only handle what changed:
+
+        monitor = SnapshotMonitor(client, ACCOUNTS)
+        while True:
+            changes = monitor.poll()
+            for order in changes.orders.changed.values():
+                ...
+
+    Orders come in pages; every page after the first is requested as soon as the page before it arrives, so accounts
+    with many orders cost one more round trip per page.
+
+    Balances are keyed by account ID, positions by position ID and orders by order ID."""
+
+# Snapshot section -> (endpoint path, collection name, model class, key attribute)
+SECTIONS = {
+    'balances': ('balances', 'Balances', Balance, 'account_id'),
+    'positions': ('positions', 'Positions', Position, 'position_id'),
+    'orders': ('orders', 'Orders', Order, 'order_id'),
+}
+
+
+def next_page_token(result):
+    """
+    :param result: Response text or exception of an orders request.
+    :return: NextToken of the response, None on the last page or a failed request.
+    """
+    if not isinstance(result, str) or '"NextToken"' not in result:
+        return None
+    try:
+        data = models.loads(result)
+    except ValueError:
+        return None
+    return data.get('NextToken') if isinstance(data, dict) else None
+
+
+class Snapshot:
+
+    def __init__(self, accounts, captured, balances, positions, orders, errors=None):
+        """
+        :param accounts: Accounts the snapshot covers.
+        :param captured: datetime the last response arrived.
+        :param balances: Dictionary of account ID -> Balance.
+        :param positions: Dictionary of position ID -> Position.
+        :param orders: Dictionary of order ID -> Order.
+        :param errors: Errors reported by the API, or failed requests as {"Section": ..., "Accounts": ...,
+        "Error": ...}.
+        """
+        self.accounts = accounts
+        self.captured = captured
+        self.balances = balances
+        self.positions = positions
+        self.orders = orders
+        self.errors = errors or []
+
+    def __repr__(self):
+        return 'Snapshot({}, {} accounts, {} balances, {} positions, {} orders, {} errors)'.format(
+            self.captured, len(self.accounts), len(self.balances), len(self.positions), len(self.orders),
+            len(self.errors))
+
+    @classmethod
+    def from_responses(cls, accounts, requests, results):
+        """
+        :param requests: (section, accounts chunk) per request, with one entry per page of a paged section.
+        :param results: Response text or exception per request.
+        """
+        captured = datetime.now()
+        sections = {name: {} for name in SECTIONS}
+        errors = []
+        for (section, chunk), result in zip(requests, results):
+            if isinstance(result, Exception):
+                errors.append({"Section": section, "Accounts": chunk, "Error": str(result)})
+                continue
+            _, key, model, attr = SECTIONS[section]
+            try:
+                data = models.loads(result)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or key not in data:
+                errors.append({"Section": section, "Accounts": chunk, "Error": result})
+                continue
+            items = models.decode(data, key, model)
+            # Per-account errors (eg. an unknown account) come back alongside the other accounts' data.
+            errors.extend(items.errors)
+            target = sections[section]
+            for item in items:
+                target[getattr(item, attr)] = item
+
+        return cls(accounts, captured, sections['balances'], sections['positions'], sections['orders'], errors)
+
+    def diff(self, previous):
+        """
+        :param previous: Earlier Snapshot, or None to report everything as added.
+        :return: SnapshotDiff from previous to this snapshot.
+        """
+        return SnapshotDiff(previous, self)
+
+
+class Changes:
+    """
+    Changes in one section of a snapshot, each a dictionary of key -> model.
+    """
+    __slots__ = ('added', 'changed', 'removed')
+
+    def __init__(self, old, new):
+        self.added = {key: item for key, item in new.items() if key not in old}
+        self.changed = {key: item for key, item in new.items() if key in old and old[key] != item}
+        self.removed = {key: item for key, item in old.items() if key not in new}
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self):
+        return 'Changes({} added, {} changed, {} removed)'.format(len(self.added), len(self.changed),
+                                                                  len(self.removed))
+
+
+class SnapshotDiff:
+
+    def __init__(self, previous, snapshot):
+        self.previous = previous
+        self.snapshot = snapshot
+        for section in SECTIONS:
+            old = getattr(previous, section) if previous is not None else {}
+            setattr(self, section, Changes(old, getattr(snapshot, section)))
+
+    def __bool__(self):
+        return bool(self.balances or self.positions or self.orders)
+
+    def __repr__(self):
+        return 'SnapshotDiff(balances={!r}, positions={!r}, orders={!r})'.format(self.balances, self.positions,
+                                                                                  self.orders)
+
+
+class SnapshotMonitor:
+
+    def __init__(self, client, accounts, sim=True):
+        """
+        :param client: CreateTSClient (not AsyncTSClient, whose fetch_snapshot is a coroutine; diff its snapshots
+        with Snapshot.diff instead).
+        :param accounts: Accounts to follow.
+        :param sim: Sim set to True will access the simulator endpoints.
+        """
+        self.client = client
+        self.accounts = accounts
+        self.sim = sim
+        self.snapshot = None
+
+    def poll(self):
+        """
+        Take a new snapshot and compare it with the previous one. Sections that failed to load keep their previous
+        content so a failed request does not show up as everything removed.
+        :return: SnapshotDiff. The new snapshot is in diff.snapshot and self.snapshot.
+        """
+        snapshot = self.client.fetch_snapshot(self.accounts, sim=self.sim)
+        previous = self.snapshot
+        if previous is not None:
+            for error in snapshot.errors:
+                section = error.get('Section')
+                if section is not None:
+                    failed = set(error['Accounts'])
+                    current = getattr(snapshot, section)
+                    for key, item in getattr(previous, section).items():
+                        if item.account_id in failed:
+                            current.setdefault(key, item)
+        self.snapshot = snapshot
+        return snapshot.diff(previous)
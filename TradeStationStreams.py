@@ -0,0 +1,393 @@
+import asyncio
+import json
+import threading
+import time
+
+"""
+    === HTTP STREAMING FOR TRADESTATION'S VERSION3 STREAM ENDPOINTS ===
+
+    A Stream holds one long-lived chunked connection and parses the newline delimited JSON incrementally, one message
+    at a time, without buffering the whole body. Messages are turned into typed events:
+
+        DataEvent       a quote, bar, market depth, option chain, order or position update (event.data)
+        HeartbeatEvent  the server is alive but had nothing to send
+        StatusEvent     stream status such as EndSnapshot or GoAway
+        ErrorEvent      an error reported inside the stream
+
+    Streams are created from the client (client.stream_quotes, client.stream_bars, ...) and can be iterated from
+    regular code or from asyncio code:
+
+        for event in client.stream_quotes(['MSFT', 'AAPL']):
+            ...
+
+        async for event in async_client.stream_bars('MSFT', interval=5):
+            ...
+
+    Async iteration needs an AsyncTSClient, since it uses the client's aiohttp connection pool.
+
+    Dropped connections, GoAway messages, missed heartbeats, 429 and 5xx responses reconnect automatically with
+    exponential backoff. A rejected or expired access token is refreshed through the client's TokenManager and the
+    stream resumes. Any other 4xx response (eg. an unknown symbol or account) raises StreamError, since connecting
+    again would be rejected the same way.
+
+    Every connection attempt goes through the client's rate limiter, circuit breaker and instrumentation like any
+    other request: it takes one request from the endpoint family's budget, fails fast (and is retried after the
+    backoff) while the host's circuit is open, and is reported with on_request, on_response once the headers arrive
+    (received is 0, the body being streamed), on_error when it fails and on_retry, with the reason, on every
+    reconnect. Messages within a connection are not rate limited or instrumented.
+
+    Messages can be recorded to disk with a TradeStationRecorder.Recorder and replayed later with a Replay, which
+    yields the same events."""
+
+STREAM_CONTENT_TYPE = 'application/vnd.tradestation.streams.v2+json'
+
+
+class StreamEvent:
+    __slots__ = ()
+
+
+class DataEvent(StreamEvent):
+    __slots__ = ('stream', 'data')
+
+    def __init__(self, stream, data):
+        """
+        :param stream: Kind of stream the data came from (quotes, bars, marketdepth, optionchains, orders,
+        positions).
+        :param data: Decoded message.
+        """
+        self.stream = stream
+        self.data = data
+
+    def __repr__(self):
+        return 'DataEvent({!r}, {!r})'.format(self.stream, self.data)
+
+
+class HeartbeatEvent(StreamEvent):
+    __slots__ = ('heartbeat', 'timestamp')
+
+    def __init__(self, heartbeat, timestamp):
+        self.heartbeat = heartbeat
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return 'HeartbeatEvent({!r}, {!r})'.format(self.heartbeat, self.timestamp)
+
+
+class StatusEvent(StreamEvent):
+    __slots__ = ('status',)
+
+    def __init__(self, status):
+        """
+        :param status: EndSnapshot once the initial snapshot has been sent, GoAway before the server drops the
+        connection.
+        """
+        self.status = status
+
+    def __repr__(self):
+        return 'StatusEvent({!r})'.format(self.status)
+
+
+class ErrorEvent(StreamEvent):
+    __slots__ = ('error', 'message', 'symbol')
+
+    def __init__(self, error, message, symbol=None):
+        self.error = error
+        self.message = message
+        self.symbol = symbol
+
+    def __repr__(self):
+        return 'ErrorEvent({!r}, {!r}, {!r})'.format(self.error, self.message, self.symbol)
+
+
+def parse_message(stream, line):
+    """
+    Turn one line of a stream into an event.
+    :param stream: Kind of stream the line came from.
+    :param line: One JSON message as bytes or str.
+    :return: StreamEvent or None for blank keep-alive lines.
+    """
+    if not line or not line.strip():
+        return None
+    message = json.loads(line)
+    if 'Heartbeat' in message:
+        return HeartbeatEvent(message['Heartbeat'], message.get('Timestamp'))
+    if 'StreamStatus' in message:
+        return StatusEvent(message['StreamStatus'])
+    if 'Error' in message:
+        return ErrorEvent(message['Error'], message.get('Message'), message.get('Symbol'))
+    return DataEvent(stream, message)
+
+
+class StreamReconnect(Exception):
+    """
+    Raised inside a stream loop to drop the current connection and connect again.
+    """
+
+
+class StreamError(Exception):
+    """
+    Raised when the API rejects a stream with a 4xx status that connecting again would not fix.
+    """
+
+    def __init__(self, status, message):
+        self.status = status
+        self.message = message
+        super().__init__('Stream rejected with {}: {}'.format(status, message))
+
+
+async def _lines(content):
+    """
+    Split an aiohttp response body into lines as chunks arrive. Unlike iterating the StreamReader, this puts no limit
+    on the length of a line (large option chain or market depth messages).
+    """
+    pending = []
+    async for chunk in content.iter_any():
+        start = 0
+        end = chunk.find(b'\n')
+        while end >= 0:
+            pending.append(chunk[start:end])
+            yield b''.join(pending)
+            pending = []
+            start = end + 1
+            end = chunk.find(b'\n', start)
+        if start < len(chunk):
+            pending.append(chunk[start:])
+    if pending:
+        yield b''.join(pending)
+
+
+class Stream:
+
+    def __init__(self, client, url, stream, params=None, heartbeat_timeout=30, reconnect=True, max_backoff=30,
+                 recorder=None):
+        """
+        :param client: CreateTSClient or AsyncTSClient providing the connection pool and access token.
+        :param url: Stream endpoint URL.
+        :param stream: Kind of stream, stored on every DataEvent.
+        :param params: Query parameters.
+        :param heartbeat_timeout: Seconds without any message (heartbeats included) after which the connection is
+        considered dead and reopened.
+        :param reconnect: Reconnect when the connection drops. If False the iteration ends instead.
+        :param max_backoff: Longest wait in seconds between reconnection attempts.
+        :param recorder: TradeStationRecorder.Recorder receiving every message. The client's recorder
+        (client.record_streams) if None; False records nothing.
+        """
+        self.client = client
+        self.url = url
+        self.stream = stream
+        self.params = params
+        self.heartbeat_timeout = heartbeat_timeout
+        self.reconnect = reconnect
+        self.max_backoff = max_backoff
+        self.recorder = recorder
+        self.reconnects = 0
+        # time.monotonic() of the last dropped connection.
+        self.dropped_at = None
+        self.last_message = None
+        self.closed = False
+        self._response = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'Stream({!r})'.format(self.url)
+
+    def close(self):
+        """
+        Stop the stream. Safe to call from another thread while the stream is being iterated.
+        """
+        self.closed = True
+        with self._lock:
+            if self._response is not None:
+                self._response.close()
+
+    @staticmethod
+    def _headers(token):
+        return {"Authorization": f"Bearer {token}", "Accept": STREAM_CONTENT_TYPE}
+
+    def _recorder(self):
+        if self.recorder is None:
+            return getattr(self.client, 'recorder', None)
+        return self.recorder or None
+
+    def _backoff(self, attempt):
+        return min(self.max_backoff, 2 ** attempt) if attempt else 0
+
+    def _before_connect(self):
+        """
+        Fail fast while the host's circuit is open and report the connection attempt.
+        :return: time.perf_counter() of the attempt.
+        """
+        if self.client.circuit_breaker:
+            self.client.circuit_breaker.before(self.url)
+        self.client.instrumentation.on_request('GET', self.url)
+        return time.perf_counter()
+
+    def _connected(self, status, headers, started, sent_at):
+        """
+        Report the status of a connection to the rate limiter, circuit breaker and instrumentation, and raise
+        StreamError if connecting again would not help.
+        """
+        client = self.client
+        if client.rate_limiter:
+            client.rate_limiter.update(self.url, status, headers)
+        if client.circuit_breaker:
+            client.circuit_breaker.record(self.url, status)
+        if client.instrumentation.enabled:
+            done = time.perf_counter()
+            bucket = client.rate_limiter.bucket(self.url) if client.rate_limiter else None
+            client.instrumentation.on_response('GET', self.url, status, {'wait': sent_at - started,
+                                                                         'server': done - sent_at,
+                                                                         'total': done - started},
+                                               0, 0, bucket.remaining if bucket is not None else None)
+
+    def _failed(self, error):
+        """
+        Report a connection that failed without a response, or broke off.
+        """
+        if self.client.circuit_breaker:
+            self.client.circuit_breaker.record(self.url, None)
+        self.client.instrumentation.on_error('GET', self.url, error)
+
+    def _dropped(self, reason):
+        """
+        Count a reconnect.
+        """
+        self.reconnects += 1
+        self.dropped_at = time.monotonic()
+        if isinstance(reason, StreamReconnect) and reason.args:
+            reason = reason.args[0]
+        elif isinstance(reason, Exception):
+            reason = type(reason).__name__
+        self.client.instrumentation.on_retry('GET', self.url, reason)
+
+    @staticmethod
+    def _rejected(status, text):
+        if 400 <= status < 500 and status not in (401, 429):
+            raise StreamError(status, text)
+
+    def _handle(self, event):
+        """
+        Note the time of the message and reconnect when the server asks to.
+        :return: The event to hand to the caller.
+        """
+        self.last_message = time.monotonic()
+        if isinstance(event, StatusEvent) and event.status == 'GoAway':
+            raise StreamReconnect('GoAway')
+        return event
+
+    # ----------------------------------------- blocking iteration -------------------------------------------------
+
+    def __iter__(self):
+        import requests
+        from TradeStationRetry import CircuitOpenError
+
+        attempt = 0
+        while not self.closed:
+            time.sleep(self._backoff(attempt))
+            if self.closed:
+                break
+            try:
+                started = self._before_connect()
+                token = self.client.tokens.token()
+                if self.client.rate_limiter:
+                    self.client.rate_limiter.acquire(self.url)
+                sent_at = time.perf_counter()
+                response = self.client.session.get(self.url, params=self.params, headers=self._headers(token),
+                                                   stream=True, timeout=(10, self.heartbeat_timeout))
+                with self._lock:
+                    self._response = response
+                with response:
+                    self._connected(response.status_code, response.headers, started, sent_at)
+                    if response.status_code == 401:
+                        self.client.tokens.refresh(stale_token=token)
+                        raise StreamReconnect('Unauthorized')
+                    if response.status_code != 200:
+                        self._rejected(response.status_code, response.text)
+                        yield ErrorEvent(str(response.status_code), response.text)
+                        raise StreamReconnect(response.status_code)
+                    attempt = 0
+                    recorder = self._recorder()
+                    for line in response.iter_lines(chunk_size=None):
+                        event = parse_message(self.stream, line)
+                        if event is not None:
+                            if recorder is not None:
+                                recorder.write(self.stream, line)
+                            event = self._handle(event)
+                            yield event
+                    raise StreamReconnect('Connection closed')
+            except (StreamReconnect, CircuitOpenError, requests.RequestException, ValueError) as e:
+                if self.closed:
+                    break
+                if isinstance(e, requests.RequestException):
+                    self._failed(e)
+                if not self.reconnect:
+                    break
+                attempt += 1
+                self._dropped(e)
+            except Exception:
+                # Closing the response from another thread can surface as any error from the socket read.
+                if self.closed:
+                    break
+                raise
+            finally:
+                with self._lock:
+                    self._response = None
+
+    # ------------------------------------------ asyncio iteration -------------------------------------------------
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        import aiohttp
+        from TradeStationRetry import CircuitOpenError
+
+        loop = asyncio.get_running_loop()
+        timeout = aiohttp.ClientTimeout(sock_connect=10, sock_read=self.heartbeat_timeout)
+        attempt = 0
+        while not self.closed:
+            await asyncio.sleep(self._backoff(attempt))
+            if self.closed:
+                break
+            tokens = self.client.tokens
+            try:
+                started = self._before_connect()
+                token = tokens.current()
+                if tokens.expired:
+                    token = await loop.run_in_executor(None, tokens.token)
+                if self.client.rate_limiter:
+                    await self.client.rate_limiter.acquire_async(self.url)
+                sent_at = time.perf_counter()
+                async with self.client._get_aio_session().get(self.url, params=self.params,
+                                                              headers=self._headers(token),
+                                                              timeout=timeout) as response:
+                    self._connected(response.status, response.headers, started, sent_at)
+                    if response.status == 401:
+                        await loop.run_in_executor(None, tokens.refresh, token)
+                        raise StreamReconnect('Unauthorized')
+                    if response.status != 200:
+                        text = await response.text()
+                        self._rejected(response.status, text)
+                        yield ErrorEvent(str(response.status), text)
+                        raise StreamReconnect(response.status)
+                    attempt = 0
+                    recorder = self._recorder()
+                    async for line in _lines(response.content):
+                        if self.closed:
+                            return
+                        event = parse_message(self.stream, line)
+                        if event is not None:
+                            if recorder is not None:
+                                recorder.write(self.stream, line)
+                            event = self._handle(event)
+                            yield event
+                    raise StreamReconnect('Connection closed')
+            except (StreamReconnect, CircuitOpenError, aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                if self.closed:
+                    break
+                if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                    self._failed(e)
+                if not self.reconnect:
+                    break
+                attempt += 1
+                self._dropped(e)
@@ -0,0 +1,298 @@
+import queue
+import threading
+from collections import deque
+
+from TradeStationStreams import DataEvent, ErrorEvent
+
+"""
+    === SHARED QUOTE STREAM SUBSCRIPTIONS ===
+
+    Several strategies in one process can subscribe to overlapping symbols without each opening its own stream.
+    The manager merges every subscriber's symbols into as few upstream quote streams as the per-stream symbol limit
+    allows, parses each message once and hands it to the subscribers of that symbol through bounded queues.
+
+        manager = QuoteSubscriptionManager(client)
+        sub = manager.subscribe(['MSFT', 'AAPL'], maxsize=1000, policy=COALESCE)
+        for event in sub:
+            print(event.data)
+
+    Backpressure policies for a subscriber that falls behind:
+        DROP_OLDEST  discard the oldest queued update (default)
+        BLOCK        hold the upstream stream until the subscriber catches up
+        COALESCE     keep one pending update per symbol, merging newer fields into it; once maxsize symbols are
+                     pending the oldest is discarded
+
+    Subscribing only opens or restarts the upstream streams that gain symbols. Unsubscribing stops delivery at once
+    and closes upstream streams left without any subscribed symbol; other streams keep running and release the unused
+    symbols the next time they are restarted.
+
+    Stream errors that name no symbol are delivered to every subscriber of the stream. If an upstream stream fails
+    or ends on its own (eg. with reconnect=False), its subscribers are closed and, after their queued updates, get()
+    and iteration raise the error."""
+
+DROP_OLDEST = 'drop_oldest'
+BLOCK = 'block'
+COALESCE = 'coalesce'
+
+
+class Subscription:
+
+    def __init__(self, manager, symbols, maxsize=1000, policy=DROP_OLDEST):
+        """
+        :param manager: Owning QuoteSubscriptionManager.
+        :param symbols: Symbols delivered to this subscription.
+        :param maxsize: Most updates queued before the backpressure policy applies.
+        :param policy: DROP_OLDEST, BLOCK or COALESCE.
+        """
+        if policy not in (DROP_OLDEST, BLOCK, COALESCE):
+            raise ValueError('Unknown backpressure policy: {}'.format(policy))
+        self.manager = manager
+        self.symbols = frozenset(symbols)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        # Failure of the upstream stream, raised to the consumer once the queue is empty.
+        self.error = None
+        self._queue = deque()
+        # COALESCE: symbol -> pending event, the queue holds symbols.
+        self._pending = {}
+        self._cond = threading.Condition()
+
+    def __repr__(self):
+        return 'Subscription({}, policy={!r})'.format(sorted(self.symbols), self.policy)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, event):
+        """
+        Queue an event according to the backpressure policy. Called from the upstream stream threads.
+        """
+        with self._cond:
+            if self.closed:
+                return
+            if self.policy == COALESCE:
+                symbol = event.data.get('Symbol') if isinstance(event, DataEvent) else None
+                pending = self._pending.get(symbol)
+                if pending is not None:
+                    # Stream quotes only carry changed fields, so merge instead of replacing.
+                    data = dict(pending.data)
+                    data.update(event.data)
+                    self._pending[symbol] = DataEvent(event.stream, data)
+                    self.dropped += 1
+                    return
+                if symbol is not None:
+                    self._pending[symbol] = event
+                    event = symbol
+            if len(self._queue) >= self.maxsize:
+                if self.policy == BLOCK:
+                    while len(self._queue) >= self.maxsize and not self.closed:
+                        self._cond.wait()
+                    if self.closed:
+                        return
+                else:
+                    oldest = self._queue.popleft()
+                    if self.policy == COALESCE and isinstance(oldest, str):
+                        del self._pending[oldest]
+                    self.dropped += 1
+            self._queue.append(event)
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        :param timeout: Seconds to wait for an update. Waits forever if None.
+        :return: Next DataEvent (or ErrorEvent) for the subscribed symbols.
+        :raises queue.Empty: No update arrived within timeout or the subscription was closed.
+        :raises Exception: The failure of the upstream stream, once the updates queued before it have been read.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue or self.closed, timeout) or not self._queue:
+                if self.error is not None:
+                    raise self.error
+                raise queue.Empty
+            event = self._queue.popleft()
+            if self.policy == COALESCE and isinstance(event, str):
+                event = self._pending.pop(event)
+            self._cond.notify_all()
+            return event
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.get()
+            except queue.Empty:
+                return
+
+    def unsubscribe(self):
+        self.manager.unsubscribe(self)
+
+    def _close(self, error=None):
+        with self._cond:
+            self.closed = True
+            if error is not None:
+                self.error = error
+            self._cond.notify_all()
+
+
+class _Upstream:
+    """
+    One quote stream and the thread reading it.
+    """
+
+    def __init__(self, manager, symbols):
+        self.manager = manager
+        self.symbols = set(symbols)
+        self.stream = None
+        self.thread = None
+
+    def start(self):
+        self.stream = self.manager.client.stream_quotes(sorted(self.symbols), **self.manager.stream_kwargs)
+        self.thread = threading.Thread(target=self._run, args=(self.stream,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def _run(self, stream):
+        dispatch = self.manager._dispatch
+        try:
+            for event in stream:
+                if isinstance(event, (DataEvent, ErrorEvent)):
+                    dispatch(event, self)
+            if stream.closed:
+                return
+            error = ConnectionError('Quote stream for {} ended'.format(', '.join(sorted(self.symbols))))
+        except Exception as e:
+            if stream.closed:
+                return
+            error = e
+        self.manager._fail(self, error)
+
+
+class QuoteSubscriptionManager:
+
+    def __init__(self, client, symbols_per_stream=100, **stream_kwargs):
+        """
+        :param client: CreateTSClient used to open the quote streams.
+        :param symbols_per_stream: Most symbols the API accepts on one quote stream.
+        :param stream_kwargs: Passed to client.stream_quotes (heartbeat_timeout, reconnect, max_backoff).
+        """
+        self.client = client
+        self.symbols_per_stream = symbols_per_stream
+        self.stream_kwargs = stream_kwargs
+        self.upstreams = []
+        # symbol -> tuple of subscriptions. Replaced as a whole on every change so the stream threads read it
+        # without locking.
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def subscribe(self, symbols, maxsize=1000, policy=DROP_OLDEST):
+        """
+        Subscribe to quote updates.
+        :param symbols: list or string of symbol or symbols.
+        :param maxsize: Most updates queued for this subscriber.
+        :param policy: Backpressure policy: DROP_OLDEST, BLOCK or COALESCE.
+        :return: Subscription to read updates from.
+        """
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        subscription = Subscription(self, symbols, maxsize, policy)
+
+        with self._lock:
+            routes = dict(self._routes)
+            new_symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol not in routes]
+            for symbol in subscription.symbols:
+                routes[symbol] = routes.get(symbol, ()) + (subscription,)
+            self._routes = routes
+            self._add_upstream_symbols(new_symbols)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Stop delivering updates to a subscription and close upstream streams nobody needs anymore.
+        """
+        with self._lock:
+            routes = dict(self._routes)
+            for symbol in subscription.symbols:
+                remaining = tuple(s for s in routes.get(symbol, ()) if s is not subscription)
+                if remaining:
+                    routes[symbol] = remaining
+                else:
+                    routes.pop(symbol, None)
+            self._routes = routes
+
+            for upstream in list(self.upstreams):
+                if not any(symbol in routes for symbol in upstream.symbols):
+                    upstream.stop()
+                    self.upstreams.remove(upstream)
+        subscription._close()
+
+    def close(self):
+        """
+        Close every upstream stream and subscription.
+        """
+        with self._lock:
+            for upstream in self.upstreams:
+                upstream.stop()
+            self.upstreams = []
+            subscriptions = {s for subs in self._routes.values() for s in subs}
+            self._routes = {}
+        for subscription in subscriptions:
+            subscription._close()
+
+    def _add_upstream_symbols(self, symbols):
+        """
+        Place new symbols on upstream streams with spare capacity, restarting only those, and open new streams for
+        the rest. Symbols no longer routed are dropped from a stream when it restarts.
+        """
+        for upstream in self.upstreams:
+            if not symbols:
+                return
+            live = {symbol for symbol in upstream.symbols if symbol in self._routes}
+            free = self.symbols_per_stream - len(live)
+            if free <= 0:
+                continue
+            taken, symbols = symbols[:free], symbols[free:]
+            upstream.stop()
+            upstream.symbols = live | set(taken)
+            upstream.start()
+
+        for i in range(0, len(symbols), self.symbols_per_stream):
+            upstream = _Upstream(self, symbols[i:i + self.symbols_per_stream])
+            upstream.start()
+            self.upstreams.append(upstream)
+
+    def _subscribers(self, upstream):
+        """
+        :return: Subscriptions receiving symbols of an upstream stream, each once.
+        """
+        routes = self._routes
+        return list(dict.fromkeys(s for symbol in upstream.symbols for s in routes.get(symbol, ())))
+
+    def _dispatch(self, event, upstream):
+        symbol = event.data.get('Symbol') if isinstance(event, DataEvent) else event.symbol
+        if symbol is None:
+            # An error about the stream as a whole concerns everybody reading it.
+            subscriptions = self._subscribers(upstream)
+        else:
+            subscriptions = self._routes.get(symbol, ())
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def _fail(self, upstream, error):
+        """
+        Close the subscribers of an upstream stream that failed, handing them the error.
+        """
+        for subscription in self._subscribers(upstream):
+            subscription._close(error)
+            self.unsubscribe(subscription)
@@ -0,0 +1,411 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+"""
+    === IN-MEMORY ACCESS TOKEN MANAGEMENT ===
+
+    CreateTSClient keeps its access token in a TokenManager. The token file is read once, requests only read the token
+    from memory, and a background thread refreshes the token shortly before it expires, so no request has to pay
+    for a refresh round trip or for file I/O.
+
+    - Concurrent refresh attempts (threads, asyncio tasks through an executor, the background thread, or requests
+      answered with 401) collapse into a single POST: callers pass the token they saw as stale and a refresh is
+      skipped if another caller already replaced it. Callers arriving during a refresh wait for its token; no lock
+      is held during the POST itself.
+    - access_token.txt is rewritten atomically (temporary file + rename) so other readers never see half a file.
+    - The refresh token is read from refresh_token.txt once and kept in memory.
+    - Nothing is read and no thread is started until the token is first needed, so creating a client is cheap.
+
+    Several processes on one host can share one token through a SharedTokenStore: one process refreshes and the
+    others pick the new token up from shared memory."""
+
+EXPIRY_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def write_atomic(path, text):
+    """
+    Replace a file's content in one step: write a temporary file next to it and rename it over the original.
+    """
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class TokenManager:
+
+    def __init__(self, client_id, client_secret, redirect_uri, token_url, session, refresh_token=None,
+                 access_token_file='access_token.txt', refresh_token_file='refresh_token.txt', refresh_margin=120,
+                 background=True, store=None):
+        """
+        :param client_id: API key.
+        :param client_secret: API secret.
+        :param redirect_uri: Redirect URI registered with TradeStation.
+        :param token_url: OAuth token endpoint.
+        :param session: requests.Session used for the token POST, or a function returning it, called on first
+        refresh.
+        :param refresh_token: Refresh token. Read from refresh_token_file on first refresh if not given.
+        :param access_token_file: File the access token and its expiry are saved to. None to keep them in memory only.
+        :param refresh_token_file: File holding the refresh token.
+        :param refresh_margin: Seconds before expiry at which the background thread refreshes the token.
+        :param background: Refresh in a background thread ahead of expiry.
+        :param store: SharedTokenStore to share the token with other processes.
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.token_url = token_url
+        self.session = session
+        self.refresh_token = refresh_token
+        self.access_token_file = access_token_file
+        self.refresh_token_file = refresh_token_file
+        self.refresh_margin = refresh_margin
+        self.background = background
+        self.store = store
+        self.access_token = None
+        self.expiry = None
+        self.refreshes = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        # Signalled when a refresh in progress (self._refreshing) ends.
+        self._refreshed = threading.Condition(self._lock)
+        self._refreshing = False
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        # Store version the token in memory was taken from.
+        self._version = None
+        self._prepared = False
+
+    def prepare(self):
+        """
+        Load the saved token unless one was set, and start the background refresh. Called on first use.
+        """
+        if self._prepared:
+            return
+        with self._lock:
+            if self._prepared:
+                return
+            if self.access_token is None:
+                self.load()
+            self.start()
+            self._prepared = True
+
+    def load(self):
+        """
+        Read the shared or saved access token and expiry, if there is one.
+        :return: True if a token was loaded.
+        """
+        if self.store is not None and self._sync():
+            return True
+        if self.access_token_file is None or not os.path.exists(self.access_token_file):
+            return False
+        with open(self.access_token_file, 'r') as f:
+            token = f.readline().strip()
+            expiry = f.readline().strip()
+        if not token:
+            return False
+        self.set_token(token, datetime.strptime(expiry, EXPIRY_FORMAT) if expiry else None)
+        return True
+
+    def set_token(self, token, expiry):
+        """
+        Replace the token in memory and wake the background thread so it reschedules.
+        """
+        self.access_token = token
+        self.expiry = expiry
+        self._changed.set()
+
+    def _sync(self):
+        """
+        Take the token from the shared store if another process replaced it.
+        :return: True if the token in memory came from the store.
+        """
+        if self.store.version == self._version:
+            return True
+        version, token, expiry = self.store.read()
+        if token is None:
+            return False
+        self._version = version
+        self.set_token(token, expiry)
+        return True
+
+    @property
+    def expired(self):
+        """
+        True if the token has expired, or if there is no token yet (eg. only a refresh token was given).
+        """
+        return self.access_token is None or (self.expiry is not None and datetime.now() >= self.expiry)
+
+    def _read_refresh_token(self):
+        if self.refresh_token is None:
+            with open(self.refresh_token_file, 'r') as f:
+                self.refresh_token = f.read().strip()
+        return self.refresh_token
+
+    def _post(self):
+        session = self.session() if callable(self.session) else self.session
+        response = session.post(
+            self.token_url,
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            data={
+                'grant_type': 'refresh_token',
+                'redirect_uri': self.redirect_uri,
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'refresh_token': self._read_refresh_token()
+            },
+            timeout=30
+        )
+        data = response.json()
+        if 'access_token' not in data:
+            raise RuntimeError('Access token refresh failed: {}'.format(data))
+        # Expire a minute early so the token is never used right at its expiry.
+        return data['access_token'], datetime.now() + timedelta(seconds=data['expires_in'] - 60)
+
+    def refresh(self, stale_token=None, force=False):
+        """
+        Get a new access token, unless another caller already replaced stale_token.
+        :param stale_token: Token the caller found expired or rejected.
+        :param force: Refresh even if the token was already replaced.
+        :return: Access token and expiry time in datetime format.
+        """
+        with self._refreshed:
+            if self._refreshing:
+                while self._refreshing:
+                    self._refreshed.wait()
+                # The refresh that was in progress answers this call too, forced or not.
+                force = False
+            if self.store is not None:
+                self._sync()
+            if self._fresh(stale_token, force):
+                return self.access_token, self.expiry
+            self._refreshing = True
+        try:
+            if self.store is None:
+                return self._refresh(stale_token, force)
+            with self.store.locked():
+                # Another process may have refreshed while this one waited for the lock.
+                self._sync()
+                return self._refresh(stale_token, force)
+        finally:
+            with self._refreshed:
+                self._refreshing = False
+                self._refreshed.notify_all()
+
+    def _fresh(self, stale_token, force):
+        return not force and self.access_token != stale_token and not self.expired
+
+    def _refresh(self, stale_token, force):
+        if self._fresh(stale_token, force):
+            return self.access_token, self.expiry
+        token, expiry = self._post()
+        self.refreshes += 1
+        if self.store is not None:
+            self._version = self.store.write(token, expiry)
+        self.set_token(token, expiry)
+        if self.access_token_file is not None:
+            write_atomic(self.access_token_file, '{}\n{}'.format(token, expiry.strftime(EXPIRY_FORMAT)))
+        return token, expiry
+
+    def current(self):
+        """
+        :return: Access token in memory, taken from the shared store if another process refreshed it. Never refreshes.
+        """
+        if not self._prepared:
+            self.prepare()
+        if self.store is not None:
+            self._sync()
+        return self.access_token
+
+    def token(self):
+        """
+        :return: Current access token. Only refreshes inline if there is no token yet or it is already expired,
+        which the background thread normally prevents.
+        """
+        token = self.current()
+        if self.expired:
+            token = self.refresh(stale_token=token)[0]
+        return token
+
+    # ------------------------------------------- background refresh -----------------------------------------------
+
+    def start(self):
+        """
+        Start the background refresh thread if it is enabled and not running yet.
+        """
+        if self.background and (self._thread is None or not self._thread.is_alive()):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='TokenRefresh', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._changed.set()
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            self._changed.clear()
+            if self.expiry is None:
+                delay = 3600
+            else:
+                delay = (self.expiry - datetime.now()).total_seconds() - self.refresh_margin
+            if delay > 0:
+                # Wake up early if the token is replaced or the manager stops; re-check at least hourly.
+                self._changed.wait(min(delay, 3600))
+                continue
+            try:
+                self.refresh(stale_token=self.access_token)
+                failures = 0
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+                failures += 1
+                if self._stop.wait(min(60, 2 ** failures)):
+                    break
+
+
+# ------------------------------------------- shared token store ---------------------------------------------------
+
+# seqlock counter, expiry as epoch seconds, token length
+_HEADER = struct.Struct('<QdI')
+
+# Optimistic reads tried before a reader waits for the lock instead.
+SPIN_READS = 1000
+
+
+class SharedTokenStore:
+    """
+    Access token shared by every process on a host through a small memory-mapped file.
+
+        store = SharedTokenStore('/tmp/tradestation_token')
+        client = CreateTSClient(CLIENT_ID, CLIENT_SECRET, token_store=store)
+
+    Reading the token is a memory read, so workers pick up a token refreshed by another process without any file I/O
+    or network call. Refreshing takes an exclusive lock on a companion .lock file; the first process to get the lock
+    refreshes and the others find the new token in the store once they get it, so a fleet of workers makes one token
+    request per expiry instead of one each. Writes go through a sequence counter which readers check to never use
+    half a token; a reader that keeps finding a write in progress (eg. left behind by a writer that died) reads under
+    the lock instead.
+    """
+
+    def __init__(self, path, size=8192):
+        """
+        :param path: File backing the store. Created if missing.
+        :param size: Bytes reserved for the token.
+        """
+        self.path = path
+        self.size = size
+        self._lock_file = open(path + '.lock', 'a+b')
+        # File locks are held per process, so threads take turns on this first. Reentrant, with _depth counting.
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        with self.locked():
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.fstat(fd).st_size < _HEADER.size + size:
+                    os.ftruncate(fd, _HEADER.size + size)
+                self._map = mmap.mmap(fd, _HEADER.size + size)
+            finally:
+                os.close(fd)
+
+    def close(self):
+        self._map.close()
+        self._lock_file.close()
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the store's inter-process lock. Reentrant.
+        """
+        with self._thread_lock:
+            self._depth += 1
+            try:
+                if self._depth > 1:
+                    yield
+                else:
+                    with self._file_lock():
+                        yield
+            finally:
+                self._depth -= 1
+
+    @contextmanager
+    def _file_lock(self):
+        fd = self._lock_file.fileno()
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after about 10 seconds; keep waiting for the refreshing process.
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    @property
+    def version(self):
+        """
+        :return: Counter increased by every write. Cheap enough to check on every request.
+        """
+        return _HEADER.unpack_from(self._map, 0)[0]
+
+    def read(self):
+        """
+        :return: (version, token, expiry as datetime), or (version, None, None) if no token was stored yet.
+        """
+        for _ in range(SPIN_READS):
+            version, expiry, length, token = self._read_raw()
+            # An odd counter means a write is in progress; a changed one means it happened while reading.
+            if version % 2 == 0 and self.version == version:
+                break
+            time.sleep(0)
+        else:
+            # Writers hold the lock, so under it the content is final whatever the counter says.
+            with self.locked():
+                version, expiry, length, token = self._read_raw()
+        if not length:
+            return version, None, None
+        return version, token.decode('ascii'), datetime.fromtimestamp(expiry)
+
+    def _read_raw(self):
+        version, expiry, length = _HEADER.unpack_from(self._map, 0)
+        return version, expiry, length, self._map[_HEADER.size:_HEADER.size + min(length, self.size)]
+
+    def write(self, token, expiry):
+        """
+        Publish a token. Call while holding locked().
+        """
+        data = token.encode('ascii')
+        if len(data) > self.size:
+            raise ValueError('Token of {} bytes does not fit the {} byte store'.format(len(data), self.size))
+        version = self.version
+        # An odd counter left by a writer that died mid-write: continue from the next even value.
+        version += version % 2
+        _HEADER.pack_into(self._map, 0, version + 1, 0.0, 0)
+        self._map[_HEADER.size:_HEADER.size + len(data)] = data
+        _HEADER.pack_into(self._map, 0, version + 2, expiry.timestamp(), len(data))
+        return version + 2
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TradeStationAsync import AsyncTSClient
+from TradeStationClient import CreateTSClient
+from mock_server import MockServer, use_temp_token_file
+
+"""
+    Throughput of AsyncTSClient against CreateTSClient (sequential and thread pool) on a local mock server.
+
+    Usage: python benchmarks/bench_async.py [requests] [latency_ms]"""
+
+
+def bench_sync(url, n, workers):
+    with CreateTSClient('key', 'secret', pool_maxsize=workers, api_url=url, sim_api_url=url,
+                        rate_limiter=False) as client:
+        start = time.perf_counter()
+        if workers == 1:
+            for _ in range(n):
+                client.fetch_quotes('MSFT')
+        else:
+            with ThreadPoolExecutor(workers) as pool:
+                list(pool.map(lambda _: client.fetch_quotes('MSFT'), range(n)))
+        return time.perf_counter() - start
+
+
+async def bench_async(url, n, concurrency):
+    async with AsyncTSClient('key', 'secret', pool_maxsize=concurrency, api_url=url, sim_api_url=url,
+                             rate_limiter=False) as client:
+        start = time.perf_counter()
+        await client.batch(*(client.fetch_quotes('MSFT') for _ in range(n)), limit=concurrency)
+        return time.perf_counter() - start
+
+
+def main(n=2000, latency_ms=20):
+    use_temp_token_file()
+    with MockServer(latency=latency_ms / 1000) as server:
+        runs = [
+            ('sync sequential', lambda: bench_sync(server.url, n // 10, 1), n // 10),
+            ('sync 32 threads', lambda: bench_sync(server.url, n, 32), n),
+            ('async 32 in flight', lambda: asyncio.run(bench_async(server.url, n, 32)), n),
+            ('async 256 in flight', lambda: asyncio.run(bench_async(server.url, n, 256)), n),
+        ]
+        print('server latency {} ms'.format(latency_ms))
+        for name, run, count in runs:
+            elapsed = run()
+            print('{:<22} {:>6} requests  {:>8.0f} req/s'.format(name, count, count / elapsed))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TradeStationBarEngine import BarEngine
+
+"""
+    Throughput of BarEngine on one core, with the default 1 / 5 / 15 / 60 minute frames, two EMAs, ATR, rolling
+    high / low and VWAP:
+
+        backfill     minute bars per second loaded with the vectorized batch mode
+        update       minute bars per second fed one by one, round robin over the symbols (a new bar each time)
+        revision     updates per second of the bar in progress, as bar streams send them
+        recompute    the same bar handled by recomputing the symbol's state from its whole history with the batch
+                     mode, ie. what refreshing a pandas frame on every bar amounts to
+
+    Then checks that the backfilled state matches the state built bar by bar.
+
+    Usage: python benchmarks/bench_bar_engine.py [symbols] [history_bars]"""
+
+
+def random_bars(rng, n, start=1704180000):
+    close = 100 + np.cumsum(rng.normal(0, 0.05, n))
+    open = np.r_[close[0], close[:-1]]
+    return {'timestamp': (start + 60 * np.arange(1, n + 1)) * 1000, 'open': open,
+            'high': np.maximum(open, close) + rng.random(n) * 0.05,
+            'low': np.minimum(open, close) - rng.random(n) * 0.05, 'close': close,
+            'volume': rng.integers(1, 5000, n).astype(np.float64)}
+
+
+def main(symbols=2000, history=2000):
+    rng = np.random.default_rng(7)
+    names = ['SYM{}'.format(i) for i in range(symbols)]
+    histories = [random_bars(rng, history) for _ in names]
+    engine = BarEngine(names)
+
+    start = time.perf_counter()
+    for name, columns in zip(names, histories):
+        engine.backfill(name, columns)
+    elapsed = time.perf_counter() - start
+    print('{} symbols x {} minute bars'.format(symbols, history))
+    print('backfill   {:>12,.0f} bars/s'.format(symbols * history / elapsed))
+
+    steps = 20
+    first = 1704180000 + 60 * (history + 1)
+    live = [[(first + 60 * step, 100.0, 100.2, 99.8, 100.1, 10.0) for step in range(steps)] for _ in names]
+    start = time.perf_counter()
+    for step in range(steps):
+        for name, bars in zip(names, live):
+            engine.update(name, *bars[step])
+    per_update = (time.perf_counter() - start) / (symbols * steps)
+    print('update     {:>12,.0f} bars/s  ({:.1f} us per bar)'.format(1 / per_update, per_update * 1e6))
+
+    timestamp = first + 60 * (steps - 1)
+    start = time.perf_counter()
+    for k in range(5):
+        for name in names:
+            engine.update(name, timestamp, 100.0, 100.3 + k / 100, 99.7, 100.2, 20.0 + k)
+    elapsed = time.perf_counter() - start
+    print('revision   {:>12,.0f} updates/s'.format(symbols * 5 / elapsed))
+
+    sample = min(symbols, 50)
+    start = time.perf_counter()
+    for name, columns in zip(names[:sample], histories):
+        engine.backfill(name, columns)
+    per_recompute = (time.perf_counter() - start) / sample
+    print('recompute  {:>12,.0f} bars/s  ({:.0f}x the cost of an update)'.format(1 / per_recompute,
+                                                                                 per_recompute / per_update))
+
+    # Cross-check on a few symbols: bar by bar against backfill.
+    incremental = BarEngine(names[:5])
+    batch = BarEngine(names[:5])
+    worst = 0.0
+    for name, columns in zip(names[:5], histories):
+        batch.backfill(name, columns)
+        for j in range(history):
+            incremental.update(name, columns['timestamp'][j] // 1000, columns['open'][j], columns['high'][j],
+                               columns['low'][j], columns['close'][j], columns['volume'][j])
+    for frame in incremental.frames:
+        a, b = incremental.snapshot(frame.minutes), batch.snapshot(frame.minutes)
+        worst = max(worst, max(float(np.nanmax(np.abs(a[key] - b[key]))) for key in a))
+    print('largest difference batch vs bar by bar: {:.2e}'.format(worst))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
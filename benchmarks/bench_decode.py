@@ -0,0 +1,85 @@
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import TradeStationModels as models
+from TradeStationModels import Quote
+
+"""
+    Decode time and memory per 10k quotes: response text + json.loads (the untyped client) against typed Quote models
+    with each installed JSON backend.
+
+    Usage: python benchmarks/bench_decode.py [quotes] [repeats]"""
+
+
+def make_quotes_text(n):
+    quotes = [{
+        "Symbol": "SYM{}".format(i), "Open": "212.07", "High": "215.85", "Low": "211.15", "PreviousClose": "210.11",
+        "Last": "215.23", "Ask": "215.25", "AskSize": "300", "Bid": "215.22", "BidSize": "100", "NetChange": "5.12",
+        "NetChangePct": "2.43", "High52Week": "225.00", "Low52Week": "160.50", "Volume": "31255000",
+        "PreviousVolume": "28750000", "Close": "215.23", "DailyOpenInterest": "0", "TradeTime": "2024-01-02T20:59:59Z",
+        "TickSizeTier": "0", "VWAP": "214.01", "MarketFlags": {"IsDelayed": False, "IsHardToBorrow": False,
+                                                               "IsBats": False, "IsHalted": False},
+    } for i in range(n)]
+    return json.dumps({"Quotes": quotes, "Errors": []})
+
+
+def untyped(text):
+    return json.loads(text)['Quotes']
+
+
+def untyped_mid(quotes):
+    # What callers do today in every hot loop: convert string numerics again.
+    return sum((float(q['Bid']) + float(q['Ask'])) / 2 for q in quotes)
+
+
+def typed(text):
+    return models.decode(text, 'Quotes', Quote)
+
+
+def typed_mid(quotes):
+    return sum((q.bid + q.ask) / 2 for q in quotes)
+
+
+def measure(decode, text, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        decode(text)
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    result = decode(text)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, retained, peak, result
+
+
+def main(n=10000, repeats=20):
+    text = make_quotes_text(n)
+    scale = 10000 / n
+    print('{} quotes, {:.1f} MB of JSON, figures per 10k quotes'.format(n, len(text) / 1e6))
+    print('{:<28} {:>10} {:>12} {:>12} {:>12}'.format('', 'decode ms', 'retained MB', 'peak MB', 'mid loop ms'))
+
+    runs = [('text + json.loads', untyped, untyped_mid, 'json')]
+    runs += [('typed ({})'.format(name), typed, typed_mid, name) for name in ('json', 'ujson', 'orjson')
+             if name in models._BACKENDS]
+    for name, decode, mid, backend in runs:
+        models.set_json_backend(backend)
+        best, retained, peak, result = measure(decode, text, repeats)
+        start = time.perf_counter()
+        mid(result)
+        loop = time.perf_counter() - start
+        print('{:<28} {:>10.2f} {:>12.2f} {:>12.2f} {:>12.2f}'.format(
+            name, best * 1e3 * scale, retained / 1e6 * scale, peak / 1e6 * scale, loop * 1e3 * scale))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
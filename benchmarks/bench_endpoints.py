@@ -0,0 +1,159 @@
+import gc
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import TradeStationModels as models
+from TradeStationClient import CreateTSClient
+from TradeStationModels import Balance, Order, Position, Quote
+from TradeStationStreams import parse_message
+from mock_server import ACCOUNT, MockServer, use_temp_token_file
+
+"""
+    Client overhead per endpoint against the local mock server, grouped by endpoint family:
+
+        req/s        sequential calls per second on one keep-alive connection
+        p50 / p99    call latency
+        alloc KB     peak memory allocated by one call (tracemalloc)
+        decode us    time to decode the response text with the active JSON backend, and into typed models where
+                     the endpoint has one
+
+    Streams report messages per second through Stream iteration and the parse cost per message.
+
+    Usage: python benchmarks/bench_endpoints.py [calls] [latency_ms] [items]"""
+
+SYMBOLS = ['SYM{}'.format(i) for i in range(50)]
+ORDER = {"AccountID": ACCOUNT, "Symbol": "MSFT", "Quantity": "10", "OrderType": "Market", "TradeAction": "BUY",
+         "TimeInForce": {"Duration": "DAY"}, "Route": "Intelligent"}
+
+# (family, name, call, typed model as (collection, class) or None)
+ENDPOINTS = [
+    ('token', 'refresh access token', lambda c: c.tokens.refresh(force=True), None),
+    ('marketdata', 'fetch_quotes x50', lambda c: c.fetch_quotes(SYMBOLS), ('Quotes', Quote)),
+    ('marketdata', 'fetch_bars 500', lambda c: c.fetch_bars('MSFT', 1, 'Minute', barsback=500), None),
+    ('marketdata', 'fetch_symbol_details', lambda c: c.fetch_symbol_details('MSFT'), None),
+    ('marketdata', 'fetch_opt_expirations', lambda c: c.fetch_opt_expirations('MSFT'), None),
+    ('brokerage', 'fetch_balances', lambda c: c.fetch_balances(ACCOUNT), ('Balances', Balance)),
+    ('brokerage', 'fetch_positions', lambda c: c.fetch_positions(ACCOUNT), ('Positions', Position)),
+    ('brokerage', 'fetch_orders', lambda c: c.fetch_orders(ACCOUNT), ('Orders', Order)),
+    ('orderexecution', 'confirm_order', lambda c: c.confirm_order(ORDER), None),
+    ('orderexecution', 'place_orders', lambda c: c.place_orders(ORDER), None),
+    ('orderexecution', 'cancel_order', lambda c: c.cancel_order('123456789'), None),
+]
+
+STREAMS = [
+    ('quotes', lambda c: c.stream_quotes(SYMBOLS[:10], reconnect=False)),
+    ('bars', lambda c: c.stream_bars('MSFT', reconnect=False)),
+    ('marketdepth', lambda c: c.stream_market_depth('MSFT', reconnect=False)),
+    ('optionchains', lambda c: c.stream_option_chain('MSFT', reconnect=False)),
+]
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def allocated(call, client, repeats=10):
+    """
+    :return: Mean peak bytes allocated by one call.
+    """
+    call(client)
+    peaks = []
+    tracemalloc.start()
+    for _ in range(repeats):
+        gc.collect()
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        call(client)
+        peaks.append(tracemalloc.get_traced_memory()[1] - start)
+    tracemalloc.stop()
+    return statistics.mean(peaks)
+
+
+def decode_cost(text, model, repeats=20):
+    """
+    :return: (best seconds for models.loads, best seconds for typed models or None).
+    """
+    if not isinstance(text, str):
+        return None, None
+    timings = []
+    for decode in (models.loads, (lambda t: models.decode(t, *model)) if model else None):
+        if decode is None:
+            timings.append(None)
+            continue
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            decode(text)
+            best = min(best, time.perf_counter() - start)
+        timings.append(best)
+    return timings
+
+
+def bench_endpoint(client, call, model, n):
+    samples = []
+    text = None
+    for _ in range(n):
+        start = time.perf_counter()
+        text = call(client)
+        samples.append(time.perf_counter() - start)
+    loads, typed = decode_cost(text, model)
+    return {
+        'rps': n / sum(samples),
+        'p50': percentile(samples, 0.5),
+        'p99': percentile(samples, 0.99),
+        'alloc': allocated(call, client),
+        'loads': loads,
+        'typed': typed,
+    }
+
+
+def parse_cost(stream, line, repeats=2000):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        parse_message(stream, line)
+    return (time.perf_counter() - start) / repeats
+
+
+def us(seconds):
+    return '{:>9.1f}'.format(seconds * 1e6) if seconds is not None else '{:>9}'.format('-')
+
+
+def main(n=500, latency_ms=0, items=50):
+    use_temp_token_file()
+    with MockServer(latency=latency_ms / 1000, items=items, stream_messages=5000) as server:
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url,
+                                token_url=server.token_url, rate_limiter=False, response_cache=False,
+                                background_refresh=False)
+        print('JSON backend {}, server latency {} ms, {} items per account, {} calls per endpoint'.format(
+            models.json_backend, latency_ms, items, n))
+        print('{:<16} {:<24} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+            'family', 'endpoint', 'req/s', 'p50 us', 'p99 us', 'alloc KB', 'loads us', 'typed us'))
+        for family, name, call, model in ENDPOINTS:
+            r = bench_endpoint(client, call, model, n)
+            print('{:<16} {:<24} {:>9.0f} {} {} {:>9.1f} {} {}'.format(
+                family, name, r['rps'], us(r['p50']), us(r['p99']), r['alloc'] / 1024, us(r['loads']),
+                us(r['typed'])))
+
+        print()
+        print('{:<16} {:<24} {:>9} {:>9}'.format('family', 'stream', 'msg/s', 'parse us'))
+        samples = {'quotes': b'{"Symbol":"MSFT","Last":"100.15","Bid":"100.10","Ask":"100.20"}',
+                   'bars': b'{"High":"100.5","Low":"99.5","Open":"100","Close":"100.1","Epoch":1704200000000}',
+                   'marketdepth': b'{"Bids":[{"Price":"99.99","Size":"100"}],'
+                                  b'"Asks":[{"Price":"100.01","Size":"100"}]}',
+                   'optionchains': b'{"Strikes":["100"],"Side":"Call","Bid":"1.10","Ask":"1.20","Delta":"0.5"}'}
+        for name, make_stream in STREAMS:
+            start = time.perf_counter()
+            count = sum(1 for _ in make_stream(client))
+            rate = count / (time.perf_counter() - start)
+            print('{:<16} {:<24} {:>9.0f} {}'.format('stream', name, rate, us(parse_cost(name, samples[name]))))
+        client.close()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TradeStationAsync import AsyncTSClient
+from TradeStationClient import CreateTSClient
+from mock_server import MockServer, use_temp_token_file
+
+"""
+    Pre-trade estimates of a set of what-if variants (quantities and sides of a few symbols, a share of them
+    repeated, plus bracket groups) against a local mock confirmation endpoint: confirm_order / confirm_group_order one
+    after another, against estimate_orders on threads and on asyncio, and estimate_orders run again right away
+    (answered from the response cache).
+
+    Usage: python benchmarks/bench_estimates.py [variants] [latency_ms]"""
+
+
+def order(i):
+    return {"AccountID": "SIM123456", "Symbol": "SYM{}".format(i % 10), "Quantity": str(10 * (1 + i % 7)),
+            "OrderType": "Market", "TradeAction": "BUY" if i % 2 else "SELL", "TimeInForce": {"Duration": "DAY"},
+            "Route": "Intelligent"}
+
+
+def variants(n):
+    # Quantities repeat every 7 and symbols every 10, so some variants are the same order.
+    orders = [order(i) for i in range(n)]
+    groups = [{"Type": "BRK", "Orders": [order(i), order(i + 1)]} for i in range(0, n // 10, 2)]
+    return orders, groups
+
+
+def sequential(client, orders, groups):
+    for payload in orders:
+        client.confirm_order(payload)
+    for payload in groups:
+        client.confirm_group_order(payload)
+
+
+async def batched_async(url, orders, groups):
+    async with AsyncTSClient('key', 'secret', api_url=url, sim_api_url=url, rate_limiter=False) as client:
+        return await client.estimate_orders(orders, groups)
+
+
+def main(n=300, latency_ms=20):
+    use_temp_token_file()
+    orders, groups = variants(n)
+    with MockServer(latency=latency_ms / 1000) as server:
+        url = server.url
+        client = CreateTSClient('key', 'secret', pool_maxsize=50, api_url=url, sim_api_url=url, rate_limiter=False,
+                                response_cache=False)
+        cached = CreateTSClient('key', 'secret', pool_maxsize=50, api_url=url, sim_api_url=url, rate_limiter=False)
+        runs = [
+            ('one call after another', lambda: sequential(client, orders, groups)),
+            ('estimate_orders, threads', lambda: client.estimate_orders(orders, groups)),
+            ('estimate_orders, asyncio', lambda: asyncio.run(batched_async(url, orders, groups))),
+            ('estimate_orders, cold', lambda: cached.estimate_orders(orders, groups)),
+            ('estimate_orders, cached', lambda: cached.estimate_orders(orders, groups)),
+        ]
+        print('{} orders and {} groups, server latency {} ms'.format(len(orders), len(groups), latency_ms))
+        for name, run in runs:
+            start = time.perf_counter()
+            estimates = run()
+            elapsed = time.perf_counter() - start
+            line = '{:<26} {:>8.1f} ms'.format(name, elapsed * 1000)
+            if estimates is not None:
+                table = estimates.columns()
+                assert table['ok'].all(), estimates.failed()[:3]
+                line += '  total cost {:>12,.2f}  buying power {:>12,.2f}'.format(
+                    table['cost'].sum(), table['buying_power_effect'].sum())
+            print(line)
+        client.close()
+        cached.close()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
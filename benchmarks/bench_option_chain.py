@@ -0,0 +1,126 @@
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import TradeStationModels as models
+from TradeStationClient import CreateTSClient
+from TradeStationOptionChain import Spreads, option_symbol, risk_reward_matches
+from mock_server import MockServer, use_temp_token_file
+
+"""
+    Option chain assembly and spread evaluation against the local mock server:
+
+        sequential chain   expirations, then the strikes of each expiration, then the quotes of each option, one
+                           request after another
+        parallel chain     client.fetch_option_chain
+        api risk/reward    fetch_opt_risk_reward, one request per spread
+        local risk/reward  Spreads.risk_reward over every candidate vertical, butterfly and straddle of the chain
+
+    Local results are cross-checked against fetch_opt_risk_reward responses for a random sample of spreads. Given a
+    recording file, the check runs against the recorded (payload, response) pairs instead; if the file does not
+    exist yet the responses of the server are recorded to it. Point the client at the live API to record real
+    responses.
+
+    Usage: python benchmarks/bench_option_chain.py [strikes] [expirations] [checks] [latency_ms] [recording]"""
+
+
+def sequential_chain(client, underlying, count):
+    data = models.loads(client.fetch_opt_expirations(underlying))
+    expirations = [e["Date"][:10] for e in data["Expirations"]][:count]
+    symbols = []
+    for date in expirations:
+        strikes = models.loads(client.fetch_opt_strikes(underlying, expiration=date[5:7] + '-' + date[8:] + '-' +
+                                                        date[:4]))["Strikes"]
+        symbols += [option_symbol(underlying, date, side, float(strike[0])) for strike in strikes
+                    for side in ('Call', 'Put')]
+    return [client.fetch_quotes(symbol) for symbol in symbols]
+
+
+def candidates(chain):
+    """
+    :return: Every vertical (widths 1 to 5), butterfly (widths 1 to 3) and straddle of the chain, as a list of
+    Spreads batches.
+    """
+    batches = []
+    for expiration in chain.expirations:
+        for side in ('Call', 'Put'):
+            batches += [chain.verticals(expiration, width, side) for width in range(1, 6)]
+            batches += [chain.butterflies(expiration, width, side) for width in range(1, 4)]
+        batches.append(chain.straddles(expiration))
+    return [batch for batch in batches if len(batch)]
+
+
+def cross_check(client, payloads, recording=None):
+    """
+    :return: (number checked, list of (payload, local result, API response) that disagree).
+    """
+    if recording and os.path.exists(recording):
+        with open(recording) as f:
+            pairs = [(pair["payload"], pair["response"]) for pair in json.load(f)]
+    else:
+        pairs = [(payload, models.loads(client.fetch_opt_risk_reward(payload))) for payload in payloads]
+        if recording:
+            with open(recording, 'w') as f:
+                json.dump([{"payload": p, "response": r} for p, r in pairs], f, indent=1)
+    rr = Spreads.from_payloads([payload for payload, _ in pairs]).risk_reward()
+    mismatches = [(payload, rr.to_dict(i), response) for i, (payload, response) in enumerate(pairs)
+                  if not risk_reward_matches(rr.to_dict(i), response)]
+    return len(pairs), mismatches
+
+
+def main(strikes=60, expirations=8, checks=200, latency_ms=0, recording=None):
+    use_temp_token_file()
+    with MockServer(latency=latency_ms / 1000, items=strikes) as server:
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url,
+                                token_url=server.token_url, rate_limiter=False, response_cache=False,
+                                background_refresh=False)
+        start = time.perf_counter()
+        quotes = sequential_chain(client, 'MSFT', expirations)
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        chain = client.fetch_option_chain('MSFT', expirations=expirations)
+        parallel = time.perf_counter() - start
+
+        batches = candidates(chain)
+        count = sum(len(batch) for batch in batches)
+        start = time.perf_counter()
+        for batch in batches:
+            batch.risk_reward()
+        local = time.perf_counter() - start
+
+        sample = random.Random(7).sample([batch.payload(i) for batch in batches for i in range(len(batch))],
+                                         min(checks, count))
+        start = time.perf_counter()
+        for payload in sample[:50]:
+            client.fetch_opt_risk_reward(payload)
+        api = (time.perf_counter() - start) / min(len(sample), 50)
+
+        checked, mismatches = cross_check(client, sample, recording)
+        client.close()
+
+    print('{} expirations x {} strikes, {} options, server latency {} ms'.format(
+        len(chain.expirations), len(chain.strikes), len(quotes), latency_ms))
+    print('sequential chain      {:>10.3f} s'.format(sequential))
+    print('parallel chain        {:>10.3f} s'.format(parallel))
+    print('api risk/reward       {:>10.1f} us per spread (server side brute force included)'.format(api * 1e6))
+    print('local risk/reward     {:>10.2f} us per spread, {} spreads in {:.1f} ms'.format(
+        local / count * 1e6, count, local * 1e3))
+    print('cross-check           {:>10} of {} agree{}'.format(
+        checked - len(mismatches), checked, ' (recording {})'.format(recording) if recording else ''))
+    for payload, mine, theirs in mismatches[:5]:
+        print('  mismatch', json.dumps(payload), mine, theirs)
+    print('mid price range       {:>10.2f} .. {:.2f}'.format(np.nanmin(chain.mid), np.nanmax(chain.mid)))
+    return not mismatches
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    ok = main(*(int(arg) for arg in args[:4]), *args[4:5])
+    sys.exit(0 if ok else 1)
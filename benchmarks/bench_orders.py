@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TradeStationAsync import AsyncTSClient
+from TradeStationClient import CreateTSClient
+from mock_server import MockServer, use_temp_token_file
+
+"""
+    Spread between the first and the last order reaching a local mock order endpoint when flattening a book:
+    one place_orders / cancel_order call after another, against place_orders_bulk / execute_orders_bulk.
+
+    Arrival times are taken by the server, so the spread is how long the last order trails the first one.
+
+    Usage: python benchmarks/bench_orders.py [orders] [latency_ms]"""
+
+
+def payload(i):
+    return {"AccountID": "SIM123456", "Symbol": "SYM{}".format(i), "Quantity": "10", "OrderType": "Market",
+            "TradeAction": "SELL", "TimeInForce": {"Duration": "DAY"}, "Route": "Intelligent"}
+
+
+def sequential(client, n):
+    for i in range(n // 4):
+        client.cancel_order(str(900000 + i))
+    for i in range(n - n // 4):
+        client.place_orders(payload(i))
+
+
+def bulk(client, n):
+    results = client.execute_orders_bulk(places=[payload(i) for i in range(n - n // 4)],
+                                         cancels=[str(900000 + i) for i in range(n // 4)])
+    assert all(result.ok for result in results), [result for result in results if not result.ok][:3]
+
+
+async def bulk_async(url, n):
+    async with AsyncTSClient('key', 'secret', api_url=url, sim_api_url=url, rate_limiter=False) as client:
+        results = await client.execute_orders_bulk(places=[payload(i) for i in range(n - n // 4)],
+                                                   cancels=[str(900000 + i) for i in range(n // 4)])
+        assert all(result.ok for result in results)
+
+
+def measure(server, run):
+    del server.order_log[:]
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    arrivals = [arrival for arrival, _, _ in server.order_log]
+    methods = [method for _, method, _ in sorted(server.order_log)]
+    # Position of the last cancel among arrivals: all cancels arrived first if it is below the number of cancels.
+    last_cancel = max(i for i, method in enumerate(methods) if method == 'DELETE')
+    return max(arrivals) - min(arrivals), elapsed, last_cancel
+
+
+def main(n=200, latency_ms=20):
+    use_temp_token_file()
+    with MockServer(latency=latency_ms / 1000) as server:
+        url = server.url
+        client = CreateTSClient('key', 'secret', pool_maxsize=50, api_url=url, sim_api_url=url, rate_limiter=False)
+        runs = [
+            ('one call after another', lambda: sequential(client, n)),
+            ('bulk, 50 threads', lambda: bulk(client, n)),
+            ('bulk, asyncio', lambda: asyncio.run(bulk_async(url, n))),
+        ]
+        print('{} orders ({} cancels first), server latency {} ms'.format(n, n // 4, latency_ms))
+        for name, run in runs:
+            spread, elapsed, last_cancel = measure(server, run)
+            print('{:<24} first-to-last {:>8.1f} ms  total {:>8.1f} ms  last cancel arrived #{}'.format(
+                name, spread * 1000, elapsed * 1000, last_cancel + 1))
+        client.close()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,58 @@
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TradeStationClient import CreateTSClient
+from mock_server import MockServer, use_temp_token_file
+
+"""
+    Per-call latency of CreateTSClient with and without connection pooling against a local stub server.
+
+    Usage: python benchmarks/bench_pooling.py [calls]"""
+
+
+def make_client(url, keep_alive):
+    return CreateTSClient('key', 'secret', keep_alive=keep_alive, api_url=url, sim_api_url=url,
+                          rate_limiter=False)
+
+
+def time_calls(call, n):
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * 1e6
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1e6
+    print('{:<28} mean {:>8.1f}us  p50 {:>8.1f}us  p99 {:>8.1f}us'.format(
+        name, statistics.mean(samples) * 1e6, p50, p99))
+
+
+def main(n=2000):
+    use_temp_token_file()
+    with MockServer() as server:
+        url = server.url + '/v3/marketdata/quotes/MSFT'
+
+        # Baseline: module-level requests.request, a new connection every call.
+        report('requests.request (no pool)', time_calls(lambda: requests.request('GET', url, timeout=20), n))
+
+        client = make_client(server.url, keep_alive=False)
+        report('client keep_alive=False', time_calls(lambda: client.fetch_quotes('MSFT'), n))
+        client.close()
+
+        with make_client(server.url, keep_alive=True) as client:
+                report('client keep_alive=True', time_calls(lambda: client.fetch_quotes('MSFT'), n))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
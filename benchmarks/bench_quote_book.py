@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TradeStationQuoteBook import QuoteBook
+
+"""
+    Quote book costs for a universe of symbols:
+
+        update us       applying one partial stream quote
+        lookup us       one point lookup, book.get(symbol)
+        dict mtm ms     mark-to-market of every symbol from a dictionary of latest quote dictionaries
+        book mtm ms     the same with book.mark_to_market(positions), resolving the symbols on every call
+        holdings mtm ms book.mark_to_market(holdings), with the positions resolved to ids once by book.holdings
+        view mtm ms     a dot product of a live column view and precomputed ids, the floor
+
+    Usage: python benchmarks/bench_quote_book.py [symbols]"""
+
+
+def best(call, repeats=20):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(n=5000):
+    symbols = ['SYM{}'.format(i) for i in range(n)]
+    messages = [{"Symbol": symbol, "Last": "{:.2f}".format(100 + i / 100), "Bid": "100.10", "Ask": "100.20"}
+                for i, symbol in enumerate(symbols)]
+    book = QuoteBook(symbols)
+    latest = {}
+
+    start = time.perf_counter()
+    for message in messages:
+        book.update(message)
+    update = (time.perf_counter() - start) / n
+    for message in messages:
+        latest[message["Symbol"]] = {"Last": float(message["Last"])}
+
+    lookup = best(lambda: [book.get(symbol) for symbol in symbols]) / n
+    positions = dict(zip(symbols, range(n)))
+    quantities = np.arange(n, dtype=np.float64)
+    ids = book.ids(symbols)
+    last = book.column('last')
+
+    dict_mtm = best(lambda: sum(latest[symbol]["Last"] * qty for symbol, qty in positions.items()))
+    book_mtm = best(lambda: book.mark_to_market(positions))
+    holdings = book.holdings(positions)
+    holdings_mtm = best(lambda: book.mark_to_market(holdings))
+    view_mtm = best(lambda: float(np.dot(last[ids], quantities)))
+
+    print('{} symbols'.format(n))
+    print('update us        {:>9.2f}'.format(update * 1e6))
+    print('lookup us        {:>9.2f}'.format(lookup * 1e6))
+    print('dict mtm ms      {:>9.3f}'.format(dict_mtm * 1e3))
+    print('book mtm ms      {:>9.3f}'.format(book_mtm * 1e3))
+    print('holdings mtm ms  {:>9.3f}'.format(holdings_mtm * 1e3))
+    print('view mtm ms      {:>9.3f}'.format(view_mtm * 1e3))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
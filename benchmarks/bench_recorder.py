@@ -0,0 +1,69 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TradeStationClient import CreateTSClient
+from TradeStationQuoteBook import QuoteBook
+from TradeStationRecorder import Replay
+from TradeStationStreams import DataEvent
+from mock_server import MockServer, use_temp_token_file
+
+"""
+    Records quote streams of a local mock server to disk, then replays the recording as fast as possible:
+
+        record      messages per second received and recorded, bytes per message on disk
+        records     raw replay (memory map, decompression, framing) without parsing
+        events      replay through parse_message, as a strategy iterating a Stream would see it
+        quote book  replay applied to a QuoteBook
+
+    Usage: python benchmarks/bench_recorder.py [streams] [messages_per_stream]"""
+
+
+def main(streams=4, messages=25000):
+    use_temp_token_file()
+    directory = tempfile.mkdtemp(prefix='ts-recording-')
+    symbols = [['SYM{}'.format(i * 50 + j) for j in range(50)] for i in range(streams)]
+    try:
+        with MockServer(stream_messages=messages) as server:
+            client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, rate_limiter=False)
+            recorder = client.record_streams(directory, rotate_bytes=2 * 2**20)
+            start = time.perf_counter()
+            for chunk in symbols:
+                for _ in client.stream_quotes(chunk, reconnect=False):
+                    pass
+            recorder.close()
+            elapsed = time.perf_counter() - start
+            client.close()
+        count = recorder.messages
+        print('record      {:>10,.0f} msg/s  {:>9,} messages  {:.1f} bytes/msg on disk in {} files'.format(
+            count / elapsed, count, recorder.bytes_written / count, len(recorder.files)))
+
+        replay = Replay(directory, speed=None)
+        start = time.perf_counter()
+        n = sum(1 for _ in replay.records())
+        elapsed = time.perf_counter() - start
+        print('records     {:>10,.0f} msg/s'.format(n / elapsed))
+
+        start = time.perf_counter()
+        n = sum(1 for _ in Replay(directory, speed=None))
+        elapsed = time.perf_counter() - start
+        print('events      {:>10,.0f} msg/s'.format(n / elapsed))
+
+        book = QuoteBook([symbol for chunk in symbols for symbol in chunk])
+        start = time.perf_counter()
+        for event in Replay(directory, speed=None, streams=('quotes',)):
+            if isinstance(event, DataEvent):
+                book.update(event.data)
+        elapsed = time.perf_counter() - start
+        print('quote book  {:>10,.0f} msg/s  last of {}: {}'.format(n / elapsed, symbols[0][0],
+                                                                     book.get(symbols[0][0])))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:3]))
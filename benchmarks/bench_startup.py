@@ -0,0 +1,60 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import MockServer
+
+"""
+    Cold start of a short-lived worker, each run in a fresh interpreter:
+
+        import          import TradeStationClient
+        client          CreateTSClient(...) with credentials from the environment
+        first request   first fetch_quotes against a local mock server (loads requests, opens the connection)
+
+    Also lists which heavy modules are loaded after the import alone.
+
+    Usage: python benchmarks/bench_startup.py [runs]"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = '''
+import sys, time, json
+started = time.perf_counter()
+import TradeStationClient
+imported = time.perf_counter()
+heavy = [name for name in ('requests', 'urllib3', 'asyncio', 'http.server', 'socketserver', 'webbrowser', 'numpy',
+                           'concurrent.futures') if name in sys.modules]
+client = TradeStationClient.CreateTSClient(api_url=sys.argv[1], sim_api_url=sys.argv[1], token_file=None)
+created = time.perf_counter()
+client.fetch_quotes('MSFT')
+done = time.perf_counter()
+print(json.dumps({'import': imported - started, 'client': created - imported, 'first request': done - created,
+                  'heavy': heavy}))
+'''
+
+
+def run_worker(url):
+    env = dict(os.environ, TRADESTATION_ACCESS_TOKEN='token', TRADESTATION_CLIENT_ID='key',
+               TRADESTATION_CLIENT_SECRET='secret', PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, '-c', WORKER, url], env=env, cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(runs=10):
+    # Compile once so every run measures a warm bytecode cache, as deployed workers would.
+    subprocess.run([sys.executable, '-m', 'compileall', '-q', ROOT], check=True)
+    with MockServer() as server:
+        results = [run_worker(server.url) for _ in range(runs)]
+    print('{} fresh interpreters, median'.format(runs))
+    for phase in ('import', 'client', 'first request'):
+        print('{:<14} {:>8.2f} ms'.format(phase, statistics.median(result[phase] for result in results) * 1000))
+    print('loaded by the import alone: {}'.format(', '.join(results[-1]['heavy']) or 'none of the heavy modules'))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,531 @@
+import calendar
+import itertools
+import json
+import os
+import random
+import socket
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, unquote
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+    Local stand-in for the TradeStation v3 API used by the benchmarks.
+
+    Answers every endpoint CreateTSClient uses: the OAuth token endpoint, market data, brokerage, order execution
+    and the market data and brokerage streams. Requests are answered over keep-alive (HTTP/1.1) connections so the
+    benchmarks measure client overhead and connection handling rather than the real API.
+
+    Knobs (MockServer arguments):
+        latency          seconds to wait before answering, to imitate network and API time
+        error_rate       fraction of requests answered with 500
+        throttle_rate    fraction of requests answered with 429 and a Retry-After header
+        items            entries per account (positions, orders) or per symbol (option strikes and expirations)
+        history_orders   historical orders per account, served in pages with NextToken
+        stream_messages  updates per stream connection, stream_interval seconds apart
+        stream_end       how a stream connection ends after its updates: close, goaway or stall
+        stream_status    status code streams are answered with, to imitate a rejected stream
+        stream_padding   bytes of padding added to every stream update, to imitate very long lines
+
+    Quotes and symbol details are answered with one entry per requested symbol, bar charts with generated bars for
+    the requested range, placed orders with a new order ID, unknown paths with a small echo body. Options are priced
+    around an underlying at 100, and option risk / reward is computed by scanning the payoff at expiration."""
+
+ACCOUNT = 'SIM123456'
+
+_order_ids = itertools.count(100000000)
+
+
+def quote(symbol):
+    if ' ' in symbol:
+        return option_quote(symbol)
+    return {"Symbol": symbol, "Bid": "100.10", "Ask": "100.20", "Last": "100.15", "Volume": "123456",
+            "TradeTime": "2024-01-02T15:30:00Z"}
+
+
+def parse_option(symbol):
+    """
+    :return: (expiration as datetime, True for a call, strike) of an option symbol such as 'MSFT 240105C100'.
+    """
+    contract = symbol.rsplit(' ', 1)[1]
+    return datetime.strptime(contract[:6], '%y%m%d'), contract[6] == 'C', float(contract[7:])
+
+
+def option_quote(symbol):
+    """
+    Options on an underlying at 100: intrinsic value plus time value falling off away from the money and growing
+    with the weeks to expiration.
+    """
+    expiration, call, strike = parse_option(symbol)
+    weeks = max((expiration - datetime(2024, 1, 5)).days // 7, 0)
+    value = max((100 - strike) * (1 if call else -1), 0)
+    price = value + 2.5 * (1 + weeks / 10) / (1 + abs(strike - 100) / 5)
+    return {"Symbol": symbol, "Bid": '{:.2f}'.format(max(price - 0.05, 0.01)), "Ask": '{:.2f}'.format(price + 0.05),
+            "Last": '{:.2f}'.format(price), "Volume": "1000", "TradeTime": "2024-01-02T15:30:00Z"}
+
+
+def symbol_details(symbol):
+    return {"Symbol": symbol, "AssetType": "STOCK", "Exchange": "NASDAQ", "Currency": "USD"}
+
+
+def bar(epoch):
+    price = 100 + epoch % 997 / 100
+    return {"High": str(price + 0.5), "Low": str(price - 0.5), "Open": str(price), "Close": str(price + 0.1),
+            "TimeStamp": datetime.utcfromtimestamp(epoch).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            "TotalVolume": str(1000 + epoch % 500), "Epoch": epoch * 1000, "BarStatus": "Closed"}
+
+
+# Minutes of the New York day (UTC-5, daylight saving time ignored) during which each session template trades on
+# weekdays.
+SESSIONS = {'Default': (570, 960), 'USEQPre': (240, 960), 'USEQPost': (570, 1200), 'USEQPreAndPost': (240, 1200),
+            'USEQ24Hour': (0, 1440)}
+
+
+def in_session(epoch, session):
+    day, second = divmod(epoch - 5 * 3600, 86400)
+    # 1970-01-01 was a Thursday.
+    return (day + 3) % 7 < 5 and session[0] <= second // 60 < session[1]
+
+
+def bars(query):
+    """
+    Minute (or Daily) bars every interval units from firstdate to lastdate, or the last barsback bars. Date ranges of
+    minute bars only hold bars during the sessiontemplate's hours, and at most 57,600 bars from the start.
+    """
+    interval = int(query.get('interval', ['1'])[0])
+    step = interval * (86400 if query.get('unit', ['Daily'])[0] == 'Daily' else 60)
+    if 'firstdate' in query:
+        first = calendar.timegm(datetime.strptime(query['firstdate'][0], '%Y-%m-%dT%H:%M:%SZ').timetuple())
+        first -= first % step
+        last = calendar.timegm(datetime.strptime(query['lastdate'][0], '%Y-%m-%dT%H:%M:%SZ').timetuple())
+        epochs = range(first, last + 1, step)
+        if step < 86400:
+            session = SESSIONS[query.get('sessiontemplate', ['Default'])[0]]
+            epochs = (epoch for epoch in epochs if in_session(epoch, session))
+        epochs = list(itertools.islice(epochs, 57600))
+    else:
+        count = int(query.get('barsback', ['1'])[0])
+        epochs = range(1704200000 - count * step, 1704200000, step)
+    return {"Bars": [bar(epoch) for epoch in epochs]}
+
+
+# ---------------------------------------------- brokerage -----------------------------------------------------------
+
+def balance(account):
+    return {"AccountID": account, "AccountType": "Margin", "CashBalance": "250000.00", "BuyingPower": "1000000.00",
+            "Equity": "500000.00", "MarketValue": "250000.00", "TodaysProfitLoss": "1250.50",
+            "UnclearedDeposit": "0", "Commission": "0", "BalanceDetail": {"DayTrades": "0", "RequiredMargin": "0"}}
+
+
+def position(account, i):
+    price = 100 + i % 100
+    return {"AccountID": account, "PositionID": "{}-{}".format(account, i), "Symbol": "SYM{}".format(i),
+            "AssetType": "STOCK", "LongShort": "Long", "Quantity": "100", "AveragePrice": str(price - 1),
+            "Last": str(price), "Bid": str(price - 0.01), "Ask": str(price + 0.01), "MarketValue": str(price * 100),
+            "TotalCost": str((price - 1) * 100), "UnrealizedProfitLoss": "100", "UnrealizedProfitLossPercent": "1.0",
+            "TodaysProfitLoss": "25", "Timestamp": "2024-01-02T15:30:00Z"}
+
+
+def order(account, o_id, status='OPN'):
+    return {"AccountID": account, "OrderID": str(o_id), "Status": status, "StatusDescription": "Received",
+            "OrderType": "Limit", "LimitPrice": "100.00", "Duration": "DAY", "OpenedDateTime": "2024-01-02T14:30:00Z",
+            "Legs": [{"Symbol": "SYM{}".format(int(o_id) % 1000), "BuyOrSell": "Buy", "QuantityOrdered": "10",
+                      "ExecQuantity": "0", "QuantityRemaining": "10", "AssetType": "STOCK"}]}
+
+
+def historical_orders(accounts, query, total):
+    """
+    Page through total filled orders per account with pageSize and nextToken (an offset).
+    """
+    size = int(query.get('pageSize', ['600'])[0])
+    start = int(query.get('nextToken', ['0'])[0])
+    everything = [(account, i) for account in accounts for i in range(total)]
+    page = {"Orders": [order(account, 500000000 + i, 'FLL') for account, i in everything[start:start + size]]}
+    if start + size < len(everything):
+        page["NextToken"] = str(start + size)
+    return page
+
+
+def brokerage(method, parts, query, items, history):
+    """
+    :param parts: Path after /v3/brokerage/accounts, split on '/'.
+    """
+    if not parts:
+        return {"Accounts": [{"AccountID": "{}{}".format(ACCOUNT[:-1], i), "AccountType": "Margin",
+                              "Currency": "USD", "Status": "Active"} for i in range(max(items, 1))]}
+    accounts = parts[0].split(',')
+    kind = parts[1] if len(parts) > 1 else ''
+    if kind in ('balances', 'bodbalances'):
+        return {"Balances" if kind == 'balances' else "BODBalances": [balance(a) for a in accounts], "Errors": []}
+    if kind == 'positions':
+        return {"Positions": [position(a, i) for a in accounts for i in range(items)], "Errors": []}
+    if kind == 'orders':
+        if len(parts) > 2:
+            return {"Orders": [order(accounts[0], o_id) for o_id in parts[2].split(',')], "Errors": []}
+        # Paged like the API, 600 orders a page unless pageSize says otherwise, with nextToken as an offset.
+        size = int(query.get('pageSize', ['600'])[0])
+        start = int(query.get('nextToken', ['0'])[0])
+        everything = [order(a, 200000000 + n * 1000 + i) for n, a in enumerate(accounts) for i in range(items)]
+        page = {"Orders": everything[start:start + size], "Errors": []}
+        if start + size < len(everything):
+            page["NextToken"] = str(start + size)
+        return page
+    if kind == 'historicalorders':
+        return historical_orders(accounts, query, history)
+    if kind == 'wallets':
+        return {"Wallets": [{"Currency": "BTC", "Balance": "1.5", "BalanceAvailableForTrading": "1.5"}]}
+    return {"Error": "NotFound", "Message": "Unknown brokerage path"}
+
+
+# ---------------------------------------------- market data ---------------------------------------------------------
+
+def options(parts, query, items, body=None):
+    """
+    :param parts: Path after /v3/marketdata/options, split on '/'.
+    """
+    if parts[0] == 'expirations':
+        start = datetime(2024, 1, 5)
+        return {"Expirations": [{"Date": (start + timedelta(weeks=i)).strftime('%Y-%m-%dT00:00:00Z'),
+                                 "Type": "Weekly"} for i in range(items)]}
+    if parts[0] == 'strikes':
+        # Later expirations list their strikes shifted down by up to two, so chains have unlisted strikes.
+        shift = 0
+        if 'expiration' in query:
+            shift = (datetime.strptime(query['expiration'][0], '%m-%d-%Y') - datetime(2024, 1, 5)).days // 7 % 3
+        first = 100 - items // 2 - shift
+        return {"SpreadType": query.get('spreadType', ['Single'])[0],
+                "Strikes": [[str(first + i)] for i in range(items)]}
+    if parts[0] == 'spreadtypes':
+        return {"SpreadTypes": [{"Name": name, "StrikeInterval": True, "ExpirationInterval": False}
+                                for name in ('Single', 'Butterfly', 'Calendar', 'Condor', 'Straddle', 'Strangle',
+                                             'Vertical')]}
+    if parts[0] == 'riskreward':
+        return risk_reward(body or {})
+    return {"Error": "NotFound", "Message": "Unknown options path"}
+
+
+def risk_reward(payload):
+    """
+    Risk / reward of a spread found by scanning its payoff at expiration over underlying prices in steps of a cent,
+    as an independent reference for the closed form evaluation of TradeStationOptionChain.
+    """
+    legs = [(parse_option(leg["Symbol"]), leg["Quantity"] * (1 if leg["TradeAction"].startswith("BUY") else -1))
+            for leg in payload["Legs"]]
+    top = max(strike for (_, _, strike), _ in legs) * 2 + 100
+    prices = [cents / 100 for cents in range(int(top * 100) + 1)]
+
+    def payoff(s):
+        value = sum(quantity * max((s - strike) if call else (strike - s), 0) for (_, call, strike), quantity in legs)
+        return round((value - payload["SpreadPrice"]) * 100, 6)
+
+    values = [payoff(s) for s in prices]
+    slope = values[-1] - values[-2]
+    breakevens = []
+    for i in range(1, len(values)):
+        before, after = values[i - 1], values[i]
+        if before < 0 < after or before > 0 > after or (after == 0 and before != 0):
+            breakevens.append(prices[i - 1] + (prices[i] - prices[i - 1]) * before / (before - after))
+    if values[-1] * slope < 0:
+        breakevens.append(prices[-1] - values[-1] / slope * 0.01)
+    return {"MaxGainIsInfinite": slope > 0, "AdjustedMaxGain": None if slope > 0 else '{:.2f}'.format(max(values)),
+            "MaxLossIsInfinite": slope < 0, "AdjustedMaxLoss": None if slope < 0 else '{:.2f}'.format(min(values)),
+            "BreakevenPoints": ['{:.2f}'.format(b) for b in breakevens]}
+
+
+def order_response(method, path):
+    """
+    Place answers with a new order ID, replace and cancel with the order ID from the path. Order IDs starting with
+    0 are rejected, to exercise failure handling.
+    """
+    if method == 'POST':
+        return {"Orders": [{"OrderID": str(next(_order_ids)), "Message": "Sent order"}]}
+    o_id = path.rsplit('/', 1)[1]
+    if o_id.startswith('0'):
+        return {"Error": "FAILED", "Message": "Order {} not found".format(o_id)}
+    return {"OrderID": o_id, "Message": "Cancel request sent" if method == 'DELETE' else "Replace request sent"}
+
+
+def confirmation(payload):
+    quantity = float(payload.get("Quantity") or 0)
+    cost = quantity * 100.15
+    sign = 1 if str(payload.get("TradeAction", "BUY")).upper().startswith("SELL") else -1
+    return {"Route": payload.get("Route", "Intelligent"), "Duration": "DAY", "Account": payload.get("AccountID"),
+            "SummaryMessage": "{} {} {} @ Market".format(payload.get("TradeAction", "BUY"), payload.get("Quantity"),
+                                                       payload.get("Symbol")),
+            "EstimatedPrice": "100.15", "EstimatedCost": "{:.2f}".format(cost), "EstimatedCommission": "1.00",
+            "DebitCreditEstimatedCost": "{:.2f}".format(sign * cost - 1),
+            "OrderConfirmID": payload.get("OrderConfirmID") or "confirm-{}".format(next(_order_ids))}
+
+
+def order_execution(method, parts, body):
+    """
+    :param parts: Path after /v3/orderexecution, split on '/'.
+    """
+    if parts[0] == 'orders':
+        return order_response(method, '/'.join(parts))
+    if parts[0] == 'ordergroups':
+        return {"Orders": [{"OrderID": str(next(_order_ids)), "Message": "Sent order"}
+                           for _ in (body or {}).get('Orders', [])]}
+    if parts[0] == 'orderconfirm':
+        return {"Confirmations": [confirmation(body or {})]}
+    if parts[0] == 'ordergroupconfirm':
+        return {"Confirmations": [confirmation(o) for o in (body or {}).get('Orders', [])]}
+    if parts[0] == 'activationtriggers':
+        return {"ActivationTriggers": [{"Key": "STT", "Name": "Single Trade Tick", "Description": "One trade"},
+                                       {"Key": "DTT", "Name": "Double Trade Tick", "Description": "Two trades"}]}
+    if parts[0] == 'routes':
+        return {"Routes": [{"Id": "Intelligent", "AssetTypes": ["STOCK"], "Name": "Intelligent"},
+                           {"Id": "NSDQ", "AssetTypes": ["STOCK"], "Name": "NSDQ"}]}
+    return {"Error": "NotFound", "Message": "Unknown order execution path"}
+
+
+def respond(method, path, body=None, items=1, history=1000):
+    """
+    :param body: Decoded JSON request body, if any.
+    :param items: Entries per account or symbol in collection responses.
+    :param history: Historical orders per account.
+    :return: Response body for the request, as a JSON-serializable object.
+    """
+    path, _, query = path.partition('?')
+    path = unquote(path)
+    query = parse_qs(query)
+    if path == '/oauth/token':
+        return {"access_token": "mock-token-{}".format(next(_order_ids)), "expires_in": 1200,
+                "token_type": "Bearer", "scope": "openid MarketData ReadAccount Trade"}
+    if path.startswith('/v3/marketdata/barcharts/'):
+        return bars(query)
+    if path.startswith('/v3/marketdata/quotes/'):
+        symbols = path.rsplit('/', 1)[1].split(',')
+        return {"Quotes": [quote(symbol) for symbol in symbols], "Errors": []}
+    if path.startswith('/v3/marketdata/symbols/'):
+        symbols = path.rsplit('/', 1)[1].split(',')
+        return {"Symbols": [symbol_details(symbol) for symbol in symbols], "Errors": []}
+    if path.startswith('/v3/marketdata/options/'):
+        return options(path[len('/v3/marketdata/options/'):].split('/'), query, items, body)
+    if path == '/v3/marketdata/crypto/interestrates':
+        return {"InterestRates": [{"Currency": "BTC", "Rate": "0.01"}, {"Currency": "ETH", "Rate": "0.02"}]}
+    if path.startswith('/v3/brokerage/accounts'):
+        return brokerage(method, [p for p in path[len('/v3/brokerage/accounts'):].split('/') if p], query, items,
+                         history)
+    if path.startswith('/v3/orderexecution/'):
+        return order_execution(method, path[len('/v3/orderexecution/'):].split('/'), body)
+    return {"Path": path, "Method": method}
+
+
+# ------------------------------------------------ streams -----------------------------------------------------------
+
+def stream_messages(path, i):
+    """
+    :return: The i-th update of a stream, by kind of stream.
+    """
+    parts = path.split('/')
+    if '/marketdata/stream/barcharts/' in path:
+        return bar(1704200000 + i * 60)
+    if '/marketdata/stream/marketdepth/' in path:
+        price = 100 + i % 100 / 100
+        return {"Bids": [{"Price": str(price - level / 100), "Size": "100"} for level in range(5)],
+                "Asks": [{"Price": str(price + level / 100), "Size": "100"} for level in range(1, 6)]}
+    if '/marketdata/stream/options/chains/' in path:
+        strike = 95 + i % 10
+        return {"Strikes": [str(strike)], "Side": "Call", "Bid": "1.10", "Ask": "1.20", "Delta": "0.5",
+                "Legs": [{"Symbol": "{} 240105C{}".format(parts[-1], strike), "StrikePrice": str(strike),
+                          "Expiration": "2024-01-05T00:00:00Z", "OptionType": "Call"}]}
+    if '/brokerage/stream/accounts/' in path:
+        account = parts[-2].split(',')[0]
+        if parts[-1] == 'positions':
+            return position(account, i % 10)
+        return order(account, 300000000 + i // 3, ('ACK', 'OPN', 'FLL')[i % 3])
+    symbols = parts[-1].split(',')
+    return {"Symbol": symbols[i % len(symbols)], "Last": str(100 + i % 100 / 100)}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data, headers=()):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        if self.headers.get('Connection', '').lower() == 'close':
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        if self.path.startswith('/v3/orderexecution/orders'):
+            server.order_log.append((time.perf_counter(), self.command, self.path))
+        if not self.path.startswith('/oauth/'):
+            authorization = self.headers.get('Authorization')
+            server.auth_log.append(authorization)
+            if authorization in (None, 'Bearer None', 'Bearer '):
+                return self._send_json(401, {"Error": "Unauthorized", "Message": "Missing access token"})
+        if server.latency:
+            time.sleep(server.latency)
+
+        roll = server.random.random()
+        if roll < server.throttle_rate:
+            return self._send_json(429, {"Error": "TooManyRequests", "Message": "Rate limit exceeded"},
+                                   [('Retry-After', str(server.retry_after))])
+        if roll < server.throttle_rate + server.error_rate:
+            return self._send_json(500, {"Error": "InternalServerError", "Message": "Injected failure"})
+
+        if '/stream/' in self.path:
+            server.stream_log.append((time.perf_counter(), self.path))
+            if server.stream_status != 200:
+                return self._send_json(server.stream_status, {"Error": "BadRequest", "Message": "Rejected stream"})
+            return self._stream()
+        if body and self.headers.get('Content-Type', '').startswith('application/json'):
+            body = json.loads(body)
+        else:
+            body = None
+        self._send_json(200, respond(self.command, self.path, body, server.items, server.history_orders))
+
+    def _chunk(self, message):
+        data = json.dumps(message).encode() + b'\n'
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def _stream(self):
+        """
+        Answer a stream request with chunked newline delimited JSON: for quote streams one snapshot message per
+        symbol and EndSnapshot, then server.stream_messages updates spaced server.stream_interval seconds apart with
+        a heartbeat every ten updates. The stream then ends as server.stream_end says: by closing, with a GoAway
+        message first, or by stalling (sending nothing while the connection stays open) until the client gives up.
+        """
+        path = self.path.split('?', 1)[0]
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.tradestation.streams.v2+json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            if '/stream/quotes/' in path:
+                for symbol in path.rsplit('/', 1)[1].split(','):
+                    self._chunk(quote(symbol))
+            self._chunk({"StreamStatus": "EndSnapshot"})
+            for i in range(self.server.stream_messages):
+                if self.server.stream_interval:
+                    time.sleep(self.server.stream_interval)
+                message = stream_messages(path, i)
+                if self.server.stream_padding:
+                    message["Padding"] = 'x' * self.server.stream_padding
+                self._chunk(message)
+                if i % 10 == 9:
+                    self._chunk({"Heartbeat": i // 10 + 1, "Timestamp": "2024-01-02T15:30:00Z"})
+            if self.server.stream_end == 'goaway':
+                self._chunk({"StreamStatus": "GoAway"})
+            elif self.server.stream_end == 'stall':
+                self.wfile.flush()
+                # Until the client drops the connection, which makes a peek at the socket read nothing.
+                for _ in range(600):
+                    time.sleep(0.1)
+                    try:
+                        if self.connection.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b'':
+                            break
+                    except BlockingIOError:
+                        pass
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    do_GET = do_POST = do_PUT = do_DELETE = _reply
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Large listen backlog so hundreds of concurrent connects are not dropped.
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive or stream connections is expected, not worth a traceback.
+        pass
+
+
+class MockServer:
+    """
+    Run the mock API on a background thread.
+
+    with MockServer() as server:
+        client = CreateTSClient(key, secret, api_url=server.url, sim_api_url=server.url, token_url=server.token_url)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, stream_messages=1000, stream_interval=0.0,
+                 error_rate=0.0, throttle_rate=0.0, retry_after=1, items=1, history_orders=1000, seed=0,
+                 stream_end='close', stream_status=200, stream_padding=0):
+        """
+        :param latency: Seconds the server waits before answering each request, to imitate network and API time.
+        :param stream_messages: Updates sent on a stream connection after the snapshot.
+        :param stream_interval: Seconds between stream updates.
+        :param error_rate: Fraction of requests answered with 500.
+        :param throttle_rate: Fraction of requests answered with 429.
+        :param retry_after: Retry-After seconds sent with a 429.
+        :param items: Positions and orders per account, expirations and strikes per option chain.
+        :param history_orders: Historical orders per account.
+        :param seed: Seed of the error and 429 injection, so runs are repeatable.
+        :param stream_end: How stream connections end after their updates: 'close', 'goaway' (send GoAway first) or
+        'stall' (go silent, as a dead connection would, until the client drops it).
+        :param stream_status: Status code stream requests are answered with; anything but 200 rejects them.
+        :param stream_padding: Bytes of padding added to every stream update.
+        """
+        self.httpd = MockHTTPServer((host, port), MockHandler)
+        self.httpd.stream_messages = stream_messages
+        self.httpd.stream_interval = stream_interval
+        self.httpd.latency = latency
+        self.httpd.error_rate = error_rate
+        self.httpd.throttle_rate = throttle_rate
+        self.httpd.retry_after = retry_after
+        self.httpd.items = items
+        self.httpd.history_orders = history_orders
+        self.httpd.stream_end = stream_end
+        self.httpd.stream_status = stream_status
+        self.httpd.stream_padding = stream_padding
+        self.httpd.random = random.Random(seed)
+        # (arrival time, method, path) of every order placed, replaced or cancelled.
+        self.httpd.order_log = self.order_log = []
+        # Authorization header of every API request (token requests excluded).
+        self.httpd.auth_log = self.auth_log = []
+        # (arrival time, path) of every stream connection.
+        self.httpd.stream_log = self.stream_log = []
+        self.url = 'http://{}:{}'.format(*self.httpd.server_address)
+        self.token_url = self.url + '/oauth/token'
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def configure(self, **options):
+        """
+        Change latency, error_rate, throttle_rate, retry_after, items, history_orders or the stream settings while
+        the server runs.
+        """
+        for name, value in options.items():
+            if not hasattr(self.httpd, name):
+                raise AttributeError('Unknown mock server option: {}'.format(name))
+            setattr(self.httpd, name, value)
+
+
+def use_temp_token_file():
+    """
+    Switch to a scratch directory holding a dummy access_token.txt and refresh_token.txt so CreateTSClient can be
+    built without credentials.
+    """
+    os.chdir(tempfile.mkdtemp())
+    with open('access_token.txt', 'w') as f:
+        f.write('token\n2099-01-01 00:00:00')
+    with open('refresh_token.txt', 'w') as f:
+        f.write('refresh')
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from TradeStationBarCache import BarCache
+from TradeStationClient import CreateTSClient
+from TradeStationMetrics import MetricsCollector
+from mock_server import MockServer
+
+
+@pytest.fixture
+def server():
+    with MockServer() as server:
+        yield server
+
+
+@pytest.fixture
+def cache(server, tmp_path):
+    client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                            access_token='token', rate_limiter=False, background_refresh=False,
+                            instrumentation=MetricsCollector())
+    yield BarCache(client, str(tmp_path / 'bars'))
+    client.close()
+
+
+def requests(cache):
+    return sum(cache.client.instrumentation.responses.values())
+
+
+def test_range_inside_the_cache_is_served_locally(cache):
+    # 2023-01-02 .. 01-06 is one week of regular session bars.
+    bars = cache.get('MSFT', '2023-01-02', '2023-01-07')
+    assert len(bars['timestamp']) == 5 * 390
+    sent = requests(cache)
+    again = cache.get('MSFT', '2023-01-03', '2023-01-05')
+    assert requests(cache) == sent
+    assert len(again['timestamp']) == 2 * 390
+
+
+def test_longer_range_downloads_only_the_missing_tail(cache):
+    cache.get('MSFT', '2023-01-02', '2023-01-07')
+    sent = requests(cache)
+    bars = cache.get('MSFT', '2023-01-02', '2023-01-14')
+    assert requests(cache) == sent + 1
+    assert len(bars['timestamp']) == 10 * 390
+    assert (bars['timestamp'][1:] > bars['timestamp'][:-1]).all()
+    _, meta = cache.read('MSFT')
+    assert meta['bars'] == 10 * 390
+
+
+def test_session_templates_are_cached_separately(cache):
+    regular = cache.get('MSFT', '2023-01-02', '2023-01-07')
+    sent = requests(cache)
+    extended = cache.get('MSFT', '2023-01-02', '2023-01-07', sessiontemplate='USEQPreAndPost')
+    assert requests(cache) == sent + 1
+    assert len(regular['timestamp']) == 5 * 390
+    direct = cache.client.fetch_bar_history('MSFT', '2023-01-02', '2023-01-07', sessiontemplate='USEQPreAndPost')
+    assert extended['timestamp'].tolist() == direct['timestamp'].tolist()
+    sent += 1
+
+    # None and Default are the same session.
+    cache.get('MSFT', '2023-01-02', '2023-01-07', sessiontemplate='Default')
+    assert requests(cache) == sent + 1
+    assert cache.read('MSFT', sessiontemplate='USEQPreAndPost')[1]['sessiontemplate'] == 'USEQPreAndPost'
+    assert sorted(os.listdir(cache.directory)) == ['MSFT__1Minute__Default', 'MSFT__1Minute__USEQPreAndPost']
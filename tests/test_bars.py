@@ -0,0 +1,42 @@
+from TradeStationBars import plan_pages
+from TradeStationClient import CreateTSClient
+from TradeStationMetrics import MetricsCollector
+from mock_server import MockServer
+
+# Weekdays of 2023 (no holidays in the mock) times the minutes of the regular session.
+REGULAR_MINUTES_2023 = 260 * 390
+
+
+def download(server, **kwargs):
+    metrics = MetricsCollector()
+    client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                            access_token='token', rate_limiter=False, background_refresh=False,
+                            instrumentation=metrics)
+    columns = client.fetch_bar_history('MSFT', '2023-01-01', '2023-12-31T23:59:59Z', **kwargs)
+    client.close()
+    return columns, sum(metrics.responses.values())
+
+
+def test_pages_are_sized_on_trading_time():
+    # A year of regular session minute bars is about 100k bars: two pages, not the ten calendar time would give.
+    assert len(plan_pages('2023-01-01', '2024-01-01')) == 2
+    assert len(plan_pages('2023-01-01', '2024-01-01', sessiontemplate='USEQ24Hour')) == 8
+    assert len(plan_pages('2015-01-01', '2024-01-01', unit='Daily')) == 1
+    pages = plan_pages('2023-01-01', '2024-01-01')
+    assert pages[0]['firstdate'] == '2023-01-01T00:00:00Z' and pages[-1]['lastdate'] == '2024-01-01T00:00:00Z'
+
+
+def test_bar_history_downloads_a_year_in_two_requests():
+    with MockServer() as server:
+        columns, requests = download(server)
+    assert requests == 2
+    assert len(columns['timestamp']) == REGULAR_MINUTES_2023
+
+
+def test_full_pages_are_continued_from_their_last_bar():
+    # Pages planned for far fewer bars than the session holds come back cut at 57,600 bars and are continued.
+    with MockServer() as server:
+        columns, requests = download(server, sessiontemplate='USEQPreAndPost', bars_per_day=390)
+    assert requests > 2
+    assert len(columns['timestamp']) == 260 * 960
+    assert (columns['timestamp'][1:] > columns['timestamp'][:-1]).all()
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import TradeStationCache
+from TradeStationAsync import AsyncTSClient
+from TradeStationCache import ResponseCache
+from TradeStationClient import CreateTSClient
+from TradeStationMetrics import MetricsCollector
+from mock_server import MockServer
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1700000000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(TradeStationCache, 'time', clock)
+    return clock
+
+
+def test_entries_expire_after_their_endpoint_ttl(clock):
+    cache = ResponseCache(ttls={'routes': 60, 'interests': 0})
+    cache.put(('GET', 'routes'), 'routes', 'r')
+    cache.put(('GET', 'interests'), 'interests', 'i')
+    assert cache.get(('GET', 'interests')) is None
+    clock.now += 59
+    assert cache.get(('GET', 'routes')) == 'r'
+    clock.now += 1
+    assert cache.get(('GET', 'routes')) is None
+    assert cache.stats()['entries'] == 0 and cache.bytes == 0
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = ResponseCache(max_entries=2)
+    cache.put('a', 'routes', 'a')
+    cache.put('b', 'routes', 'b')
+    cache.get('a')
+    cache.put('c', 'routes', 'c')
+    assert [cache.get(key) for key in 'abc'] == ['a', None, 'c']
+
+    cache = ResponseCache(max_bytes=10)
+    cache.put('a', 'routes', 'x' * 4)
+    cache.put('b', 'routes', 'x' * 4)
+    cache.put('c', 'routes', 'x' * 4)
+    # Larger than the whole cache: not stored.
+    cache.put('d', 'routes', 'x' * 11)
+    assert [cache.get(key) is not None for key in 'abcd'] == [False, True, True, False]
+    assert cache.stats()['evictions'] == 1 and cache.bytes == 8
+
+
+def test_concurrent_misses_load_once():
+    cache = ResponseCache()
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return 200, 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', 'routes', load)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ['value'] * 8 and len(calls) == 1
+    assert cache.get_or_load('k', 'routes', load) == 'value' and len(calls) == 1
+    stats = cache.stats()
+    assert (stats['misses'], stats['coalesced'], stats['hits']) == (1, 7, 1)
+
+
+def test_failed_loads_reach_every_waiter_and_are_not_cached():
+    cache = ResponseCache()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ConnectionError('down')
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_load('k', 'routes', fail)
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(errors) == 4
+    assert cache.get_or_load('k', 'routes', lambda: (500, 'error')) == 'error'
+    assert cache.get('k') is None
+
+
+def test_concurrent_async_misses_load_once():
+    cache = ResponseCache()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 200, 'value'
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load_async('k', 'routes', load) for _ in range(8)))
+
+    assert asyncio.run(run()) == ['value'] * 8
+    assert len(calls) == 1 and cache.stats()['coalesced'] == 7
+
+
+def test_concurrent_client_calls_make_one_upstream_request():
+    metrics = MetricsCollector()
+
+    async def run_async(url):
+        async with AsyncTSClient('key', 'secret', api_url=url, sim_api_url=url, token_file=None,
+                                 access_token='token', rate_limiter=False, background_refresh=False,
+                                 instrumentation=metrics) as client:
+            return await asyncio.gather(*(client.fetch_opt_expirations('MSFT') for _ in range(8)))
+
+    with MockServer(latency=0.1) as server:
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                                access_token='token', rate_limiter=False, background_refresh=False,
+                                instrumentation=metrics)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(client.fetch_opt_expirations('MSFT')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        client.close()
+        assert len(set(results)) == 1 and len(results) == 8
+        assert sum(metrics.responses.values()) == 1
+
+        assert len(set(asyncio.run(run_async(server.url)))) == 1
+        assert sum(metrics.responses.values()) == 2
+
+
+def test_cache_survives_a_save_and_load(tmp_path, clock):
+    path = str(tmp_path / 'cache.json')
+    cache = ResponseCache(ttls={'routes': 60, 'interests': 10}, path=path)
+    cache.put(('GET', 'https://api/routes', 'null'), 'routes', 'routes')
+    cache.put(('GET', 'https://api/interests', 'null'), 'interests', 'interests')
+    cache.save()
+
+    clock.now += 30
+    loaded = ResponseCache(path=path)
+    assert loaded.get(('GET', 'https://api/routes', 'null')) == 'routes'
+    assert loaded.get(('GET', 'https://api/interests', 'null')) is None
+    assert loaded.stats()['entries'] == 1
+
+    clock.now += 30
+    # Entries keep the expiry they were saved with.
+    assert loaded.get(('GET', 'https://api/routes', 'null')) is None
@@ -0,0 +1,69 @@
+import asyncio
+
+from TradeStationAsync import AsyncTSClient
+from TradeStationClient import CreateTSClient
+from TradeStationEstimates import Estimate
+from TradeStationMetrics import MetricsCollector
+from mock_server import MockServer
+
+
+def variant(quantity, action='BUY'):
+    return {"AccountID": "SIM1", "Symbol": "MSFT", "Quantity": str(quantity), "OrderType": "Market",
+            "TradeAction": action, "TimeInForce": {"Duration": "DAY"}, "Route": "Intelligent"}
+
+
+ORDERS = [variant(10), variant(20), variant(10), variant(10, 'SELL'), variant(20)]
+GROUPS = [{"Type": "OCO", "Orders": [variant(10), variant(10, 'SELL')]}] * 2
+
+
+def requests_made(metrics):
+    return sum(metrics.responses.values())
+
+
+def check(estimates):
+    assert [e.kind for e in estimates] == ['order'] * 5 + ['group'] * 2
+    assert all(e.ok for e in estimates)
+    assert [e.cost for e in estimates[:5]] == [1001.5, 2003.0, 1001.5, 1001.5, 2003.0]
+    assert estimates[0].buying_power_effect == -1002.5 and estimates[3].buying_power_effect == 1000.5
+    # Amounts of a group are summed over its orders.
+    assert estimates[5].cost == 2003.0 and estimates[5].commission == 2.0 and estimates[5].price is None
+    assert list(estimates.columns()['cost'][:2]) == [1001.5, 2003.0]
+
+
+def test_identical_variants_are_sent_once_and_cached():
+    metrics = MetricsCollector()
+    with MockServer() as server:
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                                access_token='token', rate_limiter=False, background_refresh=False,
+                                instrumentation=metrics)
+        check(client.estimate_orders(orders=ORDERS, groups=GROUPS))
+        assert requests_made(metrics) == 4
+
+        # Answered from the response cache within its few seconds' TTL.
+        check(client.estimate_orders(orders=ORDERS, groups=GROUPS))
+        assert requests_made(metrics) == 4
+
+        check(client.estimate_orders(orders=ORDERS, groups=GROUPS, cache=False))
+        assert requests_made(metrics) == 8
+        client.close()
+
+
+def test_async_client_sends_identical_variants_once():
+    metrics = MetricsCollector()
+
+    async def run(url):
+        async with AsyncTSClient('key', 'secret', api_url=url, sim_api_url=url, token_file=None,
+                                 access_token='token', rate_limiter=False, background_refresh=False,
+                                 instrumentation=metrics) as client:
+            return await client.estimate_orders(orders=ORDERS, groups=GROUPS, cache=False)
+
+    with MockServer() as server:
+        check(asyncio.run(run(server.url)))
+    assert requests_made(metrics) == 4
+
+
+def test_failed_variants_are_reported_not_raised():
+    rejected = Estimate.from_response('order', {}, '{"Errors": [{"Error": "FAILED", "Message": "No buying power"}]}')
+    assert not rejected.ok and rejected.message == 'No buying power'
+    dropped = Estimate.from_response('group', {}, ConnectionError('reset'))
+    assert not dropped.ok and dropped.message == 'reset'
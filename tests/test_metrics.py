@@ -0,0 +1,45 @@
+import asyncio
+
+from TradeStationAsync import AsyncTSClient
+from TradeStationClient import CreateTSClient
+from TradeStationMetrics import MetricsCollector
+from mock_server import MockServer
+
+
+def phases(metrics):
+    return {phase for _, phase in metrics.latency}
+
+
+def test_sync_and_async_clients_record_the_same_phases():
+    with MockServer() as server:
+        sync_metrics = MetricsCollector()
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                                access_token='token', background_refresh=False, instrumentation=sync_metrics)
+        client.fetch_quotes('MSFT')
+        client.close()
+
+        async_metrics = MetricsCollector()
+
+        async def run():
+            async with AsyncTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                                     access_token='token', background_refresh=False,
+                                     instrumentation=async_metrics) as client:
+                await client.fetch_quotes('MSFT')
+
+        asyncio.run(run())
+    assert 'decode' in phases(async_metrics)
+    assert phases(async_metrics) >= phases(sync_metrics) - {'dns', 'connect'}
+
+
+def test_metrics_server_listens_on_the_local_host_by_default():
+    import urllib.request
+
+    server = MetricsCollector().start_http_server(0)
+    try:
+        host, port = server.server_address
+        assert host == '127.0.0.1'
+        with urllib.request.urlopen('http://127.0.0.1:{}/metrics'.format(port)) as response:
+            assert response.status == 200
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,95 @@
+import numpy as np
+
+from TradeStationOptionChain import Spreads, risk_reward, risk_reward_matches
+
+
+def leg(symbol, quantity, action):
+    return {"Symbol": symbol, "Quantity": quantity, "TradeAction": action}
+
+
+def evaluate(price, *legs):
+    return Spreads.from_payloads([{"SpreadPrice": price, "Legs": list(legs)}]).risk_reward().to_dict(0)
+
+
+def test_bull_call_spread():
+    # Buy the 100 call, sell the 110 call for 4.00: risk 4.00, make at most 6.00, break even at 104.
+    assert evaluate(4.0, leg('MSFT 240119C100', 1, 'BUY'), leg('MSFT 240119C110', 1, 'SELL')) == {
+        "MaxGainIsInfinite": False, "AdjustedMaxGain": '600.00', "MaxLossIsInfinite": False,
+        "AdjustedMaxLoss": '-400.00', "BreakevenPoints": ['104.00']}
+
+
+def test_bear_put_spread():
+    assert evaluate(3.5, leg('MSFT 240119P110', 1, 'BUY'), leg('MSFT 240119P100', 1, 'SELL')) == {
+        "MaxGainIsInfinite": False, "AdjustedMaxGain": '650.00', "MaxLossIsInfinite": False,
+        "AdjustedMaxLoss": '-350.00', "BreakevenPoints": ['106.50']}
+
+
+def test_long_call_butterfly():
+    # 95 / 100 / 105 for 1.25: the most is made at the body, breakevens are the wings moved in by the debit.
+    assert evaluate(1.25, leg('SPY 240105C95', 1, 'BUY'), leg('SPY 240105C100', 2, 'SELL'),
+                    leg('SPY 240105C105', 1, 'BUY')) == {
+        "MaxGainIsInfinite": False, "AdjustedMaxGain": '375.00', "MaxLossIsInfinite": False,
+        "AdjustedMaxLoss": '-125.00', "BreakevenPoints": ['96.25', '103.75']}
+
+
+def test_long_straddle():
+    # Unlimited gain above, the premium at risk at the strike, and the payoff at 0 is strike - premium.
+    assert evaluate(8.0, leg('SPY 240105C472.5', 1, 'BUY'), leg('SPY 240105P472.5', 1, 'BUY')) == {
+        "MaxGainIsInfinite": True, "AdjustedMaxGain": None, "MaxLossIsInfinite": False,
+        "AdjustedMaxLoss": '-800.00', "BreakevenPoints": ['464.50', '480.50']}
+
+
+def test_short_call_and_credit_spread():
+    assert evaluate(-2.0, leg('MSFT 240119C100', 1, 'SELL')) == {
+        "MaxGainIsInfinite": False, "AdjustedMaxGain": '200.00', "MaxLossIsInfinite": True,
+        "AdjustedMaxLoss": None, "BreakevenPoints": ['102.00']}
+    # Bear call spread for a 3.00 credit.
+    assert evaluate(-3.0, leg('MSFT 240119C100', 1, 'SELL'), leg('MSFT 240119C105', 1, 'BUY')) == {
+        "MaxGainIsInfinite": False, "AdjustedMaxGain": '300.00', "MaxLossIsInfinite": False,
+        "AdjustedMaxLoss": '-200.00', "BreakevenPoints": ['103.00']}
+
+
+def test_batch_matches_one_by_one():
+    rng = np.random.default_rng(3)
+    strikes = rng.choice(np.arange(80, 121, 2.5), size=(500, 3))
+    calls = rng.random((500, 3)) < 0.5
+    quantities = rng.integers(-2, 3, size=(500, 3)).astype(float)
+    prices = rng.normal(0, 3, 500).round(2)
+    batch = risk_reward(strikes, calls, quantities, prices)
+    for i in range(0, 500, 37):
+        one = risk_reward(strikes[i:i + 1], calls[i:i + 1], quantities[i:i + 1], prices[i:i + 1])
+        assert batch.to_dict(i) == one.to_dict(0)
+
+
+def test_risk_reward_matches_to_the_cent():
+    local = evaluate(4.0, leg('MSFT 240119C100', 1, 'BUY'), leg('MSFT 240119C110', 1, 'SELL'))
+    api = {"MaxGainIsInfinite": False, "AdjustedMaxGain": "600.004", "MaxLossIsInfinite": False,
+           "AdjustedMaxLoss": "-400", "BreakevenPoints": ["104"]}
+    assert risk_reward_matches(local, api)
+    assert not risk_reward_matches(local, dict(api, BreakevenPoints=["104.05"]))
+    assert not risk_reward_matches(local, dict(api, BreakevenPoints=[]))
+    assert not risk_reward_matches(local, dict(api, MaxGainIsInfinite=True, AdjustedMaxGain=None))
+
+
+def test_sync_and_async_clients_build_the_same_chain():
+    import asyncio
+
+    from TradeStationAsync import AsyncTSClient
+    from TradeStationClient import CreateTSClient
+    from mock_server import MockServer
+
+    async def run(url):
+        async with AsyncTSClient('key', 'secret', api_url=url, sim_api_url=url, token_file=None,
+                                 access_token='token', background_refresh=False) as client:
+            return await client.fetch_option_chain('MSFT', expirations=2)
+
+    with MockServer(items=10) as server:
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                                access_token='token', background_refresh=False)
+        chain = client.fetch_option_chain('MSFT', expirations=2)
+        client.close()
+        async_chain = asyncio.run(run(server.url))
+    assert async_chain.expirations == chain.expirations and len(chain.expirations) == 2
+    assert np.array_equal(async_chain.strikes, chain.strikes)
+    assert np.array_equal(async_chain.mid, chain.mid, equal_nan=True)
+    assert not np.isnan(chain.mid[chain.listed]).all()
@@ -0,0 +1,99 @@
+import asyncio
+import csv
+
+import pytest
+
+from TradeStationAsync import AsyncTSClient
+from TradeStationClient import CreateTSClient
+from TradeStationOrderHistory import COLUMNS, OrderHistoryError
+from mock_server import MockServer
+
+ACCOUNTS = ['SIM1', 'SIM2']
+
+
+def client_for(server):
+    return CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                          access_token='token', rate_limiter=False, background_refresh=False, retry_policy=False)
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_pages_are_walked_to_the_end(prefetch):
+    with MockServer(history_orders=12) as server:
+        client = client_for(server)
+        history = client.iter_hist_orders(ACCOUNTS, '2024-01-01', page_size=10)
+        history.prefetch = prefetch
+        pages = [len(page) for page in history.iter_pages()]
+        client.close()
+    assert pages == [10, 10, 4]
+    assert history.done and history.resume_token is None and history.pages == 3
+
+
+def test_resume_after_a_failed_page_and_remove_the_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / 'orders.token')
+    with MockServer(history_orders=12) as server:
+        client = client_for(server)
+        history = client.iter_hist_orders(ACCOUNTS, '2024-01-01', page_size=10, checkpoint=checkpoint)
+        history.prefetch = False
+        seen = []
+        with pytest.raises(OrderHistoryError) as error:
+            for page in history.iter_pages():
+                seen.extend((order.account_id, order.order_id) for order in page)
+                server.configure(error_rate=1.0)
+        assert error.value.status == 500 and error.value.token == '10'
+        with open(checkpoint) as f:
+            assert f.read() == '10'
+
+        server.configure(error_rate=0.0)
+        resumed = client.iter_hist_orders(ACCOUNTS, '2024-01-01', page_size=10, checkpoint=checkpoint)
+        assert resumed.resume_token == '10'
+        seen.extend((order.account_id, order.order_id) for order in resumed)
+        client.close()
+    assert len(seen) == len(set(seen)) == 24
+    assert not (tmp_path / 'orders.token').exists()
+
+
+def test_to_csv_continues_an_interrupted_export(tmp_path):
+    path = str(tmp_path / 'orders.csv')
+    checkpoint = str(tmp_path / 'orders.token')
+    with MockServer(history_orders=12) as server:
+        client = client_for(server)
+        history = client.iter_hist_orders(ACCOUNTS, '2024-01-01', page_size=10, checkpoint=checkpoint)
+        history.prefetch = False
+        pages = history.iter_pages()
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(history._row(order) for order in next(pages))
+        # The first page was written and the process stopped before asking for the next one.
+        pages.close()
+        with open(checkpoint, 'w') as f:
+            f.write('10')
+
+        written = client.iter_hist_orders(ACCOUNTS, '2024-01-01', page_size=10, checkpoint=checkpoint).to_csv(path)
+        client.close()
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert written == 14
+    assert rows[0] == list(COLUMNS) and len(rows) == 25
+
+
+def test_to_parquet_writes_every_order(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'orders.parquet')
+    with MockServer(history_orders=12) as server:
+        client = client_for(server)
+        written = client.iter_hist_orders(ACCOUNTS, '2024-01-01', page_size=10).to_parquet(path)
+        client.close()
+    table = pq.read_table(path)
+    assert written == table.num_rows == 24
+    assert table.column_names == list(COLUMNS)
+
+
+def test_async_client_is_refused():
+    async def run():
+        async with AsyncTSClient('key', 'secret', token_file=None, access_token='token',
+                                 background_refresh=False) as client:
+            client.iter_hist_orders(ACCOUNTS, '2024-01-01')
+
+    with pytest.raises(TypeError):
+        asyncio.run(run())
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from TradeStationAsync import AsyncTSClient
+from TradeStationClient import CreateTSClient
+from TradeStationOrderTracker import OrderEndedError, OrderTracker
+from mock_server import MockServer, order as api_order
+
+PAYLOAD = {"AccountID": "SIM1", "Symbol": "MSFT", "Quantity": "10", "OrderType": "Market", "TradeAction": "BUY",
+           "TimeInForce": {"Duration": "DAY"}, "Route": "Intelligent"}
+
+
+def client_for(server):
+    return CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                          access_token='token', rate_limiter=False, background_refresh=False)
+
+
+def test_stream_updates_resolve_the_futures():
+    # The mock order stream takes each order through ACK, OPN and FLL, 20 ms apart.
+    with MockServer(stream_messages=6, stream_interval=0.02) as server:
+        client = client_for(server)
+        tracker = OrderTracker(client, 'SIM1', positions=False, max_backoff=0.01)
+        filled = tracker.filled('300000001')
+        done = tracker.done('300000001')
+        cancelled = tracker.cancelled('300000001')
+        tracker.start()
+        order = filled.result(timeout=5)
+        tracker.stop()
+        client.close()
+    assert order.status == 'FLL' and done.result(timeout=0) is order
+    with pytest.raises(OrderEndedError):
+        cancelled.result(timeout=0)
+    # A wait on an order that is already final resolves at once.
+    assert tracker.filled('300000000').result(timeout=0).status == 'FLL'
+
+
+def test_reconnect_catches_up_from_a_snapshot():
+    with MockServer(stream_messages=3) as server:
+        client = client_for(server)
+        tracker = client.track_orders('SIM1', positions=False, max_backoff=0.01)
+        deadline = time.monotonic() + 5
+        while not tracker.reconciles and time.monotonic() < deadline:
+            time.sleep(0.01)
+        tracker.stop()
+        client.close()
+    # Snapshot orders are numbered from 200000000, stream orders from 300000000.
+    assert tracker.reconciles >= 1 and '200000000' in tracker.orders
+
+
+def test_orders_sent_through_the_client_are_recorded():
+    with MockServer() as server:
+        client = client_for(server)
+        tracker = OrderTracker(client, 'SIM1')
+        placed = client.execute_orders_bulk(places=[PAYLOAD])[0]
+        order_id = placed.order_id
+        assert tracker.get(order_id).status == 'ACK' and tracker.for_symbol('MSFT')[0].order_id == order_id
+
+        filled = tracker.filled(order_id)
+        cancelled = tracker.cancelled(order_id)
+        client.execute_orders_bulk(cancels=[order_id])
+        assert tracker.get(order_id).status == 'UCN'
+        # The order stream reports the cancel.
+        tracker.apply(api_order('SIM1', order_id, 'CAN'))
+        client.close()
+    assert cancelled.result(timeout=0).status == 'CAN'
+    with pytest.raises(OrderEndedError):
+        filled.result(timeout=0)
+    assert not tracker.live()
+
+
+def test_async_waits_resolve_from_the_streams():
+    async def run(url):
+        async with AsyncTSClient('key', 'secret', api_url=url, sim_api_url=url, token_file=None,
+                                 access_token='token', rate_limiter=False, background_refresh=False) as client:
+            tracker = OrderTracker(client, 'SIM1', positions=False, max_backoff=0.01)
+            task = asyncio.ensure_future(tracker.run())
+            try:
+                return await tracker.wait_filled('300000001', timeout=5)
+            finally:
+                tracker.stop()
+                task.cancel()
+
+    with MockServer(stream_messages=6, stream_interval=0.02) as server:
+        order = asyncio.run(run(server.url))
+    assert order.status == 'FLL'
@@ -0,0 +1,70 @@
+import asyncio
+
+from TradeStationAsync import AsyncTSClient
+from TradeStationClient import CreateTSClient
+from mock_server import MockServer
+
+
+def payload(i):
+    return {"AccountID": "SIM123456", "Symbol": "SYM{}".format(i), "Quantity": "10", "OrderType": "Market",
+            "TradeAction": "SELL", "TimeInForce": {"Duration": "DAY"}, "Route": "Intelligent"}
+
+
+def bulk_arguments():
+    return dict(places=[payload(i) for i in range(20)], replaces=[(str(800000 + i), payload(i)) for i in range(10)],
+                cancels=[str(900000 + i) for i in range(20)])
+
+
+def assert_phases(order_log):
+    methods = [method for _, method, _ in sorted(order_log)]
+    assert methods == ['DELETE'] * 20 + ['PUT'] * 10 + ['POST'] * 20, methods
+
+
+def test_bulk_orders_run_each_phase_as_a_barrier():
+    with MockServer(latency=0.02) as server:
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                                access_token='token', pool_maxsize=50, rate_limiter=False, background_refresh=False)
+        results = client.execute_orders_bulk(**bulk_arguments())
+        client.close()
+    assert len(results) == 50
+    assert_phases(server.order_log)
+
+
+def test_async_bulk_orders_run_each_phase_as_a_barrier():
+    async def run(url):
+        async with AsyncTSClient('key', 'secret', api_url=url, sim_api_url=url, token_file=None,
+                                 access_token='token', rate_limiter=False, background_refresh=False) as client:
+            return await client.execute_orders_bulk(**bulk_arguments())
+
+    with MockServer(latency=0.02) as server:
+        results = asyncio.run(run(server.url))
+    assert len(results) == 50
+    assert_phases(server.order_log)
+
+
+def test_bulk_results_follow_the_phases_and_failures_do_not_stop_them():
+    with MockServer() as server:
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                                access_token='token', rate_limiter=False, background_refresh=False)
+        arguments = bulk_arguments()
+        # The mock rejects order IDs starting with 0.
+        arguments['cancels'][:2] = ['0100', '0200']
+        results = client.execute_orders_bulk(**arguments)
+        client.close()
+    assert [result.action for result in results] == ['cancel'] * 20 + ['replace'] * 10 + ['place'] * 20
+    assert [result.ok for result in results[:3]] == [False, False, True]
+    assert all(result.ok for result in results[20:])
+
+
+def test_bulk_orders_without_priority_go_out_in_one_round_trip():
+    latency = 0.2
+    with MockServer(latency=latency) as server:
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                                access_token='token', pool_maxsize=50, rate_limiter=False, background_refresh=False)
+        results = client.execute_orders_bulk(priority=False, **bulk_arguments())
+        client.close()
+    assert [result.action for result in results] == ['place'] * 20 + ['replace'] * 10 + ['cancel'] * 20
+    assert all(result.ok for result in results)
+    arrivals = {method: [arrival for arrival, m, _ in server.order_log if m == method] for method in ('POST', 'DELETE')}
+    # The cancels did not wait for the places to be answered.
+    assert min(arrivals['DELETE']) < max(arrivals['POST']) + latency
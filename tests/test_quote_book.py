@@ -0,0 +1,46 @@
+import numpy as np
+
+from TradeStationQuoteBook import QuoteBook
+
+
+def test_mark_to_market_with_holdings_matches_dictionary():
+    book = QuoteBook(['AAPL', 'MSFT'], capacity=2)
+    book.update({"Symbol": "AAPL", "Last": "190.50"})
+    book.update({"Symbol": "MSFT", "Last": "410.25"})
+    positions = {"MSFT": 10, "AAPL": -5}
+    holdings = book.holdings(positions)
+
+    total, values = book.mark_to_market(holdings)
+    assert total == book.mark_to_market(positions)[0] == 4102.5 - 952.5
+    assert values.tolist() == [4102.5, -952.5]
+
+    # Ids stay valid when the book grows and prices move.
+    book.add(['SYM{}'.format(i) for i in range(100)])
+    book.update({"Symbol": "AAPL", "Last": "200"})
+    assert book.mark_to_market(holdings)[0] == 4102.5 - 1000
+
+
+def test_holdings_register_unknown_symbols():
+    book = QuoteBook()
+    holdings = book.holdings((['IBM', 'GE'], [1, 2]))
+    assert 'IBM' in book and 'GE' in book
+    total, values = book.mark_to_market(holdings)
+    assert total == 0 and np.isnan(values).all()
+
+
+def test_async_client_fills_the_quote_book():
+    import asyncio
+
+    from TradeStationAsync import AsyncTSClient
+    from mock_server import MockServer
+
+    async def run(url):
+        async with AsyncTSClient('key', 'secret', api_url=url, sim_api_url=url, token_file=None,
+                                 access_token='token', background_refresh=False) as client:
+            book = await client.quote_book(['MSFT', 'AAPL'])
+            assert await book.poll_async(client) == 2
+            return book
+
+    with MockServer() as server:
+        book = asyncio.run(run(server.url))
+    assert len(book) == 2 and not np.isnan(book.column('last')).any()
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+import TradeStationRateLimit
+from TradeStationRateLimit import RateLimiter, TokenBucket, endpoint_family
+
+QUOTES = 'https://api.tradestation.com/v3/marketdata/quotes/MSFT'
+ORDERS = 'https://api.tradestation.com/v3/orderexecution/orders'
+
+
+class FakeClock:
+    """
+    Stands in for the time module: sleeping moves the clock forward at once.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return 1700000000.0 + self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(TradeStationRateLimit, 'time', clock)
+    return clock
+
+
+def test_endpoint_families():
+    assert endpoint_family(QUOTES) == 'marketdata'
+    assert endpoint_family('https://sim-api.tradestation.com/v3/brokerage/accounts/SIM1/orders') == 'brokerage'
+    assert endpoint_family(ORDERS + '?x=1') == 'orderexecution'
+    assert endpoint_family('https://signin.tradestation.com/oauth/token') is None
+
+
+def test_bucket_allows_a_burst_then_paces_at_the_refill_rate(clock):
+    bucket = TokenBucket(10, 10)
+    assert [bucket.reserve() for _ in range(10)] == [0.0] * 10
+    assert bucket.reserve() == pytest.approx(1.0)
+    assert bucket.reserve() == pytest.approx(2.0)
+    assert bucket.remaining == 0
+
+    clock.now += 5
+    assert bucket.remaining == 3
+    clock.now += 3600
+    # Refill stops at the capacity.
+    assert bucket.remaining == 10
+
+
+def test_acquire_sleeps_for_the_reserved_wait(clock):
+    limiter = RateLimiter({'marketdata': (2, 10)})
+    for _ in range(4):
+        limiter.acquire(QUOTES)
+    assert clock.slept == [pytest.approx(5.0), pytest.approx(5.0)]
+    # Other families have their own budget, URLs outside the API none.
+    limiter.acquire(ORDERS)
+    limiter.acquire('https://signin.tradestation.com/oauth/token')
+    assert len(clock.slept) == 2
+
+
+def test_acquire_async_waits_without_blocking(clock, monkeypatch):
+    waits = []
+
+    async def fake_sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(asyncio, 'sleep', fake_sleep)
+    limiter = RateLimiter({'marketdata': (1, 4)})
+
+    async def run():
+        await limiter.acquire_async(QUOTES)
+        await limiter.acquire_async(QUOTES)
+
+    asyncio.run(run())
+    assert waits == [pytest.approx(4.0)] and not clock.slept
+
+
+def test_rate_limit_headers_correct_the_bucket(clock):
+    limiter = RateLimiter({'marketdata': (100, 100)})
+    bucket = limiter.bucket(QUOTES)
+
+    limiter.update(QUOTES, 200, {'X-RateLimit-Remaining': '3'})
+    assert bucket.remaining == 3
+    # A server reporting more than is left locally does not add budget.
+    limiter.update(QUOTES, 200, {'RateLimit-Remaining': '50'})
+    assert bucket.remaining == 3
+    limiter.update(QUOTES, 200, {'X-RateLimit-Remaining': 'many'})
+    assert bucket.remaining == 3
+
+    limiter.update(QUOTES, 200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '20'})
+    assert bucket.reserve() == pytest.approx(21.0)
+
+    clock.now += 100
+    # The reset can also come as an epoch timestamp.
+    limiter.update(QUOTES, 200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(clock.time() + 30)})
+    assert bucket.reserve() == pytest.approx(31.0)
+
+
+def test_429_holds_back_the_family_for_retry_after(clock):
+    limiter = RateLimiter(retry_after=5)
+    limiter.update(QUOTES, 429, {'Retry-After': '7'})
+    limiter.acquire(QUOTES)
+    wait = clock.slept[-1]
+    assert 7.0 <= wait < 9.0
+
+    limiter.update(ORDERS, 429, {})
+    limiter.acquire(ORDERS)
+    assert 5.0 <= clock.slept[-1] < 7.0
+    assert limiter.remaining()['brokerage'] == 250
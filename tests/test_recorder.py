@@ -0,0 +1,25 @@
+import time
+
+from TradeStationRecorder import Recorder, read_records
+
+
+def test_quiet_stream_is_written_within_flush_interval(tmp_path):
+    recorder = Recorder(str(tmp_path), batch_size=1000, flush_interval=0.1)
+    recorder.write('quotes', b'{"Symbol":"MSFT","Last":"410.25"}')
+    recorder.write('quotes', b'{"Symbol":"MSFT","Last":"410.50"}')
+    deadline = time.monotonic() + 2
+    while not (recorder.files and list(read_records(recorder.files[0]))) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    records = list(read_records(recorder.files[0]))
+    assert [line for _, _, line in records] == [b'{"Symbol":"MSFT","Last":"410.25"}',
+                                                b'{"Symbol":"MSFT","Last":"410.50"}']
+    recorder.close()
+    assert not recorder._thread.is_alive()
+
+
+def test_no_background_writes_without_flush_interval(tmp_path):
+    with Recorder(str(tmp_path), batch_size=1000, flush_interval=None) as recorder:
+        recorder.write('quotes', b'{"Symbol":"MSFT"}')
+        time.sleep(0.2)
+        assert not recorder.files and recorder._thread is None
+    assert len(list(read_records(recorder.files[0]))) == 1
@@ -0,0 +1,144 @@
+import time
+
+import pytest
+
+import TradeStationRetry
+from TradeStationClient import CreateTSClient
+from TradeStationRetry import CircuitBreaker, CircuitOpenError, RetryPolicy, retry_after
+from mock_server import MockServer
+
+ORDER = {"AccountID": "SIM123456", "Symbol": "MSFT", "Quantity": "10", "OrderType": "Market", "TradeAction": "BUY",
+         "TimeInForce": {"Duration": "DAY"}, "Route": "Intelligent"}
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+def client_for(server, **kwargs):
+    return CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                          access_token='token', rate_limiter=False, background_refresh=False, **kwargs)
+
+
+def test_only_requests_safe_to_repeat_are_retryable():
+    policy = RetryPolicy()
+    api = 'https://api.tradestation.com'
+    for method in ('GET', 'PUT', 'DELETE'):
+        assert policy.retryable(method, api + '/v3/orderexecution/orders/123', {})
+    assert policy.retryable('POST', api + '/v3/marketdata/options/riskreward', {"json": {}})
+    assert policy.retryable('POST', api + '/v3/orderexecution/orderconfirm', {"json": ORDER})
+    assert not policy.retryable('POST', api + '/v3/orderexecution/orders', {"json": ORDER})
+    assert policy.retryable('POST', api + '/v3/orderexecution/orders',
+                            {"json": dict(ORDER, OrderConfirmID='abc')})
+    group = {"Type": "OCO", "Orders": [dict(ORDER, OrderConfirmID='a'), ORDER]}
+    assert not policy.retryable('POST', api + '/v3/orderexecution/ordergroups', {"json": group})
+    assert not policy.retryable('PATCH', api + '/v3/orderexecution/orders/123', {})
+
+
+def test_order_confirm_ids_are_added_without_changing_the_payload():
+    policy = RetryPolicy()
+    url = 'https://api.tradestation.com/v3/orderexecution/orders'
+    payload = dict(ORDER)
+    kwargs = policy.prepare('POST', url, {"json": payload})
+    assert 'OrderConfirmID' not in payload
+    assert 1 <= len(kwargs['json']['OrderConfirmID']) <= 22
+    assert policy.retryable('POST', url, kwargs)
+
+    kept = policy.prepare('POST', url, {"json": dict(ORDER, OrderConfirmID='mine')})
+    assert kept['json']['OrderConfirmID'] == 'mine'
+
+    group = policy.prepare('POST', url.replace('orders', 'ordergroups'),
+                           {"json": {"Type": "OCO", "Orders": [dict(ORDER, OrderConfirmID='a'), ORDER]}})
+    ids = [order['OrderConfirmID'] for order in group['json']['Orders']]
+    assert ids[0] == 'a' and ids[1]
+
+    assert 'OrderConfirmID' not in RetryPolicy(order_ids=False).prepare('POST', url, {"json": ORDER})['json']
+
+
+def test_endpoint_timeouts_are_opt_in():
+    url = 'https://api.tradestation.com/v3/marketdata/barcharts/MSFT'
+    assert 'timeout' not in RetryPolicy().prepare('GET', url, {})
+    policy = RetryPolicy(timeouts={'/v3/marketdata/': 30, '/v3/marketdata/barcharts/': 60})
+    assert policy.prepare('GET', url, {})['timeout'] == 60
+    assert policy.prepare('GET', url.replace('barcharts', 'quotes'), {})['timeout'] == 30
+    assert policy.prepare('GET', url, {'timeout': 5})['timeout'] == 5
+
+
+def test_retry_after_is_honored_up_to_its_limit(monkeypatch):
+    monkeypatch.setattr(TradeStationRetry, 'time', FakeClock())
+    assert retry_after({}) is None
+    assert retry_after({'Retry-After': '2'}) == 2.0
+    assert retry_after({'Retry-After': 'Thu, 01 Jan 1970 00:17:00 GMT'}) == 20.0
+    assert retry_after({'Retry-After': 'soon'}) is None
+
+    policy = RetryPolicy(retries=2, backoff=0.01, max_retry_after=10)
+    assert policy.delay(0, {'Retry-After': '3'}) == 3.0
+    assert policy.delay(0, {'Retry-After': '11'}) is None
+    assert policy.delay(0, {}) <= 0.01
+    assert policy.delay(2, {'Retry-After': '1'}) is None
+
+
+def test_client_retries_idempotent_requests_only():
+    with MockServer(throttle_rate=1.0, retry_after=0.05) as server:
+        client = client_for(server, retry_policy=RetryPolicy(retries=2, backoff=0), circuit_breaker=False)
+        started = time.perf_counter()
+        status, _ = client._send('GET', server.url + '/v3/marketdata/quotes/MSFT')
+        assert status == 429
+        assert time.perf_counter() - started >= 0.1
+        assert len(server.auth_log) == 3
+
+        orders = server.url + '/v3/orderexecution/orders'
+        client.retry_policy = RetryPolicy(retries=2, backoff=0, order_ids=False)
+        assert client._send('POST', orders, json=ORDER)[0] == 429
+        assert len(server.order_log) == 1
+
+        client.retry_policy = RetryPolicy(retries=2, backoff=0)
+        assert client._send('POST', orders, json=ORDER)[0] == 429
+        assert len(server.order_log) == 4
+        client.close()
+
+
+def test_circuit_opens_half_opens_and_closes(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(TradeStationRetry, 'time', clock)
+    breaker = CircuitBreaker(failures=3, reset_after=30)
+    url = 'https://api.tradestation.com/v3/marketdata/quotes/MSFT'
+
+    for status in (500, None, 503):
+        breaker.before(url)
+        breaker.record(url, status)
+    assert breaker.state(url) == 'open'
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before(url)
+    assert error.value.retry_in == 30
+    # Other hosts are unaffected.
+    breaker.before('https://sim-api.tradestation.com/v3/brokerage/accounts')
+
+    clock.now += 30
+    breaker.before(url)
+    assert breaker.state(url) == 'half-open'
+    breaker.record(url, 502)
+    assert breaker.state(url) == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before(url)
+
+    clock.now += 30
+    breaker.before(url)
+    breaker.record(url, 200)
+    assert breaker.state(url) == 'closed'
+    breaker.before(url)
+
+    # A success resets the count of consecutive failures.
+    breaker.record(url, 500)
+    breaker.record(url, 500)
+    breaker.record(url, 404)
+    breaker.record(url, 500)
+    assert breaker.state(url) == 'closed'
@@ -0,0 +1,31 @@
+import asyncio
+
+from TradeStationAsync import AsyncTSClient
+from TradeStationClient import CreateTSClient
+from mock_server import MockServer
+
+ACCOUNTS = ['SIM1', 'SIM2']
+
+
+def test_snapshot_follows_every_page_of_orders():
+    # 1400 orders come back in three pages of 600.
+    with MockServer(items=700) as server:
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                                access_token='token', rate_limiter=False, background_refresh=False)
+        snapshot = client.fetch_snapshot(ACCOUNTS)
+        client.close()
+    assert len(snapshot.orders) == 1400
+    assert len(snapshot.positions) == 1400
+    assert not snapshot.errors
+
+
+def test_async_snapshot_follows_every_page_of_orders():
+    async def run(url):
+        async with AsyncTSClient('key', 'secret', api_url=url, sim_api_url=url, token_file=None,
+                                 access_token='token', rate_limiter=False, background_refresh=False) as client:
+            return await client.fetch_snapshot(ACCOUNTS)
+
+    with MockServer(items=700) as server:
+        snapshot = asyncio.run(run(server.url))
+    assert len(snapshot.orders) == 1400
+    assert not snapshot.errors
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from TradeStationAsync import AsyncTSClient
+from TradeStationClient import CreateTSClient
+from TradeStationMetrics import MetricsCollector
+from TradeStationStreams import DataEvent, StatusEvent, StreamError
+from mock_server import MockServer
+
+
+def client_for(server, metrics):
+    return CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url, token_file=None,
+                          access_token='token', rate_limiter=False, background_refresh=False, instrumentation=metrics)
+
+
+def follow(stream, connections):
+    """
+    :return: Events of a stream until its snapshot has arrived on the given number of connections.
+    """
+    events = []
+    snapshots = 0
+    for event in stream:
+        events.append(event)
+        if isinstance(event, StatusEvent) and event.status == 'EndSnapshot':
+            snapshots += 1
+            if snapshots == connections:
+                break
+    stream.close()
+    return events
+
+
+def retries(metrics):
+    return {reason: count for (_, reason), count in metrics.retries.items()}
+
+
+def test_stream_reconnects_when_the_connection_closes():
+    metrics = MetricsCollector()
+    with MockServer(stream_messages=3) as server:
+        client = client_for(server, metrics)
+        events = follow(client.stream_quotes('MSFT', max_backoff=0.01), 3)
+        client.close()
+    assert len(server.stream_log) == 3
+    assert [e.status for e in events if isinstance(e, StatusEvent)] == ['EndSnapshot'] * 3
+    assert retries(metrics) == {'Connection closed': 2}
+    assert sum(count for (_, _, status), count in metrics.responses.items() if status == 200) == 3
+
+
+def test_stream_reconnects_on_go_away():
+    metrics = MetricsCollector()
+    with MockServer(stream_messages=3, stream_end='goaway') as server:
+        client = client_for(server, metrics)
+        events = follow(client.stream_quotes('MSFT', max_backoff=0.01), 2)
+        client.close()
+    assert 'GoAway' not in [e.status for e in events if isinstance(e, StatusEvent)]
+    assert retries(metrics)['GoAway'] >= 1
+
+
+def test_stream_reconnects_after_missed_heartbeats():
+    metrics = MetricsCollector()
+    with MockServer(stream_messages=3, stream_end='stall') as server:
+        client = client_for(server, metrics)
+        follow(client.stream_quotes('MSFT', heartbeat_timeout=0.3, max_backoff=0.01), 2)
+        client.close()
+    assert len(server.stream_log) >= 2
+    assert metrics.errors and sum(retries(metrics).values()) >= 1
+
+
+def test_rejected_stream_raises_instead_of_reconnecting():
+    with MockServer(stream_status=404) as server:
+        client = client_for(server, MetricsCollector())
+        with pytest.raises(StreamError) as error:
+            list(client.stream_quotes('NOPE', max_backoff=0.01))
+        client.close()
+    assert error.value.status == 404
+    assert len(server.stream_log) == 1
+
+
+def test_async_stream_reads_long_lines_and_raises_when_rejected():
+    async def run(url):
+        async with AsyncTSClient('key', 'secret', api_url=url, sim_api_url=url, token_file=None,
+                                 access_token='token', rate_limiter=False, background_refresh=False) as client:
+            events = []
+            async for event in client.stream_quotes('MSFT', reconnect=False):
+                events.append(event)
+            with pytest.raises(StreamError):
+                server.configure(stream_status=400)
+                async for _ in client.stream_quotes('MSFT'):
+                    pass
+            return events
+
+    # Lines far beyond aiohttp's 64 KiB read buffer.
+    with MockServer(stream_messages=3, stream_padding=300000) as server:
+        events = asyncio.run(run(server.url))
+    updates = [e for e in events if isinstance(e, DataEvent) and 'Padding' in e.data]
+    assert len(updates) == 3 and len(updates[0].data['Padding']) == 300000
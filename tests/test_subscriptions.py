@@ -0,0 +1,120 @@
+import queue
+import threading
+
+import pytest
+
+from TradeStationStreams import DataEvent, ErrorEvent
+from TradeStationSubscriptions import BLOCK, COALESCE, DROP_OLDEST, QuoteSubscriptionManager, Subscription
+
+
+def quote(symbol, **fields):
+    return DataEvent('quotes', dict(fields, Symbol=symbol))
+
+
+class FakeStream:
+    """
+    Quote stream fed by the test: put events, an exception to raise, or None to end the stream.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.closed = False
+        self.events = queue.Queue()
+
+    def __iter__(self):
+        while not self.closed:
+            event = self.events.get()
+            if event is None:
+                return
+            if isinstance(event, Exception):
+                raise event
+            yield event
+
+    def close(self):
+        self.closed = True
+        self.events.put(None)
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.streams = []
+
+    def stream_quotes(self, symbols, **kwargs):
+        self.streams.append(FakeStream(symbols))
+        return self.streams[-1]
+
+
+def test_drop_oldest_keeps_the_newest_updates():
+    subscription = Subscription(None, ['MSFT'], maxsize=3, policy=DROP_OLDEST)
+    for i in range(5):
+        subscription.put(quote('MSFT', Last=i))
+    assert [subscription.get(0).data['Last'] for _ in range(3)] == [2, 3, 4]
+    assert subscription.dropped == 2
+
+
+def test_block_holds_the_producer_until_the_consumer_catches_up():
+    subscription = Subscription(None, ['MSFT'], maxsize=2, policy=BLOCK)
+    producer = threading.Thread(target=lambda: [subscription.put(quote('MSFT', Last=i)) for i in range(4)])
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive() and len(subscription) == 2
+    assert [subscription.get(1).data['Last'] for _ in range(4)] == [0, 1, 2, 3]
+    producer.join(1)
+    assert not producer.is_alive() and subscription.dropped == 0
+
+
+def test_coalesce_merges_updates_per_symbol_within_maxsize():
+    subscription = Subscription(None, ['MSFT', 'AAPL', 'IBM'], maxsize=2, policy=COALESCE)
+    subscription.put(quote('MSFT', Last=1, Bid=0.5))
+    subscription.put(quote('AAPL', Last=2))
+    subscription.put(quote('MSFT', Last=3))
+    assert len(subscription) == 2
+    assert subscription.get(0).data == {'Symbol': 'MSFT', 'Last': 3, 'Bid': 0.5}
+
+    subscription.put(quote('MSFT', Last=4))
+    # Full: the oldest pending symbol (AAPL) makes room for IBM.
+    subscription.put(quote('IBM', Last=5))
+    assert len(subscription) == 2
+    assert [subscription.get(0).data['Symbol'] for _ in range(2)] == ['MSFT', 'IBM']
+    assert subscription.dropped == 2
+    with pytest.raises(queue.Empty):
+        subscription.get(0)
+
+
+def test_errors_without_a_symbol_reach_every_subscriber():
+    client = FakeClient()
+    with QuoteSubscriptionManager(client) as manager:
+        msft = manager.subscribe('MSFT')
+        aapl = manager.subscribe('AAPL')
+        stream = client.streams[-1]
+        stream.events.put(ErrorEvent('Failed', 'Something went wrong'))
+        stream.events.put(ErrorEvent('InvalidSymbol', 'Not found', 'AAPL'))
+        assert msft.get(1).error == 'Failed'
+        assert [aapl.get(1).error for _ in range(2)] == ['Failed', 'InvalidSymbol']
+        with pytest.raises(queue.Empty):
+            msft.get(0.1)
+
+
+def test_upstream_failure_reaches_the_consumer():
+    client = FakeClient()
+    with QuoteSubscriptionManager(client) as manager:
+        subscription = manager.subscribe(['MSFT', 'AAPL'])
+        stream = client.streams[-1]
+        stream.events.put(quote('MSFT', Last=1))
+        stream.events.put(RuntimeError('boom'))
+        events = []
+        with pytest.raises(RuntimeError, match='boom'):
+            for event in subscription:
+                events.append(event)
+        assert [event.data['Last'] for event in events] == [1]
+        assert subscription.closed and not manager.upstreams
+
+
+def test_upstream_ending_on_its_own_reaches_the_consumer():
+    client = FakeClient()
+    with QuoteSubscriptionManager(client) as manager:
+        subscription = manager.subscribe('MSFT')
+        client.streams[-1].events.put(None)
+        with pytest.raises(ConnectionError):
+            subscription.get(1)
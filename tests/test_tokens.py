@@ -0,0 +1,142 @@
+from TradeStationClient import CreateTSClient
+from mock_server import MockServer
+
+
+def test_first_request_with_only_a_refresh_token_is_authorized(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with MockServer() as server:
+        client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url,
+                                token_url=server.token_url, refresh_token='refresh', token_file=None,
+                                background_refresh=False)
+        client.fetch_quotes('MSFT')
+        client.fetch_quotes('AAPL')
+        client.close()
+    assert server.auth_log
+    assert all(header and header != 'Bearer None' for header in server.auth_log), server.auth_log
+    assert client.tokens.refreshes == 1
+    assert not list(tmp_path.iterdir())
+
+
+def test_async_client_takes_credentials_from_memory_and_environment(tmp_path, monkeypatch):
+    import asyncio
+
+    from TradeStationAsync import AsyncTSClient
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('TRADESTATION_CLIENT_ID', 'key')
+    monkeypatch.setenv('TRADESTATION_CLIENT_SECRET', 'secret')
+
+    async def run(url, token_url):
+        async with AsyncTSClient(api_url=url, sim_api_url=url, token_url=token_url, refresh_token='refresh',
+                                 token_file=None, background_refresh=False) as client:
+            await client.fetch_quotes('MSFT')
+            return client
+
+    with MockServer() as server:
+        client = asyncio.run(run(server.url, server.token_url))
+    assert (client.key, client.secret) == ('key', 'secret')
+    assert client.tokens.refreshes == 1
+    assert all(header and header != 'Bearer None' for header in server.auth_log), server.auth_log
+    assert not list(tmp_path.iterdir())
+
+
+def refresh_through_store(path, token_url, stale, results):
+    import requests
+
+    from TradeStationTokens import SharedTokenStore, TokenManager
+
+    store = SharedTokenStore(path)
+    tokens = TokenManager('key', 'secret', 'http://localhost', token_url, requests.Session(), refresh_token='refresh',
+                          access_token_file=None, background=False, store=store)
+    # Every process found the same token rejected at once.
+    tokens.set_token(stale, None)
+    tokens._prepared = True
+    results.put(tokens.refresh(stale_token=stale)[0])
+    store.close()
+
+
+def test_processes_sharing_a_store_refresh_once(tmp_path):
+    import multiprocessing
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    path = str(tmp_path / 'token')
+    with MockServer() as server:
+        workers = [context.Process(target=refresh_through_store, args=(path, server.token_url, 'stale', results))
+                   for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        tokens = {results.get(timeout=60) for _ in workers}
+        for worker in workers:
+            worker.join(10)
+    assert len(tokens) == 1 and 'stale' not in tokens
+
+
+def test_store_read_survives_a_writer_that_died_mid_write(tmp_path):
+    from datetime import datetime
+
+    from TradeStationTokens import _HEADER, SharedTokenStore
+
+    store = SharedTokenStore(str(tmp_path / 'token'))
+    with store.locked():
+        store.write('first', datetime(2099, 1, 1))
+    # What a writer leaves behind if it dies between its two header updates.
+    _HEADER.pack_into(store._map, 0, store.version + 1, 0.0, 0)
+    assert store.read()[1] is None
+    with store.locked():
+        version = store.write('second', datetime(2099, 1, 1))
+    assert version % 2 == 0
+    assert store.read() == (version, 'second', datetime(2099, 1, 1))
+    store.close()
+
+
+def test_threads_share_one_refresh_without_holding_the_lock_across_the_post(monkeypatch):
+    import threading
+    import time
+    from datetime import datetime, timedelta
+
+    from TradeStationTokens import TokenManager
+
+    posts = []
+    release = threading.Event()
+
+    def slow_post():
+        posts.append(1)
+        release.wait(5)
+        return 'new', datetime.now() + timedelta(hours=1)
+
+    tokens = TokenManager('key', 'secret', 'http://localhost', 'http://localhost/token', None, access_token_file=None,
+                          background=False)
+    tokens.set_token('stale', None)
+    tokens._prepared = True
+    monkeypatch.setattr(tokens, '_post', slow_post)
+    callers = [threading.Thread(target=tokens.refresh, args=('stale',)) for _ in range(8)]
+    for caller in callers:
+        caller.start()
+    time.sleep(0.2)
+    # The lock is free while the POST is in flight.
+    assert tokens._lock.acquire(timeout=1)
+    tokens._lock.release()
+    release.set()
+    for caller in callers:
+        caller.join(5)
+    assert len(posts) == 1 and tokens.access_token == 'new'
+
+
+def test_fetch_access_token_reports_where_the_token_went(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    with MockServer() as server:
+        for token_file in (None, str(tmp_path / 'tokens' / 'mine.txt')):
+            client = CreateTSClient('key', 'secret', api_url=server.url, sim_api_url=server.url,
+                                    token_url=server.token_url, refresh_token='refresh', token_file=token_file,
+                                    background_refresh=False)
+            if token_file is not None:
+                (tmp_path / 'tokens').mkdir()
+            client.fetch_access_token()
+            client.close()
+            printed = capsys.readouterr().out
+            if token_file is None:
+                assert printed == ''
+            else:
+                assert 'saved to {}'.format(token_file) in printed
+    assert not (tmp_path / 'access_token.txt').exists()